@@ -0,0 +1,289 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hmac
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from dotenv import load_dotenv
+
+# Loaded before the modules below read their settings from the environment
+load_dotenv()
+
+from audio_formats import MIME_TYPES, playable, resolve_format, stream_format, wav_header
+from metrics import registry
+import scheduler
+import tts_engine
+from voice_catalog import get_voice_catalog
+
+# Headless HTTP API over the same engine as the Streamlit tabs:
+#   POST /synthesize  JSON {"text", "provider", voice settings..., "stream"} -> audio (chunked)
+#   GET  /voices?provider=polly&language=en-US                              -> JSON voice list
+#   GET  /health, GET /metrics (Prometheus text of the worker that answers)
+API_HOST = os.getenv("TTS_API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("TTS_API_PORT", "8080"))
+API_WORKERS = int(os.getenv("TTS_API_WORKERS", str(os.cpu_count() or 1)))
+
+# When set, requests must send "Authorization: Bearer <TTS_API_KEY>"
+API_KEY = os.getenv("TTS_API_KEY")
+
+MAX_BODY_BYTES = 1024 * 1024
+RESPONSE_BLOCK_BYTES = 64 * 1024
+
+# Request fields passed through to tts_engine.synthesize / stream_speech
+SYNTHESIS_OPTIONS = ("voice", "language", "model", "engine", "output_format", "quality", "speaking_rate", "pitch",
+                     "text_type")
+
+# Streamed PCM is sent as WAV with a placeholder data size, as live WAV streams are
+_STREAMED_WAV_SIZE = 0xFFFFFFFF - 36
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (e.g. a load test shutting down) are not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class APIError(Exception):
+    """A request failure reported to the client as a JSON error with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_synthesis_request(body):
+    """Validates a /synthesize JSON body; returns (provider, text, options, stream) or raises APIError."""
+    try:
+        request = json.loads(body)
+    except ValueError:
+        raise APIError(400, "Body must be JSON")
+    if not isinstance(request, dict):
+        raise APIError(400, "Body must be a JSON object")
+    text = request.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise APIError(400, "\"text\" is required")
+    provider = request.get("provider", "google")
+    if provider not in tts_engine.PROVIDERS:
+        raise APIError(400, f"Unknown provider '{provider}' (expected one of {', '.join(tts_engine.PROVIDERS)})")
+    options = {name: request[name] for name in SYNTHESIS_OPTIONS if request.get(name) is not None}
+    if "format" in request and "output_format" not in options:
+        options["output_format"] = request["format"]
+    return provider, text, options, bool(request.get("stream"))
+
+
+def make_handler(credentials):
+    """Returns a request handler class serving the API with server-side provider credentials."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _start_chunked(self, content_type, headers=()):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+
+        def _write_chunk(self, block):
+            if len(block):
+                self.wfile.write(f"{len(block):X}\r\n".encode() + bytes(block) + b"\r\n")
+
+        def _end_chunked(self):
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _authorized(self):
+            if not API_KEY:
+                return True
+            return hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {API_KEY}")
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/health":
+                self._send_json(200, {"status": "ok", "pid": os.getpid()})
+            elif url.path == "/metrics":
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif url.path == "/voices":
+                if not self._authorized():
+                    self._send_json(401, {"error": "Missing or invalid API key"})
+                    return
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                provider = query.get("provider", "google")
+                if provider not in tts_engine.PROVIDERS:
+                    self._send_json(400, {"error": f"Unknown provider '{provider}'"})
+                    return
+                try:
+                    voices = get_voice_catalog().voices(provider, credentials, language=query.get("language"),
+                                                        gender=query.get("gender"))
+                except Exception as e:
+                    self._send_json(502, {"error": f"Could not list {provider} voices: {e}"})
+                    return
+                self._send_json(200, {"provider": provider, "voices": voices})
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if urlsplit(self.path).path != "/synthesize":
+                self._send_json(404, {"error": "Not found"})
+                return
+            if not self._authorized():
+                self._send_json(401, {"error": "Missing or invalid API key"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.close_connection = True
+                self._send_json(400, {"error": "Invalid Content-Length"})
+                return
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                self._send_json(413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"})
+                return
+            # Calls are queued fairly per client address, as the app queues them per browser session;
+            # a header the client picks would let one client take several shares
+            scheduler.set_session(self.client_address[0])
+            try:
+                provider, text, options, stream = parse_synthesis_request(self.rfile.read(length))
+                try:
+                    audio_format = resolve_format(provider, options.get("quality"),
+                                                  options.get("output_format", "mp3"))
+                except ValueError as e:
+                    raise APIError(400, str(e))
+                if stream:
+                    self._stream(provider, text, options, audio_format)
+                else:
+                    self._synthesize(provider, text, options, audio_format)
+            except APIError as e:
+                self._send_json(e.status, {"error": str(e)})
+            except tts_engine.TTSError as e:
+                self._send_json(502, {"error": str(e), "provider": e.provider})
+            except ConnectionError:
+                raise
+            except Exception as e:
+                print(f"Error handling /synthesize: {e!r}")
+                self._send_json(500, {"error": "Internal error"})
+
+        def _synthesize(self, provider, text, options, audio_format):
+            start = time.perf_counter()
+            synthesis = tts_engine.synthesize(provider, text, credentials, **options)
+            audio, content_type = playable(synthesis.audio, audio_format)
+            self._start_chunked(content_type, [
+                ("X-Audio-Format", audio_format.name),
+                ("X-Synthesis-Seconds", f"{time.perf_counter() - start:.3f}"),
+            ])
+            view = memoryview(audio)
+            for offset in range(0, len(view), RESPONSE_BLOCK_BYTES):
+                self._write_chunk(view[offset:offset + RESPONSE_BLOCK_BYTES])
+            self._end_chunked()
+
+        def _stream(self, provider, text, options, audio_format):
+            blocks = tts_engine.stream_speech(provider, text, credentials, **options)
+            block_format = stream_format(audio_format)
+            # Errors before the first audio block still get a proper status
+            first = next(blocks, b"")
+            content_type = MIME_TYPES["wav" if block_format.name == "pcm" else block_format.name]
+            self._start_chunked(content_type, [("X-Audio-Format", block_format.name)])
+            try:
+                if block_format.name == "pcm":
+                    self._write_chunk(wav_header(_STREAMED_WAV_SIZE, block_format.sample_rate))
+                self._write_chunk(first)
+                for block in blocks:
+                    self._write_chunk(block)
+            except Exception as e:
+                # Too late for an error status: drop the connection so the client sees a truncated body
+                print(f"Stream failed after the response started: {e}")
+                self.close_connection = True
+                return
+            self._end_chunked()
+
+    return Handler
+
+
+def _share_budgets(workers):
+    """Gives this worker process its share of the per-provider budgets, so all workers together keep them."""
+    if workers > 1:
+        scheduler.configure(share=workers)
+
+
+def _serve_socket(sock, credentials, workers):
+    """Serves the API on an already listening socket until the process is stopped."""
+    _share_budgets(workers)
+    server = _Server(sock.getsockname()[:2], make_handler(credentials), bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host=API_HOST, port=API_PORT, workers=API_WORKERS, credentials=None):
+    """Serves the API from `workers` processes accepting on one shared socket; blocks until interrupted.
+
+    The socket is opened before the workers fork, so they all accept from its
+    backlog and each connection goes to whichever worker is free.
+    """
+    credentials = credentials if credentials is not None else tts_engine.load_credentials()
+    sock = socket.create_server((host, port), backlog=_Server.request_queue_size)
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("Worker processes need fork(); serving from a single process")
+        workers = 1
+    print(f"Serving the TTS API on http://{host}:{sock.getsockname()[1]} with {workers} worker processes")
+    if workers == 1:
+        _serve_socket(sock, credentials, 1)
+        return
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_serve_socket, args=(sock, credentials, workers), name=f"api-worker-{i}",
+                                 daemon=True) for i in range(workers)]
+    for process in processes:
+        process.start()
+    # Stopping the parent (Ctrl-C or SIGTERM) stops the workers with it
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        sock.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve text-to-speech over HTTP from several worker processes.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Worker processes (default: CPU count)")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="Streamlit secrets file with credentials")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, tts_engine.load_credentials(args.secrets))
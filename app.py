@@ -1,128 +1,338 @@
-import streamlit as st
-from google.cloud import texttospeech
-from google.oauth2 import service_account
 import time
+SCRIPT_STARTED = time.perf_counter()
+import streamlit as st
 import os
-import requests
 from dotenv import load_dotenv
-import boto3
-import pygame
-from tempfile import NamedTemporaryFile
-from contextlib import closing
-import os
-import time
+import functools
+from audio_cache import get_audio_cache
+from audio_formats import FILE_EXTENSIONS, MIME_TYPES, playable, resolve_format, stream_format
+from chunking import PROVIDER_LIMITS, chunk_for_provider, needs_chunking
+from streaming import consume_stream
+import re
+import tempfile
+import uuid
+import tts_engine
+import itertools
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import threading
+from jobs import JobWorkers, get_job_queue
+from postprocess import postprocess_chunks
+from comparison import candidate_label, compare, summary_row
+from documents import DOCUMENT_READERS, read_document, synthesize_document
+from router import REQUIRED_CREDENTIALS, equivalent_voices, get_router, has_credentials, voice_settings
+from scheduler import get_scheduler, set_session
+from segment_cache import cached_fraction, synthesize_segmented
+from speculative import SPECULATIVE_CHAR_BUDGET, SpeculativeSession
+import metrics
+from voice_catalog import GOOGLE_VOICE_TYPES, get_voice_catalog, google_voice_type
+# Provider SDKs (google-cloud-texttospeech, boto3) are imported by the engine on first use
+IMPORT_SECONDS = time.perf_counter() - SCRIPT_STARTED
 load_dotenv()
 
-# Google TTS Function
-def google_synthesize_speech(text, output_filename, language_code, voice_name, speaking_rate=1.0, pitch=0.0):
+# Audio larger than this is written to a per-session temp file instead of being sent inline
+SPILL_TO_DISK_BYTES = int(os.getenv("TTS_SPILL_TO_DISK_BYTES", str(20 * 1024 * 1024)))
+
+# TTS_ASYNC_ENGINE=1 sends the tabs' requests through the asyncio engine's blocking
+# facade, so concurrent sessions share one event loop instead of a thread per request
+if os.getenv("TTS_ASYNC_ENGINE") == "1":
+    import async_engine as synthesis_backend
+else:
+    synthesis_backend = tts_engine
+
+# The synthesis engine raises TTSError; these wrappers report errors in the UI
+# and return None, reading credentials from Streamlit secrets. Successful calls
+# return a tts_engine.Synthesis holding the audio bytes and the time taken.
+def google_synthesize_speech(text, language_code, voice_name, speaking_rate=1.0, pitch=0.0, audio_encoding="MP3",
+                             sample_rate_hertz=None):
     """Synthesizes speech from the input string of text using Google TTS."""
-    start_time = time.time()
     try:
-        # Use secrets for credentials instead of a file path
-        credentials_dict = st.secrets["gcp_service_account"]
-        credentials = service_account.Credentials.from_service_account_info(credentials_dict)
-        client = texttospeech.TextToSpeechClient(credentials=credentials)
-        input_text = texttospeech.SynthesisInput(text=text)
-        voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=speaking_rate,
-            pitch=pitch
+        return synthesis_backend.google_synthesize_speech(
+            text, language_code, voice_name,
+            speaking_rate=speaking_rate, pitch=pitch, credentials=st.secrets,
+            audio_encoding=audio_encoding, sample_rate_hertz=sample_rate_hertz
         )
-        response = client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_config)
-        with open(output_filename, "wb") as out:
-            out.write(response.audio_content)
-        end_time = time.time()
-        time_taken = end_time - start_time
-        print(f'Audio content written to file "{output_filename}"')
-        print(f'Time taken to generate audio: {time_taken:.2f} seconds')
-        return time_taken
     except Exception as e:
         st.error(f"Error in Google TTS: {str(e)}")
         return None
 
-# ElevenLabs TTS Function
-def elevenlabs_synthesize_speech(text, output_filename, api_key, voice_id, model_id="eleven_monolingual_v1"):
+def elevenlabs_synthesize_speech(text, api_key, voice_id, model_id="eleven_monolingual_v1",
+                                 output_format=tts_engine.ELEVENLABS_DEFAULT_FORMAT):
     """Synthesizes speech from the input string of text using ElevenLabs."""
-    start_time = time.time()
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": api_key,
-        "Content-Type": "application/json",
-        "accept": "audio/mpeg"
-    }
-    data = {
-        "text": text,
-        "model_id": model_id,
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.5
-        }
-    }
-    response = requests.post(url, json=data, headers=headers)
-    if response.status_code == 200:
-        with open(output_filename, "wb") as out:
-            out.write(response.content)
-        end_time = time.time()
-        time_taken = end_time - start_time
-        print(f'Audio content written to file "{output_filename}"')
-        print(f'Time taken to generate audio: {time_taken:.2f} seconds')
-        return time_taken
-    else:
-        st.error(f"Error with ElevenLabs API: {response.status_code}, {response.text}")
+    try:
+        return synthesis_backend.elevenlabs_synthesize_speech(text, api_key, voice_id, model_id=model_id,
+                                                              output_format=output_format)
+    except Exception as e:
+        st.error(f"Error with ElevenLabs API: {str(e)}")
         return None
-def aws_synthesize_speech(text, output_filename,texttype, voice_id="Joanna", engine="neural", output_format="mp3"):
+
+def aws_synthesize_speech(text, texttype, voice_id="Joanna", engine="neural", output_format="mp3"):
     """Synthesizes speech from the input string of text using AWS Polly."""
-    start_time = time.time()
     try:
-        # Get AWS credentials from Streamlit secrets
-        aws_access_key_id = st.secrets["aws_access_key_id"]
-        aws_secret_access_key = st.secrets["aws_secret_access_key"]
-        region_name = st.secrets.get("aws_region", "us-east-1")
-        
-        # Initialize a session using Amazon Polly
-        polly_client = boto3.Session(
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name=region_name
-        ).client('polly')
-        
-        # Request speech synthesis
-        response = polly_client.synthesize_speech(
-            Text=text,
-            OutputFormat=output_format,
-            VoiceId=voice_id,
-            Engine=engine,
-            TextType = texttype
+        return synthesis_backend.aws_synthesize_speech(
+            text, texttype, voice_id=voice_id, engine=engine,
+            output_format=output_format, credentials=st.secrets
         )
-        
-        # Save the audio content to a file
-        if "AudioStream" in response:
-            with open(output_filename, "wb") as out:
-                out.write(response["AudioStream"].read())
-            end_time = time.time()
-            time_taken = end_time - start_time
-            print(f'Audio content written to file "{output_filename}"')
-            print(f'Time taken to generate audio: {time_taken:.2f} seconds')
-            return time_taken
-        else:
-            st.error("Could not get AudioStream from response")
-            return None
     except Exception as e:
         st.error(f"Error in AWS Polly TTS: {str(e)}")
         return None
+
+def session_id():
+    """Returns an id that is unique to the current browser session.
+
+    The id is also kept in the URL, so a reload reconnects to the session's background jobs.
+    """
+    if "session_id" not in st.session_state:
+        # The id names a directory (session_audio_path), so only a uuid4().hex from the URL is accepted
+        requested = st.query_params.get("session") or ""
+        st.session_state.session_id = requested if re.fullmatch(r"[0-9a-f]{32}", requested) else uuid.uuid4().hex
+        st.query_params["session"] = st.session_state.session_id
+    return st.session_state.session_id
+
+def session_audio_path(filename):
+    """Returns a path for filename that is unique to the current browser session."""
+    session_dir = os.path.join(tempfile.gettempdir(), "tts_sessions", session_id())
+    os.makedirs(session_dir, exist_ok=True)
+    return os.path.join(session_dir, filename)
+
+def play_audio(audio, filename, audio_format, container=st):
+    """Plays in-memory audio of an AudioFormat, spilling it to a per-session file when it is very large."""
+    audio, mime_type = playable(audio, audio_format)
+    with metrics.span("ui_render", provider="app", bytes=len(audio)):
+        if len(audio) > SPILL_TO_DISK_BYTES:
+            container.audio(tts_engine.write_audio(audio, session_audio_path(filename)), format=mime_type)
+        else:
+            container.audio(audio, format=mime_type)
+
+def play_stream(stream, filename, audio_format):
+    """Collects streamed audio, starting playback as soon as the first audio arrives."""
+    player = st.empty()
+    try:
+        result = consume_stream(stream, on_preview=lambda audio: player.audio(*playable(audio, audio_format)))
+    except Exception as e:
+        st.error(f"Error while streaming audio: {str(e)}")
+        return None
+    st.success(f"Audio synthesized successfully! Time to first byte: {result['time_to_first_byte'] or 0:.2f} seconds, "
+               f"total time: {result['total_time']:.2f} seconds")
+    play_audio(result["audio"], filename, audio_format, container=player)
+    return result
+
+def play_segmented(provider, text, filename, audio_format, **options):
+    """Synthesizes text sentence by sentence through the segment cache and reports the reuse."""
+    ctx = get_script_run_ctx()
+    try:
+        result = synthesize_segmented(
+            provider, text, st.secrets,
+            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+            **options
+        )
+    except Exception as e:
+        st.error(f"Error in segmented synthesis: {str(e)}")
+        return None
+    st.success(f"Audio synthesized successfully! Time taken: {result.time_taken:.2f} seconds. "
+               f"{result.cached_segments} of {result.segment_count} segments "
+               f"({cached_fraction(result):.0%} of characters) served from cache")
+    play_audio(result.audio, filename, audio_format)
+    return result
+
+def submit_job(provider, text, **options):
+    """Queues text as a background job for this session (see the Jobs tab) and returns its id."""
+    job_id = get_job_queue().submit(
+        provider, text, session=(session_id(), 1.0), segmented=segment_mode, postprocess=postprocess_mode, **options
+    )
+    st.success(f"Queued job {job_id[:8]}. It keeps running if you change settings or reload the page; "
+               f"follow it in the Jobs tab.")
+    return job_id
+
+def speculative_session():
+    """Returns this session's store of audio synthesized while the text was being edited."""
+    if "speculative" not in st.session_state:
+        st.session_state.speculative = SpeculativeSession(session_id())
+    return st.session_state.speculative
+
+def play_speculative(provider, text, filename, audio_format, **options):
+    """Synthesizes text using the sentences prepared while it was typed, and reports the time saved."""
+    session = speculative_session()
+    before = session.stats()
+    try:
+        result = session.synthesize(provider, text, st.secrets, **options)
+    except Exception as e:
+        st.error(f"Error in speculative synthesis: {str(e)}")
+        return None
+    after = session.stats()
+    st.success(f"Audio synthesized successfully! Time taken: {result.time_taken:.2f} seconds. "
+               f"{after['hits'] - before['hits']} of {result.segment_count} sentences were prepared while typing, "
+               f"saving about {after['seconds_saved'] - before['seconds_saved']:.2f} seconds")
+    play_audio(result.audio, filename, audio_format)
+    return result
+
+def synthesize_in_chunks(synthesize_chunk, chunks, audio_format, provider, max_parallel=4):
+    """Synthesizes chunks concurrently and merges their audio (an AudioFormat) in order."""
+    ctx = get_script_run_ctx()
+    return tts_engine.synthesize_in_chunks(
+        synthesize_chunk, chunks, audio_format.name, provider,
+        max_parallel=max_parallel,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+        merge=(lambda audios: postprocess_chunks(audios, audio_format)) if postprocess_mode else None
+    )
+
+
+def secrets_for(key):
+    """Returns st.secrets if it holds key (so the voice catalog can fetch), else None."""
+    try:
+        return st.secrets if key in st.secrets else None
+    except Exception:
+        return None
+
+def format_voice_label(voice):
+    """Returns the selectbox label for a voice catalog record."""
+    if voice["provider"] == "google":
+        return f"{voice['id']} ({google_voice_type(voice['id'])} - {voice['gender']})"
+    if voice["provider"] == "polly":
+        return f"{voice['id']} ({voice['language_name']}, {voice['gender']})"
+    if voice["gender"] != "Unknown":
+        return f"{voice['name']} ({voice['gender']})"
+    return voice["name"]
+
+@st.cache_resource
+def load_voice_catalog():
+    """Returns the voice catalog shared by every session and rerun."""
+    return get_voice_catalog()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def voice_options(provider, language=None, _credentials=None):
+    """Returns {selectbox label: voice id} for a provider, cached across reruns."""
+    voices = load_voice_catalog().voices(provider, _credentials, language=language)
+    return {format_voice_label(voice): voice["id"] for voice in voices}
+
+@st.cache_resource
+def startup_timings():
+    """Captures import time on the first run of this process (later reruns reuse loaded modules)."""
+    return {"imports": IMPORT_SECONDS, "first_run_started": SCRIPT_STARTED}
+
+@st.cache_resource
+def job_workers():
+    """Starts this process's background job workers once (TTS_JOB_WORKERS=0 leaves jobs to jobs.py processes)."""
+    return JobWorkers(get_job_queue(), tts_engine.load_credentials()).start()
+
+@st.cache_resource
+def metrics_server():
+    """Starts the Prometheus/OTLP endpoint once per process when TTS_METRICS_PORT is set."""
+    port = os.getenv("TTS_METRICS_PORT")
+    return metrics.start_metrics_server(int(port)) if port else None
+
+def tab_fragment(name):
+    """Renders a tab as an isolated fragment (its widgets rerun only the tab) and times each render."""
+    def decorator(render):
+        @st.fragment
+        @functools.wraps(render)
+        def fragment():
+            start = time.perf_counter()
+            set_session(session_id())
+            render()
+            st.session_state.setdefault("render_times", {})[name] = time.perf_counter() - start
+        return fragment
+    return decorator
+
+def show_chunked_result(result, chunk_count):
+    """Reports the outcome of a chunked synthesis run in the UI."""
+    if result.failed_count == 0:
+        st.success(f"All chunks processed successfully! Wall-clock time: {result.wall_time:.2f} seconds "
+                   f"(sum of per-chunk times: {result.total_time:.2f} seconds)")
+    else:
+        st.warning(f"{result.failed_count} of {chunk_count} chunks failed. "
+                   f"Wall-clock time: {result.wall_time:.2f} seconds")
+    return result.failed_count < chunk_count
     
 
 # Streamlit UI Setup
 st.title("Text-to-Speech Synthesis Apps")
 
-tab1, tab2,tab3 = st.tabs(["Google TTS", "ElevenLabs TTS","AWS Polly TTS"])
+# Provider calls from this session share the process-wide budgets fairly with other sessions
+set_session(session_id())
+
+# Audio cache counters (shared by all sessions in this process)
+with st.sidebar.expander("Audio Cache"):
+    cache_stats = get_audio_cache().stats()
+    st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}")
+    st.write(f"Bytes served from cache: {cache_stats['bytes_served']:,}")
+    st.write(f"Entries: {cache_stats['entries']} ({cache_stats['total_bytes']:,} bytes)")
+
+# Streaming playback applies to all tabs
+streaming_mode = st.sidebar.checkbox(
+    "Streaming playback",
+    help="Start playing audio as soon as the first part arrives instead of waiting for the whole synthesis."
+)
+
+# Segment caching applies to all tabs (except SSML, which is always sent whole)
+segment_mode = st.sidebar.checkbox(
+    "Reuse cached sentences",
+    help="Cache audio per sentence, so templated text only synthesizes the sentences that changed. "
+         "Intonation restarts at each sentence."
+)
+
+# Speculative synthesis applies to all tabs (except SSML); it reuses sentences like the segment cache
+speculative_mode = st.sidebar.checkbox(
+    "Prepare audio while typing",
+    help="After you stop editing, finished sentences are synthesized in the background, so pressing the "
+         "button only waits for the sentences that changed. Uses up to "
+         f"{SPECULATIVE_CHAR_BUDGET:,} characters per session."
+)
+if speculative_mode:
+    with st.sidebar.expander("Speculative Synthesis"):
+        speculative_stats = speculative_session().stats()
+        st.metric("Hit Rate", f"{speculative_stats['hit_rate']:.0%}")
+        st.write(f"Latency saved: {speculative_stats['seconds_saved']:.1f} s")
+        st.write(f"Spent: {speculative_stats['chars_spent']:,} of {speculative_stats['char_budget']:,} characters")
+
+# Post-processing applies to chunked text in all tabs (including background jobs)
+postprocess_mode = st.sidebar.checkbox(
+    "Even out chunk joins",
+    help="Bring every chunk to the same loudness, trim the silence around it and crossfade the joins. "
+         "MP3 and Ogg chunks are decoded and re-encoded with ffmpeg; without it they are joined as they are."
+)
+
+# Background jobs apply to all tabs (streaming playback still runs in the page)
+background_mode = st.sidebar.checkbox(
+    "Run in background",
+    help="Queue the synthesis as a job instead of waiting for it here. Jobs survive reruns, reloads and "
+         "app restarts; progress and results are in the Jobs tab."
+)
+
+# Audio quality applies to the Google and ElevenLabs tabs; Polly keeps its own format choice
+quality_options = {
+    "Speech (smallest download)": "speech",
+    "Standard": "standard",
+    "Lossless (WAV)": "lossless"
+}
+audio_quality = quality_options[st.sidebar.selectbox(
+    "Audio quality",
+    list(quality_options.keys()),
+    index=1,
+    help="Speech requests the smallest format each provider offers (Opus or 32 kbps MP3), "
+         "about a quarter of the standard download."
+)]
+
+voice_catalog = load_voice_catalog()
+
+# Filled in at the end of the script, once this run's timings are known
+timing_report = st.sidebar.expander("Performance").empty()
+
+metrics_server()
+job_workers()
+
+tab1, tab2,tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(["Google TTS", "ElevenLabs TTS","AWS Polly TTS",
+                                                         "Auto (Fastest Provider)", "Compare", "Document", "Jobs",
+                                                         "Metrics"])
 
 # Google TTS Tab
-with tab1:
+@tab_fragment("google")
+def google_tab():
     st.header("Google Text-to-Speech")
     text = st.text_area("Enter Text for Google TTS", "Hello, how are you today?")
-    output_filename = "google_output_audio.mp3"
+    google_format = resolve_format("google", audio_quality)
+    output_filename = f"google_output_audio.{FILE_EXTENSIONS[google_format.name]}"
     
     # Language options with display names and codes
     language_options = {
@@ -136,137 +346,16 @@ with tab1:
     language_code = st.selectbox("Select Language (Google)", list(language_options.keys()))
     selected_language_code = language_options[language_code]
     
-    # Voice type description for the UI
-    voice_type_desc = {
-        "Standard": "Basic voice with good quality",
-        "Wavenet": "Higher quality, more natural sounding voice",
-        "Neural2": "Latest neural network based voices with very natural intonation",
-        "Studio": "Premium studio-quality voices (limited availability)",
-        "Polyglot": "Voices trained for multiple languages"
-    }
-    
-    # Helper function to create display names with descriptions
-    def format_voice_name(voice):
-        parts = voice.split('-')
-        if len(parts) >= 4:
-            voice_type = parts[2]
-            voice_id = parts[3]
-            gender = "Female" if voice_id in ["A", "C", "E", "G", "I", "O"] else "Male"
-            return f"{voice} ({voice_type} - {gender})"
-        return voice
-    
-    # Comprehensive voice options for each language
-    if selected_language_code == "hi-IN":
-        voice_options = {
-            "hi-IN-Standard-A": "hi-IN-Standard-A",
-            "hi-IN-Standard-B": "hi-IN-Standard-B",
-            "hi-IN-Standard-C": "hi-IN-Standard-C",
-            "hi-IN-Standard-D": "hi-IN-Standard-D",
-            "hi-IN-Wavenet-A": "hi-IN-Wavenet-A",
-            "hi-IN-Wavenet-B": "hi-IN-Wavenet-B",
-            "hi-IN-Wavenet-C": "hi-IN-Wavenet-C",
-            "hi-IN-Wavenet-D": "hi-IN-Wavenet-D",
-            "hi-IN-Neural2-A": "hi-IN-Neural2-A",
-            "hi-IN-Neural2-B": "hi-IN-Neural2-B",
-            "hi-IN-Neural2-C": "hi-IN-Neural2-C",
-            "hi-IN-Neural2-D": "hi-IN-Neural2-D"
-        }
-    elif selected_language_code == "en-US":
-        voice_options = {
-            "en-US-Standard-A": "en-US-Standard-A",
-            "en-US-Standard-B": "en-US-Standard-B",
-            "en-US-Standard-C": "en-US-Standard-C",
-            "en-US-Standard-D": "en-US-Standard-D",
-            "en-US-Standard-E": "en-US-Standard-E",
-            "en-US-Standard-F": "en-US-Standard-F",
-            "en-US-Standard-G": "en-US-Standard-G",
-            "en-US-Standard-H": "en-US-Standard-H",
-            "en-US-Standard-I": "en-US-Standard-I",
-            "en-US-Standard-J": "en-US-Standard-J",
-            "en-US-Wavenet-A": "en-US-Wavenet-A",
-            "en-US-Wavenet-B": "en-US-Wavenet-B",
-            "en-US-Wavenet-C": "en-US-Wavenet-C",
-            "en-US-Wavenet-D": "en-US-Wavenet-D",
-            "en-US-Wavenet-E": "en-US-Wavenet-E",
-            "en-US-Wavenet-F": "en-US-Wavenet-F",
-            "en-US-Wavenet-G": "en-US-Wavenet-G",
-            "en-US-Wavenet-H": "en-US-Wavenet-H",
-            "en-US-Wavenet-I": "en-US-Wavenet-I",
-            "en-US-Wavenet-J": "en-US-Wavenet-J",
-            "en-US-Neural2-A": "en-US-Neural2-A",
-            "en-US-Neural2-B": "en-US-Neural2-B",
-            "en-US-Neural2-C": "en-US-Neural2-C",
-            "en-US-Neural2-D": "en-US-Neural2-D",
-            "en-US-Neural2-E": "en-US-Neural2-E",
-            "en-US-Neural2-F": "en-US-Neural2-F",
-            "en-US-Neural2-G": "en-US-Neural2-G",
-            "en-US-Neural2-H": "en-US-Neural2-H",
-            "en-US-Neural2-I": "en-US-Neural2-I",
-            "en-US-Neural2-J": "en-US-Neural2-J",
-            "en-US-Studio-O": "en-US-Studio-O",
-            "en-US-Studio-Q": "en-US-Studio-Q"
-        }
-    elif selected_language_code == "en-IN":
-        voice_options = {
-            "en-IN-Standard-A": "en-IN-Standard-A",
-            "en-IN-Standard-B": "en-IN-Standard-B",
-            "en-IN-Standard-C": "en-IN-Standard-C",
-            "en-IN-Standard-D": "en-IN-Standard-D",
-            "en-IN-Wavenet-A": "en-IN-Wavenet-A",
-            "en-IN-Wavenet-B": "en-IN-Wavenet-B",
-            "en-IN-Wavenet-C": "en-IN-Wavenet-C",
-            "en-IN-Wavenet-D": "en-IN-Wavenet-D",
-            "en-IN-Neural2-A": "en-IN-Neural2-A",
-            "en-IN-Neural2-B": "en-IN-Neural2-B",
-            "en-IN-Neural2-C": "en-IN-Neural2-C",
-            "en-IN-Neural2-D": "en-IN-Neural2-D"
-        }
-    elif selected_language_code == "es-ES":
-        voice_options = {
-            "es-ES-Standard-A": "es-ES-Standard-A",
-            "es-ES-Standard-B": "es-ES-Standard-B",
-            "es-ES-Standard-C": "es-ES-Standard-C",
-            "es-ES-Standard-D": "es-ES-Standard-D",
-            "es-ES-Wavenet-A": "es-ES-Wavenet-A",
-            "es-ES-Wavenet-B": "es-ES-Wavenet-B",
-            "es-ES-Wavenet-C": "es-ES-Wavenet-C",
-            "es-ES-Wavenet-D": "es-ES-Wavenet-D",
-            "es-ES-Neural2-A": "es-ES-Neural2-A",
-            "es-ES-Neural2-B": "es-ES-Neural2-B",
-            "es-ES-Neural2-C": "es-ES-Neural2-C",
-            "es-ES-Neural2-D": "es-ES-Neural2-D",
-            "es-ES-Polyglot-1": "es-ES-Polyglot-1"
-        }
-    elif selected_language_code == "fr-FR":
-        voice_options = {
-            "fr-FR-Standard-A": "fr-FR-Standard-A",
-            "fr-FR-Standard-B": "fr-FR-Standard-B",
-            "fr-FR-Standard-C": "fr-FR-Standard-C",
-            "fr-FR-Standard-D": "fr-FR-Standard-D",
-            "fr-FR-Standard-E": "fr-FR-Standard-E",
-            "fr-FR-Wavenet-A": "fr-FR-Wavenet-A",
-            "fr-FR-Wavenet-B": "fr-FR-Wavenet-B",
-            "fr-FR-Wavenet-C": "fr-FR-Wavenet-C",
-            "fr-FR-Wavenet-D": "fr-FR-Wavenet-D",
-            "fr-FR-Wavenet-E": "fr-FR-Wavenet-E",
-            "fr-FR-Neural2-A": "fr-FR-Neural2-A",
-            "fr-FR-Neural2-B": "fr-FR-Neural2-B",
-            "fr-FR-Neural2-C": "fr-FR-Neural2-C",
-            "fr-FR-Neural2-D": "fr-FR-Neural2-D",
-            "fr-FR-Neural2-E": "fr-FR-Neural2-E",
-            "fr-FR-Polyglot-1": "fr-FR-Polyglot-1"
-        }
-    
-    # Format voice names for better UI display
-    display_voice_options = {format_voice_name(k): v for k, v in voice_options.items()}
-    
+    # Voices come from the shared catalog, fetched once per TTL rather than on every rerun
+    display_voice_options = voice_options("google", selected_language_code, secrets_for("gcp_service_account"))
+
     voice_name = st.selectbox("Select Voice (Google)", list(display_voice_options.keys()))
     selected_voice_name = display_voice_options[voice_name]
-    
+
     # Show voice type information
-    voice_type = selected_voice_name.split('-')[2] if len(selected_voice_name.split('-')) >= 3 else ""
-    if voice_type in voice_type_desc:
-        st.info(f"**Voice Type:** {voice_type_desc[voice_type]}")
+    voice_type = google_voice_type(selected_voice_name)
+    if voice_type in GOOGLE_VOICE_TYPES:
+        st.info(f"**Voice Type:** {GOOGLE_VOICE_TYPES[voice_type]}")
     
     # Voice modification controls for Google TTS
     st.subheader("Voice Settings")
@@ -293,25 +382,96 @@ with tab1:
             help="Raises or lowers the voice pitch. 0 is default, positive values increase pitch, negative values decrease it."
         )
     
+    google_options = {
+        "voice": selected_voice_name,
+        "language": selected_language_code,
+        "speaking_rate": speaking_rate,
+        "pitch": pitch,
+        "quality": audio_quality
+    }
+    if speculative_mode and text:
+        speculative_session().update("google", text, st.secrets, **google_options)
+
     if st.button('Synthesize Speech (Google)'):
         if text:
             with st.spinner("Generating speech with Google TTS..."):
-                time_taken = google_synthesize_speech(
-                    text, 
-                    output_filename, 
-                    selected_language_code, 
-                    selected_voice_name,
-                    speaking_rate=speaking_rate,
-                    pitch=pitch
-                )
-                if time_taken is not None:
-                    st.success(f"Audio synthesized successfully! Time taken: {time_taken:.2f} seconds")
-                    st.audio(output_filename, format='audio/mp3')
+                if streaming_mode:
+                    play_stream(
+                        tts_engine.google_stream_speech(
+                            text,
+                            selected_language_code,
+                            selected_voice_name,
+                            speaking_rate=speaking_rate,
+                            pitch=pitch,
+                            credentials=st.secrets,
+                            audio_encoding=google_format.request,
+                            sample_rate_hertz=google_format.sample_rate
+                        ),
+                        output_filename,
+                        stream_format(google_format)
+                    )
+                elif speculative_mode:
+                    play_speculative("google", text, output_filename, google_format, **google_options)
+                elif background_mode:
+                    submit_job(
+                        "google",
+                        text,
+                        voice=selected_voice_name,
+                        language=selected_language_code,
+                        speaking_rate=speaking_rate,
+                        pitch=pitch,
+                        quality=audio_quality
+                    )
+                elif segment_mode:
+                    play_segmented(
+                        "google",
+                        text,
+                        output_filename,
+                        google_format,
+                        voice=selected_voice_name,
+                        language=selected_language_code,
+                        speaking_rate=speaking_rate,
+                        pitch=pitch,
+                        quality=audio_quality
+                    )
+                elif needs_chunking(text, "google"):
+                    chunks = chunk_for_provider(text, "google")
+                    st.info(f"Text is over Google's 5000-byte request limit and will be processed in {len(chunks)} chunks")
+                    chunked_result = synthesize_in_chunks(
+                        lambda chunk: google_synthesize_speech(
+                            chunk,
+                            selected_language_code,
+                            selected_voice_name,
+                            speaking_rate=speaking_rate,
+                            pitch=pitch,
+                            audio_encoding=google_format.request,
+                            sample_rate_hertz=google_format.sample_rate
+                        ),
+                        chunks,
+                        google_format,
+                        "google"
+                    )
+                    if show_chunked_result(chunked_result, len(chunks)):
+                        play_audio(chunked_result.audio, output_filename, google_format)
+                else:
+                    synthesis = google_synthesize_speech(
+                        text, 
+                        selected_language_code, 
+                        selected_voice_name,
+                        speaking_rate=speaking_rate,
+                        pitch=pitch,
+                        audio_encoding=google_format.request,
+                        sample_rate_hertz=google_format.sample_rate
+                    )
+                    if synthesis is not None:
+                        st.success(f"Audio synthesized successfully! Time taken: {synthesis.time_taken:.2f} seconds")
+                        play_audio(synthesis.audio, output_filename, google_format)
         else:
             st.error("Please enter text to synthesize.")
 
 # ElevenLabs TTS Tab
-with tab2:
+@tab_fragment("elevenlabs")
+def elevenlabs_tab():
     st.header("ElevenLabs Text-to-Speech")
     text_eleven = st.text_area("Enter Text for ElevenLabs TTS", "Hello, how are you today?")
     
@@ -323,23 +483,7 @@ with tab2:
         api_key_eleven = None
 
     # ElevenLabs Voice Selection
-    elevenlabs_voice_options = {
-        "Rachel": "21m00Tcm4TlvDq8ikWAM",
-        "Mark": "UgBBYS2sOqTuMpoF3BR0",
-        "Cassidy": "56AoDkrOh6qfVPDXZ7Pt",
-        "Thomas": "GBv7mTt0atIp3Br8iCZE",
-        "Daniel": "onwK4e9ZLuTAKqWW03F9",
-        "Josh": "TxGEqnHWrfWFTfGW9XjX",
-        "Adam": "pNInz6obpgDQGcFmaJgB",
-        "Sam": "yoZ06aMxZJJ28mfd3POQ",
-        "Antoni": "ErXwobaYiN019PkySvjV",
-        "Arnold": "VR6AewLTigWG4xSOukaG",
-        "Bella": "EXAVITQu4vr4xnSDxMaL",
-        "Domi": "AZnzlk1XvdvUeBnXmlld",
-        "Elli": "MF3mGyEYCl7XYWbV9V6O",
-        "Freya": "jsCqWAovK2LkecY7zXl4",
-        "Gigi": "jBpfuIE2acCO8z3wKNLl"
-    }  # More voices added
+    elevenlabs_voice_options = voice_options("elevenlabs", None, secrets_for("api_eleven_labs"))
 
     voice_name_eleven = st.selectbox("Select Voice (ElevenLabs)", list(elevenlabs_voice_options.keys()))
     selected_voice_id_eleven = elevenlabs_voice_options[voice_name_eleven]
@@ -396,7 +540,8 @@ with tab2:
     elif selected_model_id_eleven == "eleven_multilingual_v2":
         st.info("Multilingual v2 offers the best quality for non-English languages.")
     
-    output_filename_eleven = "elevenlabs_output_audio.mp3"
+    eleven_format = resolve_format("elevenlabs", audio_quality)
+    output_filename_eleven = f"elevenlabs_output_audio.{FILE_EXTENSIONS[eleven_format.name]}"
     
     # Voice settings sliders
     st.subheader("Voice Settings")
@@ -405,29 +550,102 @@ with tab2:
     similarity_boost = st.slider("Similarity Boost", min_value=0.0, max_value=1.0, value=0.5, step=0.05,
                                help="Higher values make the voice sound more like the original voice")
     
+    eleven_options = {
+        "voice": selected_voice_id_eleven,
+        "model": selected_model_id_eleven,
+        "language": selected_language_eleven,
+        "quality": audio_quality
+    }
+    if speculative_mode and text_eleven and api_key_eleven and selected_voice_id_eleven:
+        speculative_session().update("elevenlabs", text_eleven, st.secrets, **eleven_options)
+
     if st.button('Synthesize Speech (ElevenLabs)'):
         if text_eleven and api_key_eleven and selected_voice_id_eleven:
             with st.spinner("Generating speech with ElevenLabs..."):
                 # Modify data based on model type and language
+                language_tag = ""
                 if selected_model_id_eleven != "eleven_monolingual_v1":
                     # If it's a multilingual model and non-English is selected, add the language tag
                     if selected_language_eleven != "en":
-                        text_eleven = f"[{selected_language_eleven}]{text_eleven}"
+                        language_tag = f"[{selected_language_eleven}]"
                 
-                time_taken_eleven = elevenlabs_synthesize_speech(
-                    text_eleven, 
-                    output_filename_eleven, 
-                    api_key_eleven, 
-                    selected_voice_id_eleven,
-                    model_id=selected_model_id_eleven
-                )
-                
-                if time_taken_eleven is not None:
-                    st.success(f"Audio synthesized successfully! Time taken: {time_taken_eleven:.2f} seconds")
-                    st.audio(output_filename_eleven, format='audio/mp3')
+                eleven_char_limit = PROVIDER_LIMITS["elevenlabs"]["max_chars"] - len(language_tag)
+                if streaming_mode:
+                    chunks = chunk_for_provider(text_eleven, "elevenlabs", max_chars=eleven_char_limit)
+                    play_stream(
+                        itertools.chain.from_iterable(
+                            tts_engine.elevenlabs_stream_speech(
+                                f"{language_tag}{chunk}",
+                                api_key_eleven,
+                                selected_voice_id_eleven,
+                                model_id=selected_model_id_eleven,
+                                output_format=eleven_format.request
+                            )
+                            for chunk in chunks
+                        ),
+                        output_filename_eleven,
+                        stream_format(eleven_format)
+                    )
+                elif speculative_mode:
+                    play_speculative("elevenlabs", text_eleven, output_filename_eleven, eleven_format,
+                                     **eleven_options)
+                elif background_mode:
+                    submit_job(
+                        "elevenlabs",
+                        text_eleven,
+                        voice=selected_voice_id_eleven,
+                        model=selected_model_id_eleven,
+                        language=selected_language_eleven,
+                        quality=audio_quality,
+                        max_parallel=2
+                    )
+                elif segment_mode:
+                    play_segmented(
+                        "elevenlabs",
+                        text_eleven,
+                        output_filename_eleven,
+                        eleven_format,
+                        voice=selected_voice_id_eleven,
+                        model=selected_model_id_eleven,
+                        language=selected_language_eleven,
+                        quality=audio_quality
+                    )
+                elif needs_chunking(text_eleven, "elevenlabs", max_chars=eleven_char_limit):
+                    chunks = chunk_for_provider(text_eleven, "elevenlabs", max_chars=eleven_char_limit)
+                    st.info(f"Text is over the ElevenLabs request limit and will be processed in {len(chunks)} chunks")
+                    chunked_result = synthesize_in_chunks(
+                        lambda chunk: elevenlabs_synthesize_speech(
+                            f"{language_tag}{chunk}",
+                            api_key_eleven,
+                            selected_voice_id_eleven,
+                            model_id=selected_model_id_eleven,
+                            output_format=eleven_format.request
+                        ),
+                        chunks,
+                        eleven_format,
+                        "elevenlabs",
+                        max_parallel=2
+                    )
+                    if show_chunked_result(chunked_result, len(chunks)):
+                        play_audio(chunked_result.audio, output_filename_eleven, eleven_format)
+                else:
+                    synthesis_eleven = elevenlabs_synthesize_speech(
+                        f"{language_tag}{text_eleven}", 
+                        api_key_eleven, 
+                        selected_voice_id_eleven,
+                        model_id=selected_model_id_eleven,
+                        output_format=eleven_format.request
+                    )
+                    
+                    if synthesis_eleven is not None:
+                        st.success(f"Audio synthesized successfully! Time taken: {synthesis_eleven.time_taken:.2f} seconds")
+                        play_audio(synthesis_eleven.audio, output_filename_eleven, eleven_format)
         else:
             st.error("Please provide text and ensure API key is configured in secrets.")
-with tab3:
+
+# AWS Polly TTS Tab
+@tab_fragment("polly")
+def polly_tab():
     st.header("AWS Polly Text-to-Speech")
     text_aws = st.text_area("Enter Text for AWS Polly TTS", "Hello, how are you today?")
     
@@ -441,41 +659,8 @@ with tab3:
         st.warning("AWS credentials not found in secrets. Please add them to your Streamlit secrets.")
     
     # AWS Polly Voice Selection
-    aws_voice_options = {
-        # English (US) Voices
-        "Joanna (US English, Female)": "Joanna",
-        "Matthew (US English, Male)": "Matthew",
-        "Salli (US English, Female)": "Salli",
-        "Joey (US English, Male)": "Joey",
-        "Kimberly (US English, Female)": "Kimberly",
-        "Kevin (US English, Male)": "Kevin",
-        "Ruth (US English, Female)": "Ruth",
-        "Stephen (US English, Male)": "Stephen",
-        "Ivy (US English, Female Child)": "Ivy",
-        "Justin (US English, Male Child)": "Justin",
-        # British English Voices
-        "Amy (British English, Female)": "Amy",
-        "Emma (British English, Female)": "Emma",
-        "Brian (British English, Male)": "Brian",
-        # Indian English Voices
-        "Aditi (Indian English)": "Aditi",
-        "Raveena (Indian English)": "Raveena",
-        # Spanish Voices
-        "Conchita (Spanish)": "Conchita",
-        "Lucia (Spanish)": "Lucia",
-        # French Voices
-        "Celine (French)": "Celine",
-        "Lea (French)": "Lea",
-        # German Voices
-        "Marlene (German)": "Marlene",
-        "Vicki (German)": "Vicki",
-        # Hindi Voice
-        "Aditi (Hindi)": "Aditi",
-        # Japanese Voices
-        "Takumi (Japanese)": "Takumi",
-        "Mizuki (Japanese)": "Mizuki"
-    }
-    
+    aws_voice_options = voice_options("polly", None, secrets_for("aws_access_key_id"))
+
     voice_name_aws = st.selectbox("Select Voice (AWS Polly)", list(aws_voice_options.keys()))
     selected_voice_id_aws = aws_voice_options[voice_name_aws]
     
@@ -488,29 +673,26 @@ with tab3:
     engine_aws = st.selectbox("Engine Type", list(engine_options.keys()))
     selected_engine_aws = engine_options[engine_aws]
     
-    # Some language and region info depending on selected voice
-    voice_language_info = {
-        "Joanna": "US English - Neural and Standard engines supported",
-        "Matthew": "US English - Neural and Standard engines supported",
-        "Aditi": "Indian English/Hindi - Only Standard engine supported",
-        "Brian": "British English - Neural and Standard engines supported"
-        # Add more as needed
-    }
-    
-    if selected_voice_id_aws in voice_language_info:
-        st.info(f"**Voice Info:** {voice_language_info[selected_voice_id_aws]}")
+    # Language and engine support for the selected voice, from the catalog
+    selected_voice_aws = voice_catalog.get("polly", selected_voice_id_aws)
+    if selected_voice_aws is not None:
+        engines_aws = ", ".join(engine.title() for engine in selected_voice_aws["engines"])
+        st.info(f"**Voice Info:** {selected_voice_aws['language_name']} - engines supported: {engines_aws}")
+        if selected_engine_aws not in selected_voice_aws["engines"]:
+            st.warning(f"{selected_voice_id_aws} does not support the {selected_engine_aws} engine.")
     
     # Output format selection
     format_options = {
         "MP3 (Recommended)": "mp3",
         "OGG Vorbis": "ogg_vorbis",
-        "PCM": "pcm"
+        "PCM (played and saved as WAV)": "pcm"
     }
     
     output_format_aws = st.selectbox("Output Format", list(format_options.keys()))
     selected_format_aws = format_options[output_format_aws]
     
-    output_filename_aws = f"aws_output_audio.{selected_format_aws}"
+    aws_format = resolve_format("polly", output_format=selected_format_aws)
+    output_filename_aws = f"aws_output_audio.{FILE_EXTENSIONS[aws_format.name]}"
     
     # Allow for chunking long text
     st.subheader("Long Text Options")
@@ -525,6 +707,13 @@ with tab3:
             step=100,
             help="Amazon Polly has character limits. For long text, it will be broken into chunks of this size."
         )
+        max_parallel = st.slider(
+            "Maximum parallel requests",
+            min_value=1,
+            max_value=10,
+            value=4,
+            help="How many chunks are synthesized at the same time. Requests are also rate limited to stay under Polly's TPS quota."
+        )
     
     # Text type options (Normal text vs SSML)
     text_type_options = {
@@ -545,89 +734,93 @@ with tab3:
         ```
         """)
     
+    aws_options = {
+        "voice": selected_voice_id_aws,
+        "engine": selected_engine_aws,
+        "output_format": selected_format_aws,
+        "text_type": selected_text_type_aws
+    }
+    if speculative_mode and text_aws and aws_credentials_configured:
+        speculative_session().update("polly", text_aws, st.secrets, **aws_options)
+
     if st.button('Synthesize Speech (AWS Polly)'):
         if text_aws and aws_credentials_configured:
             with st.spinner("Generating speech with AWS Polly..."):
-                # Check if text needs to be chunked
-                if enable_chunking and len(text_aws) > max_chars:
-                    st.info(f"Text is {len(text_aws)} characters long and will be processed in chunks")
-                    
-                    # Break text into chunks
-                    chunks = []
-                    current_chunk = ""
-                    sentences = text_aws.replace('\n', ' ').split('. ')
-                    
-                    for sentence in sentences:
-                        if not sentence:
-                            continue
-                            
-                        # Add period back if it was removed during split
-                        if sentence == sentences[-1] and not text_aws.endswith('. '):
-                            formatted_sentence = sentence
-                        else:
-                            formatted_sentence = sentence + '. '
-                            
-                        # If adding this sentence exceeds the limit, start a new chunk
-                        if len(current_chunk) + len(formatted_sentence) > max_chars and current_chunk:
-                            chunks.append(current_chunk)
-                            current_chunk = formatted_sentence
-                        else:
-                            current_chunk += formatted_sentence
-                    
-                    # Add the last chunk if it's not empty
-                    if current_chunk:
-                        chunks.append(current_chunk)
-                    
-                    # Process each chunk
-                    all_audio_files = []
-                    total_time = 0
-                    
-                    for i, chunk in enumerate(chunks):
-                        chunk_filename = f"aws_chunk_{i+1}.{selected_format_aws}"
-                        st.write(f"Processing chunk {i+1} of {len(chunks)}...")
-                        if text_type_options.keys()=="Plain Text":
-                            time_taken = aws_synthesize_speech(
+                if streaming_mode:
+                    if enable_chunking and needs_chunking(text_aws, "polly", max_chars=max_chars):
+                        chunks = chunk_for_provider(
+                            text_aws, "polly", ssml=selected_text_type_aws == "ssml", max_chars=max_chars
+                        )
+                    else:
+                        chunks = [text_aws]
+                    play_stream(
+                        itertools.chain.from_iterable(
+                            tts_engine.aws_stream_speech(
                                 chunk,
-                                chunk_filename,
                                 selected_text_type_aws,
                                 voice_id=selected_voice_id_aws,
                                 engine=selected_engine_aws,
                                 output_format=selected_format_aws,
-                                texttype = selected_text_type_aws
-                                # text_type=selected_text_type_aws
+                                credentials=st.secrets
                             )
-                            
-                            if time_taken is not None:
-                                total_time += time_taken
-                                all_audio_files.append(chunk_filename)
-                        else:
-                            time_taken = aws_synthesize_speech(
+                            for chunk in chunks
+                        ),
+                        output_filename_aws,
+                        stream_format(aws_format)
+                    )
+                elif speculative_mode:
+                    play_speculative("polly", text_aws, output_filename_aws, aws_format, **aws_options)
+                elif background_mode:
+                    submit_job(
+                        "polly",
+                        text_aws,
+                        voice=selected_voice_id_aws,
+                        engine=selected_engine_aws,
+                        output_format=selected_format_aws,
+                        text_type=selected_text_type_aws,
+                        max_chars=max_chars if enable_chunking else None,
+                        max_parallel=max_parallel if enable_chunking else 4
+                    )
+                elif segment_mode:
+                    play_segmented(
+                        "polly",
+                        text_aws,
+                        output_filename_aws,
+                        aws_format,
+                        voice=selected_voice_id_aws,
+                        engine=selected_engine_aws,
+                        output_format=selected_format_aws,
+                        text_type=selected_text_type_aws
+                    )
+                # Check if text needs to be chunked
+                elif enable_chunking and needs_chunking(text_aws, "polly", max_chars=max_chars):
+                    chunks = chunk_for_provider(
+                        text_aws, "polly", ssml=selected_text_type_aws == "ssml", max_chars=max_chars
+                    )
+                    st.info(f"Text is {len(text_aws)} characters long and will be processed in {len(chunks)} chunks")
+                    
+                    # Process chunks in parallel, bounded by max_parallel and the Polly rate limit
+                    st.write(f"Processing {len(chunks)} chunks with up to {max_parallel} requests in flight...")
+                    chunked_result = synthesize_in_chunks(
+                        lambda chunk: aws_synthesize_speech(
                             chunk,
-                            chunk_filename,
                             selected_text_type_aws,
                             voice_id=selected_voice_id_aws,
                             engine=selected_engine_aws,
-                            output_format=selected_format_aws,
-                            texttype = selected_text_type_aws
-                            # text_type=selected_text_type_aws
-                            )
-                            
-                            if time_taken is not None:
-                                total_time += time_taken
-                                all_audio_files.append(chunk_filename)
-                    
-                    st.success(f"All chunks processed successfully! Total time: {total_time:.2f} seconds")
-                    
-                    # Display each audio chunk
-                    for i, audio_file in enumerate(all_audio_files):
-                        st.write(f"Chunk {i+1}:")
-                        st.audio(audio_file, format=f'audio/{selected_format_aws}')
+                            output_format=selected_format_aws
+                        ),
+                        chunks,
+                        aws_format,
+                        "polly",
+                        max_parallel=max_parallel
+                    )
+                    if show_chunked_result(chunked_result, len(chunks)):
+                        play_audio(chunked_result.audio, output_filename_aws, aws_format)
                     
                 else:
                     # Process the text as a single chunk
-                    time_taken = aws_synthesize_speech(
+                    synthesis = aws_synthesize_speech(
                         text_aws,
-                        output_filename_aws,
                         selected_text_type_aws,
                         voice_id=selected_voice_id_aws,
                         engine=selected_engine_aws,
@@ -636,11 +829,297 @@ with tab3:
                         # text_type=selected_text_type_aws
                     )
                     
-                    if time_taken is not None:
-                        st.success(f"Audio synthesized successfully! Time taken: {time_taken:.2f} seconds")
-                        st.audio(output_filename_aws, format=f'audio/{selected_format_aws}')
+                    if synthesis is not None:
+                        st.success(f"Audio synthesized successfully! Time taken: {synthesis.time_taken:.2f} seconds")
+                        play_audio(synthesis.audio, output_filename_aws, aws_format)
         else:
             if not text_aws:
                 st.error("Please enter text to synthesize.")
             if not aws_credentials_configured:
-                st.error("AWS credentials are not properly configured.")
\ No newline at end of file
+                st.error("AWS credentials are not properly configured.")
+
+
+# Languages offered by the Auto and Compare tabs
+auto_language_options = {
+    "English (US)": "en-US",
+    "English (India)": "en-IN",
+    "Hindi (India)": "hi-IN",
+    "Spanish (Spain)": "es-ES",
+    "French (France)": "fr-FR",
+    "German (Germany)": "de-DE",
+    "Japanese (Japan)": "ja-JP"
+}
+
+
+# Auto Tab: the router picks the fastest healthy provider with an equivalent voice
+@tab_fragment("auto")
+def auto_tab():
+    st.header("Auto Provider Routing")
+    text_auto = st.text_area("Enter Text for Auto TTS", "Hello, how are you today?")
+    output_filename_auto = "auto_output_audio.mp3"
+
+    col1, col2 = st.columns(2)
+    with col1:
+        language_auto = st.selectbox("Select Language (Auto)", list(auto_language_options.keys()))
+    with col2:
+        gender_auto = st.selectbox("Voice Gender", ["Any", "Female", "Male"])
+
+    router = get_router()
+    if st.button("Synthesize Speech (Auto)"):
+        if text_auto:
+            with st.spinner("Routing and synthesizing..."):
+                try:
+                    synthesis, decision = router.synthesize(
+                        text_auto,
+                        auto_language_options[language_auto],
+                        None if gender_auto == "Any" else gender_auto,
+                        credentials=st.secrets
+                    )
+                except Exception as e:
+                    st.error(f"Routing failed: {str(e)}")
+                else:
+                    st.success(f"Synthesized by {decision.provider} ({decision.voices[decision.provider]['voice']}) "
+                               f"in {synthesis.time_taken:.2f} seconds")
+                    if len(decision.attempts) > 1:
+                        st.warning("Failed over: " + " -> ".join(a["provider"] for a in decision.attempts))
+                    st.write("Routing order: " + ", ".join(decision.ranking))
+                    play_audio(synthesis.audio, output_filename_auto, resolve_format(decision.provider))
+        else:
+            st.error("Please enter text to synthesize.")
+
+    # Rolling per-provider stats behind the routing decisions (shared by all sessions)
+    routing_stats = router.table.snapshot()
+    if routing_stats:
+        st.subheader("Provider Health")
+        st.table(routing_stats)
+
+
+# Compare Tab: one text through several providers and voices at once, shown as each finishes
+@tab_fragment("compare")
+def compare_tab():
+    st.header("Compare Providers")
+    text_compare = st.text_area("Enter Text to Compare", "Hello, how are you today?")
+    language_compare = auto_language_options[st.selectbox(
+        "Select Language (Compare)", list(auto_language_options.keys())
+    )]
+
+    # Defaults to the voice the router would pick for each provider with credentials
+    configured = [provider for provider, keys in REQUIRED_CREDENTIALS.items()
+                  if secrets_for(keys[0]) is not None and has_credentials(provider, st.secrets)]
+    if not configured:
+        st.error("No provider credentials are configured.")
+        return
+    defaults = equivalent_voices(language_compare, catalog=voice_catalog, credentials=st.secrets, providers=configured)
+    candidates = []
+    for provider in configured:
+        language_filter = None if provider == "elevenlabs" else language_compare
+        options = voice_options(provider, language_filter, secrets_for(REQUIRED_CREDENTIALS[provider][0]))
+        default_labels = [label for label, voice_id in options.items()
+                          if voice_id == defaults.get(provider, {}).get("voice")]
+        for label in st.multiselect(f"{provider} voices", list(options.keys()), default=default_labels):
+            voice = voice_catalog.get(provider, options[label], st.secrets)
+            candidates.append({"provider": provider, "label": label, "quality": audio_quality,
+                               **voice_settings(voice, language_compare)})
+
+    if st.button("Compare"):
+        if not text_compare:
+            st.error("Please enter text to synthesize.")
+        elif not candidates:
+            st.error("Select at least one voice.")
+        else:
+            st.caption(f"Synthesizing {len(candidates)} candidates concurrently; rows appear as each finishes")
+            table = st.empty()
+            rows = []
+            ctx = get_script_run_ctx()
+            for n, result in enumerate(compare(
+                text_compare,
+                candidates,
+                st.secrets,
+                initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+            )):
+                rows.append(summary_row(result))
+                table.table(sorted(rows, key=lambda row: row["latency (s)"]))
+                with st.container(border=True):
+                    st.write(f"**{candidate_label(result.candidate)}**")
+                    if result.error:
+                        st.error(result.error)
+                    else:
+                        play_audio(result.audio, f"compare_{n}.{FILE_EXTENSIONS[result.audio_format.name]}",
+                                   result.audio_format)
+
+
+# Document Tab: a book-length upload read, synthesized and written to disk a few chunks at a time
+@tab_fragment("document")
+def document_tab():
+    st.header("Document to Audio")
+    upload = st.file_uploader("Upload a document", type=[extension[1:] for extension in DOCUMENT_READERS])
+    col1, col2 = st.columns(2)
+    with col1:
+        provider_document = st.selectbox("Provider (Document)", list(REQUIRED_CREDENTIALS.keys()))
+    with col2:
+        language_document = auto_language_options[st.selectbox(
+            "Select Language (Document)", list(auto_language_options.keys())
+        )]
+    language_filter = None if provider_document == "elevenlabs" else language_document
+    options = voice_options(provider_document, language_filter,
+                            secrets_for(REQUIRED_CREDENTIALS[provider_document][0]))
+    if not options:
+        st.error(f"No {provider_document} voices are available.")
+        return
+    voice_label = st.selectbox("Select Voice (Document)", list(options.keys()))
+    voice = voice_catalog.get(provider_document, options[voice_label], st.secrets)
+
+    if st.button("Synthesize Document"):
+        if upload is None:
+            st.error("Please upload a document.")
+            return
+        # Audio goes straight to a session file; only the chunks in flight are held in memory
+        upload.seek(0)  # the upload is kept across reruns
+        progress = st.progress(0.0, text="Reading document...")
+        ctx = get_script_run_ctx()
+        # The browser supplies the name, so only its last component's word characters reach the filesystem
+        stem = re.sub(r"[^\w.-]", "_", os.path.splitext(os.path.basename(upload.name))[0]).strip(".") or "document"
+        output_path = session_audio_path(f"document_{stem}.audio")
+        try:
+            with open(output_path, "wb") as out:
+                result = synthesize_document(
+                    read_document(upload, upload.name), provider_document, st.secrets, out,
+                    initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+                    on_chunk=lambda chunks, characters, bytes_written: progress.progress(
+                        min(upload.tell() / max(upload.size, 1), 1.0),
+                        text=f"{chunks} chunks, {characters:,} characters, {bytes_written / 1e6:.1f} MB of audio"
+                    ),
+                    quality=audio_quality, **voice_settings(voice, language_document)
+                )
+        except Exception as e:
+            st.error(f"Error while synthesizing the document: {str(e)}")
+            return
+        filename = f"{stem}.{FILE_EXTENSIONS[result.audio_format.name]}"
+        final_path = session_audio_path(filename)
+        os.replace(output_path, final_path)
+        progress.progress(1.0, text=f"{result.chunks} chunks, {result.characters:,} characters")
+        st.success(f"Document synthesized in {result.wall_time:.1f} seconds "
+                   f"({result.bytes_written / 1e6:.1f} MB of {result.audio_format.name})")
+        st.audio(final_path, format=MIME_TYPES[result.audio_format.name])
+        st.caption(f"Saved to {final_path}")
+
+
+# Jobs Tab: this session's background jobs, polled every few seconds
+@st.fragment(run_every=2)
+def jobs_tab():
+    st.header("Background Jobs")
+    job_queue = get_job_queue()
+    queue_stats = job_queue.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Queued", queue_stats["queued"])
+    col2.metric("Running", queue_stats["running"])
+    col3.metric("Jobs / min (5 min)", f"{queue_stats['jobs_per_minute']:.1f}")
+    col4.metric("Mean queue wait", f"{queue_stats['mean_queue_seconds']:.1f}s")
+    st.caption("Counts cover every session and worker process sharing the job database")
+
+    jobs = job_queue.jobs(session_id())
+    if not jobs:
+        st.info("No jobs yet. Tick \"Run in background\" in the sidebar to queue syntheses here.")
+        return
+    for job in jobs:
+        with st.container(border=True):
+            preview = job["text"] if len(job["text"]) <= 80 else job["text"][:77] + "..."
+            st.write(f"**{job['provider']}** · {job['status']} · {preview}")
+            if job["status"] == "queued":
+                if st.button("Cancel", key=f"cancel_{job['id']}"):
+                    job_queue.cancel(job["id"])
+            elif job["status"] == "running":
+                st.progress(job["progress"], text=f"{job['progress']:.0%} of chunks done")
+            elif job["status"] == "failed":
+                st.error(job["error"])
+            elif job["status"] == "done":
+                audio, audio_format = job_queue.result(job)
+                st.caption(f"Waited {job['started_at'] - job['created_at']:.1f}s, "
+                           f"ran {job['finished_at'] - job['started_at']:.1f}s")
+                play_audio(audio, os.path.basename(job["result_path"]), audio_format)
+                st.download_button("Download", audio, file_name=os.path.basename(job["result_path"]),
+                                   mime=MIME_TYPES[audio_format.name], key=f"download_{job['id']}")
+
+
+# Metrics Tab: live per-provider phase histograms, refreshed every few seconds
+@st.fragment(run_every=5)
+def metrics_tab():
+    st.header("Request Metrics")
+    phase_histograms = metrics.registry.histograms("tts_phase_seconds")
+    providers = sorted({labels["provider"] for labels, _ in phase_histograms})
+    if not providers:
+        st.info("No requests recorded yet.")
+        return
+
+    requests_by_provider = {}
+    for labels, value in metrics.registry.counters("tts_requests_total"):
+        requests_by_provider.setdefault(labels["provider"], {})[labels["status"]] = value
+    chars = {labels["provider"]: value for labels, value in metrics.registry.counters("tts_characters_total")}
+    audio_bytes = {labels["provider"]: value for labels, value in metrics.registry.counters("tts_audio_bytes_total")}
+    st.table([{
+        "provider": provider,
+        "requests": sum(requests_by_provider.get(provider, {}).values()),
+        "cache hits": requests_by_provider.get(provider, {}).get("cache_hit", 0),
+        "coalesced": requests_by_provider.get(provider, {}).get("coalesced", 0),
+        "errors": requests_by_provider.get(provider, {}).get("error", 0),
+        "characters": chars.get(provider, 0),
+        "audio bytes": audio_bytes.get(provider, 0),
+    } for provider in providers])
+
+    st.subheader("Provider queue")
+    st.caption("Calls from all sessions, admitted under per-provider request and character budgets")
+    st.table([{
+        "provider": row["provider"],
+        "queued": row["queued"],
+        "sessions waiting": row["sessions_waiting"],
+        "in flight": f"{row['in_flight']} / {row['max_in_flight']}",
+        "budget": f"{row['requests_per_second']:g} req/s, {row['chars_per_minute']:,.0f} chars/min",
+        "admitted": row["admitted"],
+        "mean wait (s)": round(row["mean_wait"], 3),
+        "max wait (s)": round(row["max_wait"], 3),
+    } for row in get_scheduler().stats()])
+
+    provider = st.selectbox("Provider", providers)
+    phases = {labels["phase"]: histogram for labels, histogram in phase_histograms if labels["provider"] == provider}
+    st.table([{
+        "phase": phase,
+        "count": histogram.count,
+        "mean (ms)": round(histogram.sum / histogram.count * 1000, 1),
+        "p50 <= (s)": histogram.quantile(0.5),
+        "p95 <= (s)": histogram.quantile(0.95),
+    } for phase, histogram in sorted(phases.items())])
+    bucket_labels = [f"<= {bound}s" for bound in metrics.LATENCY_BUCKETS] + ["> 30s"]
+    st.bar_chart(pd.DataFrame({phase: histogram.counts for phase, histogram in phases.items()}, index=bucket_labels))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Prometheus metrics", metrics.registry.prometheus_text(), file_name="metrics.prom")
+    with col2:
+        st.download_button("Traces (OTLP JSON)", metrics.otel_json(), file_name="traces.json")
+
+
+with tab1:
+    google_tab()
+with tab2:
+    elevenlabs_tab()
+with tab3:
+    polly_tab()
+with tab4:
+    auto_tab()
+with tab5:
+    compare_tab()
+with tab6:
+    document_tab()
+with tab7:
+    jobs_tab()
+with tab8:
+    metrics_tab()
+
+# Startup/rerun timing report. Widget changes inside a tab rerun only that tab's
+# fragment, so the full-script time below is paid only on sidebar changes and reloads.
+with timing_report.container():
+    startup = startup_timings()
+    st.write(f"Module imports at startup: {startup['imports'] * 1000:.0f} ms")
+    st.write(f"This full run: {(time.perf_counter() - SCRIPT_STARTED) * 1000:.0f} ms")
+    for name, seconds in st.session_state.get("render_times", {}).items():
+        st.write(f"Last {name} tab render: {seconds * 1000:.0f} ms")
@@ -0,0 +1,367 @@
+# Asyncio variant of the synthesis engine. One event loop multiplexes many
+# in-flight requests: ElevenLabs over a shared aiohttp.ClientSession, Google over
+# TextToSpeechAsyncClient, and Polly (boto3 has no asyncio API) on a bounded
+# thread pool. Request settings, cache keys, caching, errors, tracing and request
+# coalescing are shared with tts_engine, and the blocking facade at the bottom runs coroutines on a background loop so
+# synchronous callers (the Streamlit tabs, batch.py) can use it unchanged.
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+
+import aiohttp
+
+import tts_engine
+from audio_merge import merge_audio_bytes
+from chunking import chunk_for_provider, needs_chunking
+from clients import POLLY_MAX_POOL_CONNECTIONS
+from metrics import span, traced
+from resilience import PROVIDER_POLICIES, DeadlineExceeded, RetryPolicy, async_call_with_retry, get_latency_tracker
+from scheduler import current_session, get_scheduler, set_session
+from singleflight import coalesced
+from tts_engine import (ELEVENLABS_DEFAULT_FORMAT, Synthesis, TTSError, _finish, _google_error, _require,
+                        elevenlabs_cache_key, elevenlabs_request, google_audio_config, google_cache_key,
+                        provider_request, serve_from_cache)
+
+# Upper bound on concurrent ElevenLabs connections from one event loop. aiohttp's
+# connector hands a freed connection to the next waiter in O(1); httpx's pool
+# rescans every connection for every queued request, which cost more CPU than
+# the threaded engine at a few dozen connections.
+ASYNC_MAX_CONNECTIONS = int(os.getenv("TTS_ASYNC_MAX_CONNECTIONS", "256"))
+
+
+class AsyncEngine:
+    """Provider clients bound to one event loop, and the async synthesis calls that use them.
+
+    Cache lookups and writes stay synchronous: they are local file operations
+    of a few hundred microseconds, well below a provider round trip.
+    """
+
+    def __init__(self, max_connections=ASYNC_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._http = None
+        self._google_clients = {}
+        self._polly_executor = ThreadPoolExecutor(max_workers=POLLY_MAX_POOL_CONNECTIONS,
+                                                  thread_name_prefix="polly")
+
+    def http(self):
+        """Returns the engine's keep-alive aiohttp.ClientSession (created on the engine's loop)."""
+        if self._http is None:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections),
+                timeout=aiohttp.ClientTimeout(sock_connect=tts_engine.ELEVENLABS_TIMEOUT[0],
+                                              sock_read=tts_engine.ELEVENLABS_TIMEOUT[1])
+            )
+        return self._http
+
+    def google_client(self, credentials_info):
+        """Returns the engine's TextToSpeechAsyncClient for a service account."""
+        credentials_info = dict(credentials_info)
+        key = (credentials_info.get("client_email"), credentials_info.get("private_key_id"))
+        client = self._google_clients.get(key)
+        if client is None:
+            from google.cloud import texttospeech
+            from google.oauth2 import service_account
+
+            credentials = service_account.Credentials.from_service_account_info(credentials_info)
+            client = texttospeech.TextToSpeechAsyncClient(credentials=credentials)
+            self._google_clients[key] = client
+        return client
+
+    async def _call(self, provider, request, chars=0):
+        """Awaits a provider request with retries/backoff, surfacing deadline errors as TTSError.
+
+        Like tts_engine._call, every attempt first waits for the process-wide
+        scheduler to admit it, so async and thread callers share one set of
+        request and character budgets.
+        """
+        policy = PROVIDER_POLICIES.get(provider, RetryPolicy())
+        tracker = get_latency_tracker(provider)
+        scheduler = get_scheduler()
+
+        async def attempt():
+            with span("queue", provider=provider, chars=chars):
+                await scheduler.acquire_async(provider, chars)
+            try:
+                start_time = time.monotonic()
+                result = await request()
+                tracker.record(time.monotonic() - start_time)
+                return result
+            finally:
+                scheduler.release(provider)
+
+        try:
+            with span("network", provider=provider):
+                return await async_call_with_retry(attempt, policy)
+        except DeadlineExceeded as e:
+            raise TTSError(str(e), provider=provider) from e
+
+    @traced("google")
+    @coalesced(google_cache_key)
+    async def google_synthesize_speech(self, text, language_code, voice_name, speaking_rate=1.0, pitch=0.0,
+                                       credentials=None, audio_encoding="MP3", sample_rate_hertz=None):
+        """Synthesizes speech from the input string of text using Google TTS."""
+        from google.cloud import texttospeech
+
+        start_time = time.time()
+        cache_key = google_cache_key(text, language_code, voice_name, speaking_rate, pitch, audio_encoding,
+                                     sample_rate_hertz)
+        cached = serve_from_cache(cache_key, start_time)
+        if cached is not None:
+            return cached
+        client = self.google_client(_require(credentials, "gcp_service_account", "google"))
+        input_text = texttospeech.SynthesisInput(text=text)
+        voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
+        audio_config = google_audio_config(texttospeech, audio_encoding, sample_rate_hertz, speaking_rate, pitch)
+
+        async def request():
+            try:
+                return await client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_config,
+                                                      timeout=tts_engine.GOOGLE_TIMEOUT)
+            except Exception as e:
+                raise _google_error(e) from e
+
+        response = await self._call("google", request, len(text))
+        return _finish(cache_key, response.audio_content, start_time)
+
+    @traced("elevenlabs")
+    @coalesced(elevenlabs_cache_key)
+    async def elevenlabs_synthesize_speech(self, text, api_key, voice_id, model_id="eleven_monolingual_v1",
+                                           output_format=ELEVENLABS_DEFAULT_FORMAT):
+        """Synthesizes speech from the input string of text using ElevenLabs."""
+        start_time = time.time()
+        cache_key = elevenlabs_cache_key(text, voice_id, model_id, output_format)
+        cached = serve_from_cache(cache_key, start_time)
+        if cached is not None:
+            return cached
+        url, headers = elevenlabs_request(voice_id, api_key, output_format)
+        data = {
+            "text": text,
+            "model_id": model_id,
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.5
+            }
+        }
+
+        async def request():
+            try:
+                async with self.http().post(url, json=data, headers=headers) as response:
+                    body = await response.read()
+            except Exception as e:
+                raise TTSError(str(e) or type(e).__name__, provider="elevenlabs") from e
+            if response.status != 200:
+                raise TTSError(f"{response.status}, {body.decode('utf-8', 'replace')}", provider="elevenlabs",
+                               status_code=response.status)
+            return body
+
+        audio = await self._call("elevenlabs", request, len(text))
+        return _finish(cache_key, audio, start_time)
+
+    async def aws_synthesize_speech(self, text, texttype, voice_id="Joanna", engine="neural", output_format="mp3",
+                                    credentials=None):
+        """Synthesizes speech with AWS Polly on the engine's thread pool (boto3 is blocking).
+
+        tts_engine.aws_synthesize_speech is traced and coalesced itself.
+        """
+        loop = asyncio.get_running_loop()
+        # The copied context queues the call under this task's scheduler session
+        return await loop.run_in_executor(self._polly_executor, functools.partial(
+            contextvars.copy_context().run, tts_engine.aws_synthesize_speech, text, texttype, voice_id=voice_id,
+            engine=engine, output_format=output_format, credentials=credentials
+        ))
+
+    async def synthesize(self, provider, text, credentials, voice=None, language=None, model=None, engine="neural",
+                         output_format="mp3", speaking_rate=1.0, pitch=0.0, text_type="text", max_parallel=4,
+                         quality=None):
+        """Async counterpart of tts_engine.synthesize: chunks, synthesizes chunks concurrently and merges.
+
+        Returns a Synthesis; raises TTSError on failure.
+        """
+        synthesize_text, _, audio_format, chunk_limit = provider_request(
+            provider, credentials, voice=voice, language=language, model=model, engine=engine,
+            output_format=output_format, speaking_rate=speaking_rate, pitch=pitch, text_type=text_type,
+            quality=quality, backend=self
+        )
+        if not needs_chunking(text, provider, max_chars=chunk_limit):
+            return await synthesize_text(text)
+
+        chunks = chunk_for_provider(text, provider, ssml=text_type == "ssml", max_chars=chunk_limit)
+        semaphore = asyncio.Semaphore(max_parallel)
+        start_time = time.time()
+
+        async def run_chunk(chunk):
+            async with semaphore:
+                return await synthesize_text(chunk)
+
+        results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        errors = [f"Chunk {i+1}: {result}" for i, result in enumerate(results) if isinstance(result, Exception)]
+        if errors:
+            raise TTSError(f"{len(errors)} of {len(chunks)} chunks failed: {'; '.join(errors)}", provider=provider)
+        audio = merge_audio_bytes([result.audio for result in results], audio_format.name)
+        return Synthesis(audio, time.time() - start_time)
+
+    async def synthesize_many(self, requests, max_in_flight=ASYNC_MAX_CONNECTIONS):
+        """Runs many synthesize() calls concurrently.
+
+        requests is a list of keyword-argument dicts for synthesize(). Returns
+        results in order; failed requests return their exception.
+        """
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def run(request):
+            async with semaphore:
+                return await self.synthesize(**request)
+
+        return await asyncio.gather(*(run(request) for request in requests), return_exceptions=True)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        self._polly_executor.shutdown(wait=False)
+
+
+# Blocking facade: one background event loop per process runs every coroutine, so
+# concurrent callers share its connections instead of each holding a thread per request.
+_loop = None
+_engine = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop, _engine
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="tts-async-engine", daemon=True).start()
+                _engine = AsyncEngine()
+                _loop = loop
+    return _loop
+
+
+def run(coroutine_function, *args, **kwargs):
+    """Runs an AsyncEngine method on the background loop and blocks for its result.
+
+    The call is queued under the calling thread's scheduler session.
+    """
+    loop = _background_loop()
+    session = current_session()
+
+    async def in_session():
+        set_session(*session)
+        return await coroutine_function(_engine, *args, **kwargs)
+
+    return asyncio.run_coroutine_threadsafe(in_session(), loop).result()
+
+
+def google_synthesize_speech(text, language_code, voice_name, speaking_rate=1.0, pitch=0.0, credentials=None,
+                             audio_encoding="MP3", sample_rate_hertz=None):
+    """Blocking wrapper around AsyncEngine.google_synthesize_speech."""
+    return run(AsyncEngine.google_synthesize_speech, text, language_code, voice_name,
+               speaking_rate=speaking_rate, pitch=pitch, credentials=credentials,
+               audio_encoding=audio_encoding, sample_rate_hertz=sample_rate_hertz)
+
+
+def elevenlabs_synthesize_speech(text, api_key, voice_id, model_id="eleven_monolingual_v1",
+                                 output_format=ELEVENLABS_DEFAULT_FORMAT):
+    """Blocking wrapper around AsyncEngine.elevenlabs_synthesize_speech."""
+    return run(AsyncEngine.elevenlabs_synthesize_speech, text, api_key, voice_id, model_id=model_id,
+               output_format=output_format)
+
+
+def aws_synthesize_speech(text, texttype, voice_id="Joanna", engine="neural", output_format="mp3", credentials=None):
+    """Blocking wrapper around AsyncEngine.aws_synthesize_speech."""
+    return run(AsyncEngine.aws_synthesize_speech, text, texttype, voice_id=voice_id, engine=engine,
+               output_format=output_format, credentials=credentials)
+
+
+def synthesize(provider, text, credentials, **options):
+    """Blocking wrapper around AsyncEngine.synthesize."""
+    return run(AsyncEngine.synthesize, provider, text, credentials, **options)
+
+
+def _serve_mock(port, latency):
+    from mock_providers import MockProviderServer
+
+    server = MockProviderServer(port=port, latency=latency)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    # Load test: the same ElevenLabs requests against a mock server in another
+    # process, with the thread-per-request engine and with the async engine. Both
+    # engines are admitted by the same scheduler; its provider budgets are lifted
+    # here (as in loadtest.py), or both would be capped at ElevenLabs' 3 req/s and
+    # the comparison would measure the budget rather than the engines.
+    import argparse
+    import multiprocessing
+    import socket
+    from concurrent.futures import ThreadPoolExecutor as Pool
+
+    from audio_cache import get_audio_cache
+    import scheduler
+
+    parser = argparse.ArgumentParser(description="Load test the sync and async engines against the mock server.")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32, help="Worker threads for the synchronous engine")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server latency per request")
+    args = parser.parse_args()
+
+    get_audio_cache().enabled = False
+    scheduler.configure(request_budgets={"elevenlabs": 1e6},
+                        char_budgets={"elevenlabs": 1e9},
+                        max_in_flight={"elevenlabs": args.concurrency})
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = multiprocessing.Process(target=_serve_mock, args=(port, args.latency), daemon=True)
+    server.start()
+    time.sleep(0.5)
+    tts_engine.ELEVENLABS_API_BASE = f"http://127.0.0.1:{port}"
+    credentials = {"api_eleven_labs": "load-test"}
+    texts = [f"Load test sentence number {i}." for i in range(args.requests)]
+
+    def report(name, wall, cpu, failures):
+        rps = args.requests / wall
+        per_core = args.requests / cpu if cpu else float("inf")
+        print(f"{name:6s} {rps:8.1f} req/s wall, {per_core:8.1f} req per CPU-second, "
+              f"{failures} failed, {wall:.2f}s total")
+        assert failures == 0, f"{failures} {name} requests failed"
+        return rps
+
+    def sync_request(text):
+        try:
+            tts_engine.synthesize("elevenlabs", text, credentials)
+            return True
+        except Exception:
+            return False
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    with Pool(max_workers=args.threads) as pool:
+        outcomes = list(pool.map(sync_request, texts))
+    sync_rps = report("sync", time.perf_counter() - start, time.process_time() - cpu_start, outcomes.count(False))
+
+    async def async_run():
+        engine = AsyncEngine(max_connections=args.concurrency)
+        try:
+            return await engine.synthesize_many(
+                [{"provider": "elevenlabs", "text": f"Async {text}", "credentials": credentials} for text in texts],
+                max_in_flight=args.concurrency
+            )
+        finally:
+            await engine.aclose()
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    results = asyncio.run(async_run())
+    failures = sum(1 for result in results if isinstance(result, Exception))
+    async_rps = report("async", time.perf_counter() - start, time.process_time() - cpu_start, failures)
+    server.terminate()
+    admitted = sum(row["admitted"] for row in scheduler.get_scheduler().stats())
+    assert admitted == 2 * args.requests, f"{admitted} calls admitted by the scheduler for {2 * args.requests}"
+    assert async_rps >= sync_rps, f"async engine {async_rps:.1f} req/s is slower than the sync one ({sync_rps:.1f})"
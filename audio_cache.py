@@ -0,0 +1,208 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+
+# Defaults can be overridden from the environment (.env is loaded by app.py)
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("TTS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Other processes (API server, job workers) share the directory; the index is rebuilt from disk this often
+CACHE_RESCAN_SECONDS = float(os.getenv("TTS_CACHE_RESCAN_SECONDS", "60"))
+# Set TTS_CACHE_ENABLED=0 to bypass the cache (e.g. when benchmarking providers)
+CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") != "0"
+
+
+def normalize_text(text):
+    """Normalizes text so trivially different inputs share a cache entry."""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(provider, text, **params):
+    """Returns the content address (sha256 hex) of a synthesis request."""
+    normalized = {"provider": provider, "text": normalize_text(text)}
+    for name, value in params.items():
+        if isinstance(value, float):
+            value = round(value, 4)
+        normalized[name] = value
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Content-addressed on-disk audio store with byte-budget LRU and TTL eviction.
+
+    Entries live at <root>/<key[:2]>/<key>. The file mtime records when the
+    entry was written (used for TTL) and the atime records the last hit (used
+    to rebuild LRU order after a restart, or in another process sharing root).
+    Entries written by other processes are adopted on lookup, and the byte
+    budget counts them once the index is rebuilt every rescan_seconds.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS, enabled=True,
+                 rescan_seconds=CACHE_RESCAN_SECONDS):
+        self.root = root
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.rescan_seconds = rescan_seconds
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> (size, created_at), least recently used first
+        self._total_bytes = 0
+        self._scanned_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _load_index(self):
+        with self._lock:
+            self._rescan()
+            self._evict()
+
+    def _rescan(self):
+        # Rebuilds the index from the files on disk, in last-hit order; called with the lock held
+        entries = []
+        if os.path.isdir(self.root):
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted by another process mid-scan
+                    entries.append((stat.st_atime, entry.name, stat.st_size, stat.st_mtime))
+        entries.sort()
+        self._index = OrderedDict((key, (size, created_at)) for _, key, size, created_at in entries)
+        self._total_bytes = sum(size for size, _ in self._index.values())
+        self._scanned_at = time.time()
+
+    def _adopt(self, key):
+        # Indexes an entry another process wrote since the last scan; called with the lock held
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        entry = self._index[key] = (stat.st_size, stat.st_mtime)
+        self._total_bytes += stat.st_size
+        return entry
+
+    def _remove(self, key):
+        size, _ = self._index.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        if now - self._scanned_at > self.rescan_seconds:
+            self._rescan()
+        expired = [key for key, (_, created_at) in self._index.items()
+                   if now - created_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+            self.evictions += 1
+        while self._total_bytes > self.max_bytes and self._index:
+            self._remove(next(iter(self._index)))
+            self.evictions += 1
+
+    def get(self, key):
+        """Returns the cached audio bytes for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._index.get(key) or self._adopt(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                self._remove(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, (time.time(), entry[1]))
+        except FileNotFoundError:
+            with self._lock:
+                if key in self._index:
+                    self._index.pop(key)
+                    self._total_bytes -= entry[0]
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_served += len(data)
+        return data
+
+    def contains(self, key):
+        """Returns True if key has a live entry, without counting a hit or miss."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._index.get(key) or self._adopt(key)
+            return entry is not None and time.time() - entry[1] <= self.ttl_seconds
+
+    def put(self, key, data):
+        """Stores audio bytes under key and evicts entries beyond the byte budget."""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)[0]
+            self._index[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self.bytes_written += len(data)
+            self._evict()
+
+    def stats(self):
+        """Returns hit/miss/byte counters for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_served": self.bytes_served,
+                "bytes_written": self.bytes_written,
+                "entries": len(self._index),
+                "total_bytes": self._total_bytes,
+                "evictions": self.evictions,
+            }
+
+
+_audio_cache = None
+_audio_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """Returns the process-wide AudioCache instance."""
+    global _audio_cache
+    if _audio_cache is None:
+        with _audio_cache_lock:
+            if _audio_cache is None:
+                _audio_cache = AudioCache(enabled=CACHE_ENABLED)
+    return _audio_cache
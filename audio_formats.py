@@ -0,0 +1,284 @@
+from collections import namedtuple
+import io
+import os
+import shutil
+import struct
+import subprocess
+
+# A provider request setting. `name` is the canonical format used for merging,
+# playback and file extensions; `request` is the provider's own value (Google
+# AudioEncoding, ElevenLabs output_format, Polly OutputFormat); `sample_rate`
+# is the rate of the returned audio when it must be known (PCM), else None.
+AudioFormat = namedtuple("AudioFormat", ["name", "request", "sample_rate"])
+
+QUALITY_LEVELS = ("speech", "standard", "lossless")
+
+# Formats requested per provider and target quality. "speech" is the smallest
+# transfer that stays clear for spoken word (about 32 kbps), "standard" is what
+# each tab requested before quality was selectable, "lossless" is 16-bit PCM.
+FORMAT_PRESETS = {
+    "google": {
+        "speech": AudioFormat("ogg_opus", "OGG_OPUS", None),
+        "standard": AudioFormat("mp3", "MP3", None),
+        "lossless": AudioFormat("wav", "LINEAR16", 24000),  # Google adds the WAV header itself
+    },
+    "elevenlabs": {
+        "speech": AudioFormat("mp3", "mp3_22050_32", None),
+        "standard": AudioFormat("mp3", "mp3_44100_128", None),
+        "lossless": AudioFormat("pcm", "pcm_24000", 24000),
+    },
+    "polly": {
+        "speech": AudioFormat("ogg_vorbis", "ogg_vorbis", None),
+        "standard": AudioFormat("mp3", "mp3", None),
+        "lossless": AudioFormat("pcm", "pcm", 16000),  # Polly's default PCM rate
+    },
+}
+
+MIME_TYPES = {
+    "mp3": "audio/mpeg",
+    "ogg_opus": "audio/ogg",
+    "ogg_vorbis": "audio/ogg",
+    "wav": "audio/wav",
+}
+
+# Raw PCM is written and played as WAV, since players cannot guess its rate
+FILE_EXTENSIONS = {"mp3": "mp3", "ogg_opus": "ogg", "ogg_vorbis": "ogg", "wav": "wav", "pcm": "wav"}
+
+FFMPEG = os.getenv("TTS_FFMPEG", "ffmpeg")
+
+_FFMPEG_INPUT = {
+    "mp3": ["-f", "mp3"],
+    "ogg_opus": ["-f", "ogg"],
+    "ogg_vorbis": ["-f", "ogg"],
+    "wav": ["-f", "wav"],
+}
+
+_FFMPEG_OUTPUT = {
+    "mp3": ["-f", "mp3", "-c:a", "libmp3lame", "-b:a", "64k"],
+    "ogg_opus": ["-f", "ogg", "-c:a", "libopus", "-b:a", "32k"],
+    "ogg_vorbis": ["-f", "ogg", "-c:a", "libvorbis", "-q:a", "3"],
+    "wav": ["-f", "wav", "-c:a", "pcm_s16le"],
+    "pcm": ["-f", "s16le", "-c:a", "pcm_s16le", "-ac", "1"],
+}
+
+
+def _playable_name(audio_format):
+    return "wav" if audio_format.name == "pcm" else audio_format.name
+
+
+def resolve_format(provider, quality=None, output_format=None, accept=None):
+    """Returns the AudioFormat to request from a provider.
+
+    With a quality, that preset is used, moving up a level while its format is
+    not in `accept` (canonical names; raw PCM counts as "wav"). Otherwise
+    output_format picks the preset that returns it, defaulting to "standard".
+    Raises ValueError if the provider cannot return output_format.
+    """
+    presets = FORMAT_PRESETS[provider]
+    if quality is not None:
+        if quality not in presets:
+            raise ValueError(f"Unknown quality '{quality}' (expected one of {', '.join(QUALITY_LEVELS)})")
+        levels = QUALITY_LEVELS[QUALITY_LEVELS.index(quality):]
+        for level in levels:
+            if accept is None or _playable_name(presets[level]) in accept:
+                return presets[level]
+        raise ValueError(f"{provider} cannot return any of {', '.join(sorted(accept))} at {quality} quality")
+    if output_format is None:
+        return presets["standard"]
+    for level in ("standard", "speech", "lossless"):
+        if presets[level].name == output_format:
+            return presets[level]
+    raise ValueError(f"{provider} cannot return {output_format}; request another format and convert it")
+
+
+def wav_header(data_size, sample_rate, channels=1, sample_width=2):
+    """Returns the 44-byte RIFF/WAVE header for data_size bytes of little-endian PCM."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * channels * sample_width,
+        channels * sample_width, sample_width * 8,
+        b"data", data_size
+    )
+
+
+def wav_parts(pcm, sample_rate):
+    """Returns (header, payload) to write PCM as WAV; the payload is a view, not a copy."""
+    return wav_header(len(pcm), sample_rate), memoryview(pcm)
+
+
+def wav_data_range(f):
+    """Returns (fmt chunk bytes, data start, data size) of an open WAV file."""
+    f.seek(0)
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("Invalid WAV header")
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("WAV file has no data chunk")
+        chunk_id, size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"data":
+            start = f.tell()
+            f.seek(0, os.SEEK_END)
+            # Streamed WAVs may carry a placeholder size; trust the file length instead
+            return fmt, start, min(size, f.tell() - start)
+        body = f.read(size + (size & 1))
+        if chunk_id == b"fmt ":
+            fmt = body[:size]
+
+
+def pcm_payload(wav):
+    """Returns the PCM samples of in-memory WAV audio."""
+    _, start, size = wav_data_range(io.BytesIO(wav))
+    return wav[start:start + size]
+
+
+def stream_format(audio_format):
+    """Returns the format of streamed audio: WAV chunks are streamed as raw PCM, so they concatenate."""
+    if audio_format.name == "wav":
+        return audio_format._replace(name="pcm")
+    return audio_format
+
+
+def to_wav(audio, audio_format):
+    """Returns audio as a browser-playable WAV if it is raw PCM, else unchanged."""
+    if audio_format.name != "pcm":
+        return audio
+    return b"".join(wav_parts(audio, audio_format.sample_rate))
+
+
+def playable(audio, audio_format):
+    """Returns (audio, MIME type) for st.audio; raw PCM gets a WAV header."""
+    return to_wav(audio, audio_format), MIME_TYPES[_playable_name(audio_format)]
+
+
+def write_audio_file(audio, audio_format, path):
+    """Writes audio to path, writing raw PCM as WAV (header, then the payload without copying)."""
+    with open(path, "wb") as out:
+        if audio_format.name == "pcm":
+            out.writelines(wav_parts(audio, audio_format.sample_rate))
+        else:
+            out.write(audio)
+    return path
+
+
+# MPEG audio Layer III bitrates (kbps) by header index, for MPEG-1 and for MPEG-2/2.5
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mp3_duration(audio):
+    """Returns the playing time of MP3 audio in seconds by walking its frame headers."""
+    data = memoryview(audio)
+    pos = 0
+    if bytes(data[:3]) == b"ID3" and len(data) >= 10:
+        pos = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+    seconds = 0.0
+    while pos + 4 <= len(data):
+        b1, b2 = data[pos + 1], data[pos + 2]
+        version = (b1 >> 3) & 3
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or ((b1 >> 1) & 3) != 1:
+            break  # not a Layer III frame header (e.g. a trailing ID3v1 tag)
+        bitrate = _MP3_BITRATES[3 if version == 3 else 2][b2 >> 4] * 1000
+        rate_index = (b2 >> 2) & 3
+        if not bitrate or rate_index == 3:
+            break
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        samples = 1152 if version == 3 else 576
+        pos += samples // 8 * bitrate // sample_rate + ((b2 >> 1) & 1)
+        seconds += samples / sample_rate
+    return seconds
+
+
+def ogg_duration(audio):
+    """Returns the playing time of Ogg Opus/Vorbis audio, summing every chained logical stream."""
+    data = memoryview(audio)
+    streams = {}  # serial -> [sample rate, samples to skip, last granule position]
+    pos = 0
+    while pos + 27 <= len(data) and bytes(data[pos:pos + 4]) == b"OggS":
+        granule, serial = struct.unpack_from("<qI", data, pos + 6)
+        segments = data[pos + 26]
+        body = pos + 27 + segments
+        size = sum(data[pos + 27:body])
+        if serial not in streams:
+            head = bytes(data[body:body + 19])
+            if head.startswith(b"OpusHead"):
+                streams[serial] = [48000, struct.unpack_from("<H", head, 10)[0], 0]
+            elif head.startswith(b"\x01vorbis"):
+                streams[serial] = [struct.unpack_from("<I", head, 12)[0], 0, 0]
+            else:
+                streams[serial] = [48000, 0, 0]
+        if granule > 0:
+            streams[serial][2] = granule
+        pos = body + size
+    return sum(max(0, granule - skip) / rate for rate, skip, granule in streams.values() if rate)
+
+
+def audio_duration(audio, audio_format):
+    """Returns the playing time in seconds of audio in an AudioFormat."""
+    if audio_format.name == "mp3":
+        return mp3_duration(audio)
+    if audio_format.name in ("ogg_opus", "ogg_vorbis"):
+        return ogg_duration(audio)
+    if audio_format.name == "wav":
+        fmt, _, size = wav_data_range(io.BytesIO(audio))
+        return size / struct.unpack_from("<I", fmt, 8)[0]
+    return len(audio) / (2 * audio_format.sample_rate)
+
+
+def ffmpeg_available():
+    return shutil.which(FFMPEG) is not None
+
+
+def convert(audio, source, target):
+    """Converts audio from AudioFormat source to the canonical format name target.
+
+    PCM to WAV only adds a header; any other change of format is a transcode
+    through ffmpeg, which raises RuntimeError if ffmpeg is not installed or fails.
+    """
+    if source.name == target:
+        return audio
+    if source.name == "pcm" and target == "wav":
+        return to_wav(audio, source)
+    if target not in _FFMPEG_OUTPUT:
+        raise ValueError(f"Unsupported target format: {target}")
+    if not ffmpeg_available():
+        raise RuntimeError(f"Converting {source.name} to {target} needs ffmpeg (set TTS_FFMPEG to its path)")
+    if source.name == "pcm":
+        input_args = ["-f", "s16le", "-ar", str(source.sample_rate), "-ac", "1"]
+    else:
+        input_args = _FFMPEG_INPUT[source.name]
+    command = [FFMPEG, "-hide_banner", "-loglevel", "error", *input_args, "-i", "pipe:0",
+               *_FFMPEG_OUTPUT[target], "pipe:1"]
+    process = subprocess.run(command, input=audio, capture_output=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed converting {source.name} to {target}: "
+                           f"{process.stderr.decode(errors='replace').strip()}")
+    return process.stdout
+
+
+if __name__ == "__main__":
+    # Payload size per quality level against the mock ElevenLabs backend, which
+    # sizes its audio by the requested output_format like the real API.
+    import tempfile
+
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp())
+    from mock_providers import MockProviderServer
+    import tts_engine
+
+    text = "Your order has shipped and should arrive on Thursday. " * 4
+    with MockProviderServer(latency=0.01) as server:
+        tts_engine.ELEVENLABS_API_BASE = server.base_url
+        sizes = {}
+        for quality in QUALITY_LEVELS:
+            audio_format = resolve_format("elevenlabs", quality)
+            result = tts_engine.synthesize("elevenlabs", text, {"api_eleven_labs": "key"}, quality=quality)
+            sizes[quality] = len(to_wav(result.audio, audio_format))
+            print(f"{quality:9s} {audio_format.request:14s} {sizes[quality]:8,d} bytes "
+                  f"({MIME_TYPES[_playable_name(audio_format)]})")
+    print(f"speech is {sizes['standard'] / sizes['speech']:.1f}x smaller than standard")
@@ -0,0 +1,206 @@
+import io
+import os
+import random
+import shutil
+import struct
+
+from audio_formats import wav_data_range, wav_header
+
+# Copy buffer size for streaming merges; inputs are never loaded whole into memory
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _copy_range(src, dst, start, end):
+    """Copies bytes [start, end) of the open file src into dst."""
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = src.read(min(COPY_BUFFER_SIZE, remaining))
+        if not block:
+            break
+        dst.write(block)
+        remaining -= len(block)
+    return end - start - remaining
+
+
+def _mp3_payload_range(f):
+    """Returns the (start, end) byte range of an MP3 file without ID3v2/ID3v1 tags."""
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    f.seek(0)
+    header = f.read(10)
+    start = 0
+    if len(header) == 10 and header[:3] == b"ID3":
+        # ID3v2 size is a 28-bit syncsafe integer, excluding the 10-byte header
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        footer = 10 if header[5] & 0x10 else 0
+        start = 10 + size + footer
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b"TAG":
+            end -= 128
+    return start, end
+
+
+def merge_mp3(sources, out):
+    """Concatenates MP3 streams frame-to-frame, dropping per-file ID3 tags."""
+    written = 0
+    for f in sources:
+        start, end = _mp3_payload_range(f)
+        written += _copy_range(f, out, start, end)
+    return written
+
+
+def merge_pcm(sources, out):
+    """Appends raw PCM streams back-to-back."""
+    written = 0
+    for f in sources:
+        shutil.copyfileobj(f, out, COPY_BUFFER_SIZE)
+        written += f.tell()
+    return written
+
+
+def merge_wav(sources, out):
+    """Concatenates the data chunks of WAV files under a single header.
+
+    The header is written last, once the total data size is known, so out must be seekable.
+    """
+    header_pos = out.tell()
+    fmt = None
+    written = 0
+    for f in sources:
+        chunk_fmt, start, size = wav_data_range(f)
+        if fmt is None:
+            fmt = chunk_fmt
+            out.write(bytes(44))
+        elif chunk_fmt != fmt:
+            raise ValueError("Cannot merge WAV files with different sample formats")
+        written += _copy_range(f, out, start, start + size)
+    if fmt is None:
+        return 0
+    channels, sample_rate = struct.unpack_from("<HI", fmt, 2)
+    sample_width = struct.unpack_from("<H", fmt, 14)[0] // 8
+    end = out.tell()
+    out.seek(header_pos)
+    out.write(wav_header(written, sample_rate, channels, sample_width))
+    out.seek(end)
+    return written + 44
+
+
+def _make_ogg_crc_table():
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC_TABLE = _make_ogg_crc_table()
+
+
+def _ogg_crc(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[((crc >> 24) & 0xFF) ^ byte]
+    return crc
+
+
+def _iter_ogg_pages(f):
+    """Yields (header, segment_table, body) for each page of an Ogg file."""
+    while True:
+        header = f.read(27)
+        if len(header) < 27:
+            return
+        if header[:4] != b"OggS":
+            raise ValueError("Invalid Ogg page header")
+        segment_table = f.read(header[26])
+        body = f.read(sum(segment_table))
+        yield header, segment_table, body
+
+
+def merge_ogg(sources, out):
+    """Chains Ogg streams page by page into one physical stream.
+
+    Each input stays its own logical bitstream (a valid Ogg chain), so no
+    re-encoding is needed. Pages are copied verbatim unless two inputs share a
+    serial number, in which case the serial is rewritten and the CRC recomputed.
+    """
+    written = 0
+    used_serials = set()
+    for f in sources:
+        serial_map = {}
+        for header, segment_table, body in _iter_ogg_pages(f):
+            serial = struct.unpack_from("<I", header, 14)[0]
+            if serial not in serial_map:
+                new_serial = serial
+                while new_serial in used_serials:
+                    new_serial = random.getrandbits(32)
+                used_serials.add(new_serial)
+                serial_map[serial] = new_serial
+            if serial_map[serial] != serial:
+                page_header = bytearray(header)
+                struct.pack_into("<I", page_header, 14, serial_map[serial])
+                struct.pack_into("<I", page_header, 22, 0)
+                crc = _ogg_crc(bytes(page_header) + segment_table + body)
+                struct.pack_into("<I", page_header, 22, crc)
+                header = bytes(page_header)
+            out.write(header)
+            out.write(segment_table)
+            out.write(body)
+            written += len(header) + len(segment_table) + len(body)
+    return written
+
+
+_MERGERS = {
+    "mp3": merge_mp3,
+    "pcm": merge_pcm,
+    "ogg_vorbis": merge_ogg,
+    "ogg_opus": merge_ogg,
+    "wav": merge_wav,
+}
+
+
+def merge_audio_stream(sources, out, output_format):
+    """Merges chunk audio from an iterable of binary file objects into the open file out, in order.
+
+    Sources are read one at a time as the iterable yields them, so they can be
+    produced while earlier ones are written. Returns the number of bytes written.
+    """
+    if output_format not in _MERGERS:
+        raise ValueError(f"Unsupported output format for merging: {output_format}")
+    return _MERGERS[output_format](sources, out)
+
+
+def _open_all(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            yield f
+
+
+def merge_audio_files(input_paths, output_path, output_format, remove_inputs=False):
+    """Merges chunk audio files into output_path without re-encoding.
+
+    Returns the number of bytes written.
+    """
+    if output_format not in _MERGERS:
+        raise ValueError(f"Unsupported output format for merging: {output_format}")
+    with open(output_path, "wb") as out:
+        written = merge_audio_stream(_open_all(input_paths), out, output_format)
+    if remove_inputs:
+        for path in input_paths:
+            if os.path.abspath(path) != os.path.abspath(output_path):
+                os.remove(path)
+    return written
+
+
+def merge_audio_bytes(parts, output_format):
+    """Merges in-memory chunk audio without re-encoding and returns the merged bytes."""
+    if output_format not in _MERGERS:
+        raise ValueError(f"Unsupported output format for merging: {output_format}")
+    if len(parts) == 1:
+        return bytes(parts[0])
+    out = io.BytesIO()
+    merge_audio_stream((io.BytesIO(part) for part in parts), out, output_format)
+    return out.getvalue()
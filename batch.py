@@ -0,0 +1,165 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import tts_engine
+from audio_formats import FILE_EXTENSIONS, MIME_TYPES, convert, resolve_format, write_audio_file
+
+# Manifest columns understood by the batch runner (only `text` and `provider` are required)
+MANIFEST_FIELDS = ("id", "text", "provider", "voice", "language", "model", "engine", "format", "quality",
+                   "speaking_rate", "pitch", "text_type", "output")
+
+
+def read_manifest(path):
+    """Reads manifest rows from a CSV or JSONL file, assigning ids to rows without one."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for index, row in enumerate(rows):
+        if not row.get("id"):
+            row["id"] = str(index + 1)
+        row["id"] = str(row["id"])
+    return rows
+
+
+def read_checkpoint(results_path):
+    """Returns the ids already completed successfully in a results manifest."""
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line after a crash
+                continue
+            if result.get("status") == "ok":
+                completed.add(str(result["id"]))
+    return completed
+
+
+def run_item(row, output_dir, credentials, convert_to=None):
+    """Synthesizes one manifest row and returns its result record.
+
+    Raw PCM is written as WAV; with convert_to every file is converted to that format.
+    """
+    # Missing fields are reported as the item's error below, so one bad row does not stop the batch
+    provider = str(row.get("provider") or "").strip().lower()
+    text = row.get("text")
+    output_format = row.get("format") or "mp3"
+    quality = row.get("quality") or None
+    try:
+        audio_format = resolve_format(provider, quality, output_format)
+    except (KeyError, ValueError):
+        # Reported as the item's error by tts_engine.synthesize below
+        audio_format = None
+    extension = FILE_EXTENSIONS.get(convert_to or (audio_format.name if audio_format else output_format), "bin")
+    output = row.get("output") or os.path.join(output_dir, f"{row['id']}_{provider}.{extension}")
+    result = {
+        "id": row["id"],
+        "provider": provider,
+        "output": output,
+        "chars": len(text) if isinstance(text, str) else 0,
+    }
+    start_time = time.time()
+    try:
+        missing = [name for name, value in (("text", text), ("provider", provider))
+                   if not isinstance(value, str) or not value.strip()]
+        if missing:
+            raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+        synthesis = tts_engine.synthesize(
+            provider,
+            text,
+            credentials,
+            voice=row.get("voice") or None,
+            language=row.get("language") or None,
+            model=row.get("model") or None,
+            engine=row.get("engine") or "neural",
+            output_format=output_format,
+            speaking_rate=float(row.get("speaking_rate") or 1.0),
+            pitch=float(row.get("pitch") or 0.0),
+            text_type=row.get("text_type") or "text",
+            quality=quality,
+        )
+        audio = synthesis.audio
+        if convert_to:
+            audio = convert(audio, audio_format, convert_to)
+            tts_engine.write_audio(audio, output)
+        else:
+            write_audio_file(audio, audio_format, output)
+        result["status"] = "ok"
+        result["bytes"] = len(audio)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        result["bytes"] = 0
+    result["latency_seconds"] = round(time.time() - start_time, 4)
+    return result
+
+
+def run_batch(manifest_path, results_path, output_dir, workers=4, credentials=None, convert_to=None):
+    """Runs every manifest row not yet completed in results_path, appending results as they finish.
+
+    Returns a summary dict with counts, total bytes and wall-clock time.
+    """
+    rows = read_manifest(manifest_path)
+    completed = read_checkpoint(results_path)
+    pending = [row for row in rows if row["id"] not in completed]
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"{len(rows)} items in manifest, {len(completed)} already completed, {len(pending)} to run")
+
+    summary = {"ok": 0, "error": 0, "bytes": 0, "skipped": len(rows) - len(pending)}
+    write_lock = threading.Lock()
+    start_time = time.time()
+    with open(results_path, "a", encoding="utf-8") as results_file, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(run_item, row, output_dir, credentials, convert_to) for row in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            with write_lock:
+                # One flushed line per item doubles as the checkpoint for --resume
+                results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                results_file.flush()
+            summary[result["status"]] += 1
+            summary["bytes"] += result["bytes"]
+            print(f"[{result['status']}] {result['id']} ({result['provider']}): "
+                  f"{result['latency_seconds']:.2f}s, {result['bytes']} bytes")
+    summary["wall_time"] = time.time() - start_time
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthesize a CSV/JSONL manifest of texts without the Streamlit UI.")
+    parser.add_argument("manifest", help="CSV or JSONL file with columns: " + ", ".join(MANIFEST_FIELDS))
+    parser.add_argument("--results", default="results.jsonl",
+                        help="Results manifest (JSONL); also the checkpoint used to resume after a failure")
+    parser.add_argument("--output-dir", default="batch_output", help="Directory for audio files")
+    parser.add_argument("--workers", type=int, default=4, help="Number of items synthesized concurrently")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="Streamlit secrets file with credentials")
+    parser.add_argument("--restart", action="store_true", help="Ignore the existing results file and start over")
+    parser.add_argument("--convert", choices=sorted(MIME_TYPES),
+                        help="Write every item in this format, transcoding with ffmpeg where the provider returned another")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.restart and os.path.exists(args.results):
+        os.remove(args.results)
+    credentials = tts_engine.load_credentials(args.secrets)
+    summary = run_batch(args.manifest, args.results, args.output_dir, workers=args.workers, credentials=credentials,
+                        convert_to=args.convert)
+    print(f"Done in {summary['wall_time']:.2f}s: {summary['ok']} ok, {summary['error']} failed, "
+          f"{summary['skipped']} skipped, {summary['bytes']} bytes written")
+    return 0 if summary["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
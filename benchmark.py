@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Benchmarks must measure the providers, not the audio cache
+os.environ.setdefault("TTS_CACHE_ENABLED", "0")
+
+from dotenv import load_dotenv
+
+# One sentence per language covered by the app's language selectors. Short, medium
+# and long texts repeat it so every run synthesizes exactly the same corpus.
+BASE_SENTENCES = {
+    "en": "The quick brown fox jumps over the lazy dog while the morning news plays softly in the background. ",
+    "hi": "आज सुबह मौसम बहुत सुहाना था और बच्चे पार्क में खेल रहे थे। ",
+    "es": "El rápido zorro marrón salta sobre el perro perezoso mientras suenan las noticias de la mañana. ",
+    "fr": "Le renard brun rapide saute par-dessus le chien paresseux pendant que les nouvelles du matin passent. ",
+    "de": "Der schnelle braune Fuchs springt über den faulen Hund, während leise die Morgennachrichten laufen. ",
+    "it": "La volpe marrone veloce salta sopra il cane pigro mentre il notiziario del mattino suona piano. ",
+    "pt": "A rápida raposa marrom pula sobre o cão preguiçoso enquanto o noticiário da manhã toca baixinho. ",
+    "ja": "素早い茶色の狐が怠け者の犬を飛び越え、朝のニュースが静かに流れています。",
+}
+
+# Target character counts for each text size
+TEXT_SIZES = {"short": 100, "medium": 1000, "long": 6000}
+
+# Languages and voices benchmarked per provider (language key -> provider settings)
+PROVIDER_MATRIX = {
+    "google": {
+        "en": {"language": "en-US", "voice": "en-US-Standard-C"},
+        "hi": {"language": "hi-IN", "voice": "hi-IN-Standard-A"},
+        "es": {"language": "es-ES", "voice": "es-ES-Standard-A"},
+        "fr": {"language": "fr-FR", "voice": "fr-FR-Standard-A"},
+    },
+    "elevenlabs": {
+        lang: {"language": lang, "voice": "21m00Tcm4TlvDq8ikWAM", "model": "eleven_multilingual_v2"}
+        for lang in ("en", "hi", "es", "fr", "de", "it", "pt", "ja")
+    },
+    "polly": {
+        "en": {"voice": "Joanna", "engine": "neural"},
+        "hi": {"voice": "Aditi", "engine": "standard"},
+        "es": {"voice": "Lucia", "engine": "neural"},
+        "fr": {"voice": "Lea", "engine": "neural"},
+        "de": {"voice": "Vicki", "engine": "neural"},
+        "ja": {"voice": "Takumi", "engine": "neural"},
+    },
+}
+
+# List prices in USD per million characters; update when provider pricing changes
+COST_PER_MILLION_CHARS = {
+    ("google", "Standard"): 4.0,
+    ("google", "Wavenet"): 16.0,
+    ("google", "Neural2"): 16.0,
+    ("google", "Studio"): 160.0,
+    ("polly", "standard"): 4.0,
+    ("polly", "neural"): 16.0,
+    ("elevenlabs", None): 300.0,
+}
+
+
+def build_corpus(languages=None, sizes=None):
+    """Returns the fixed benchmark corpus as {(language, size): text}."""
+    corpus = {}
+    for language, sentence in BASE_SENTENCES.items():
+        if languages and language not in languages:
+            continue
+        for size, target in TEXT_SIZES.items():
+            if sizes and size not in sizes:
+                continue
+            repeats = max(1, round(target / len(sentence)))
+            corpus[(language, size)] = (sentence * repeats).strip()
+    return corpus
+
+
+def cost_per_char(provider, settings):
+    if provider == "google":
+        tier = settings["voice"].split("-")[2]
+    elif provider == "polly":
+        tier = settings.get("engine", "neural")
+    else:
+        tier = None
+    return COST_PER_MILLION_CHARS.get((provider, tier), 0.0) / 1_000_000
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class Replayer:
+    """Replays recorded timings instead of calling providers, for reproducible runs."""
+
+    def __init__(self, path):
+        self.recordings = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.recordings[(record["provider"], record["text_hash"], record["iteration"])] = record
+
+    def stream(self, provider, text, iteration):
+        record = self.recordings.get((provider, _text_hash(text), iteration))
+        if record is None:
+            raise KeyError(f"No recording for {provider} iteration {iteration} of text {_text_hash(text)}")
+        time.sleep(record["time_to_first_byte"])
+        yield bytes(min(record["bytes"], 4096))
+        time.sleep(max(0.0, record["latency"] - record["time_to_first_byte"]))
+        if record["bytes"] > 4096:
+            yield bytes(record["bytes"] - 4096)
+
+
+def run_benchmark(providers, corpus, iterations, credentials=None, replayer=None, recorder=None):
+    """Runs every (provider, language, size) case and returns the results dict."""
+    from streaming import consume_stream
+    if replayer is None:
+        import tts_engine
+
+    results = {}
+    for provider in providers:
+        for (language, size), text in sorted(corpus.items()):
+            settings = PROVIDER_MATRIX[provider].get(language)
+            if settings is None:
+                continue
+            latencies, ttfbs, audio_bytes, errors = [], [], [], []
+            for iteration in range(iterations):
+                if replayer is not None:
+                    stream = replayer.stream(provider, text, iteration)
+                else:
+                    stream = tts_engine.stream_speech(provider, text, credentials, **settings)
+                try:
+                    measured = consume_stream(stream)
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+                latencies.append(measured["total_time"])
+                ttfbs.append(measured["time_to_first_byte"] or measured["total_time"])
+                audio_bytes.append(measured["bytes"])
+                if recorder is not None:
+                    recorder.write(json.dumps({
+                        "provider": provider, "text_hash": _text_hash(text), "iteration": iteration,
+                        "latency": measured["total_time"], "time_to_first_byte": ttfbs[-1],
+                        "bytes": measured["bytes"],
+                    }) + "\n")
+            chars = len(text)
+            case = {
+                "chars": chars,
+                "iterations": iterations,
+                "errors": len(errors),
+                "latency_p50": percentile(latencies, 0.50),
+                "latency_p95": percentile(latencies, 0.95),
+                "latency_p99": percentile(latencies, 0.99),
+                "ttfb_p50": percentile(ttfbs, 0.50),
+                "ttfb_p95": percentile(ttfbs, 0.95),
+                "chars_per_second": chars / statistics.mean(latencies) if latencies else None,
+                "audio_bytes_per_char": statistics.mean(audio_bytes) / chars if audio_bytes else None,
+                "cost_usd": chars * cost_per_char(provider, settings),
+            }
+            results[f"{provider}/{language}/{size}"] = case
+            print(f"{provider:10s} {language:3s} {size:6s} p50={case['latency_p50'] or 0:.3f}s "
+                  f"p95={case['latency_p95'] or 0:.3f}s ttfb={case['ttfb_p50'] or 0:.3f}s "
+                  f"errors={len(errors)}")
+    return results
+
+
+def compare(baseline, current, threshold=0.10):
+    """Prints per-case changes against a baseline and returns the regressed cases."""
+    regressions = []
+    for case, metrics in current["results"].items():
+        before = baseline["results"].get(case)
+        if not before:
+            continue
+        for metric in ("latency_p50", "latency_p95", "latency_p99", "ttfb_p50"):
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            marker = ""
+            if change > threshold:
+                marker = "  <-- regression"
+                regressions.append((case, metric, change))
+            print(f"{case:28s} {metric:12s} {old:8.3f}s -> {new:8.3f}s ({change:+.1%}){marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-provider TTS latency benchmark.")
+    parser.add_argument("--providers", default="google,elevenlabs,polly")
+    parser.add_argument("--languages", help="Comma-separated language keys (default: all)")
+    parser.add_argument("--sizes", help="Comma-separated text sizes: short,medium,long (default: all)")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--record", help="Append raw per-request timings to this JSONL file")
+    parser.add_argument("--replay", help="Replay timings recorded with --record instead of calling providers")
+    parser.add_argument("--compare", help="Baseline results JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="tts-bench-"))
+
+    providers = [p.strip() for p in args.providers.split(",") if p.strip()]
+    corpus = build_corpus(
+        languages=args.languages.split(",") if args.languages else None,
+        sizes=args.sizes.split(",") if args.sizes else None,
+    )
+    replayer = Replayer(args.replay) if args.replay else None
+    credentials = None
+    if replayer is None:
+        import tts_engine
+        credentials = tts_engine.load_credentials(args.secrets)
+    recorder = open(args.record, "a", encoding="utf-8") if args.record else None
+    try:
+        results = run_benchmark(providers, corpus, args.iterations, credentials, replayer, recorder)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "mode": "replay" if replayer else "live",
+            "iterations": args.iterations,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,244 @@
+import re
+
+# Per-request input limits for each provider. Google limits the request to
+# 5000 bytes, Polly to 3000 billed characters and ElevenLabs to 5000 characters
+# (for the models offered in the app).
+PROVIDER_LIMITS = {
+    "google": {"max_bytes": 5000},
+    "polly": {"max_chars": 3000},
+    "elevenlabs": {"max_chars": 5000},
+}
+
+# Sentence terminators: Latin punctuation, Hindi danda/double danda and CJK full stops.
+# Latin terminators only end a sentence when followed by whitespace (so "3.14" stays whole).
+_SENTENCE_RE = re.compile(r"""(?s).*?(?:[.!?]+["')\]”’]*(?:\s+|$)|[।॥。！？]+["')\]”’]*\s*|$)""")
+_WORD_RE = re.compile(r"\S+\s*|\s+")
+_MARKUP_RE = re.compile(r"<[^>]*>|[^<]+")
+_TAG_NAME_RE = re.compile(r"</?\s*([A-Za-z_][\w:.-]*)")
+_SPEAK_RE = re.compile(r"^\s*<speak\b[^>]*>(.*)</speak>\s*$", re.S)
+# Phrase boundaries inside a sentence: commas, semicolons and colons followed by whitespace
+_PHRASE_RE = re.compile(r"(?s).*?(?:[,;:]\s+|[、，；：]\s*|$)")
+
+
+# Longest run of streamed text held while waiting for a sentence to end; longer
+# runs (text without punctuation) are passed on at a word boundary
+STREAM_MAX_PENDING_CHARS = 64 * 1024
+
+
+def _iter_sentences(text):
+    """Yields consecutive sentence pieces of text (including trailing whitespace).
+
+    text may also be an iterable of str pieces (lines, file blocks); sentences
+    spanning pieces are joined, and only the unfinished sentence is held.
+    """
+    if isinstance(text, str):
+        for match in _SENTENCE_RE.finditer(text):
+            if match.group():
+                yield match.group()
+        return
+    pending = ""
+    for piece in text:
+        pending += piece
+        end = 0
+        for match in _SENTENCE_RE.finditer(pending):
+            if match.end() >= len(pending) - 1:
+                break  # may continue in the next piece ($ also matches before a final newline)
+            if match.group():
+                yield match.group()
+            end = match.end()
+        pending = pending[end:]
+        if len(pending) > STREAM_MAX_PENDING_CHARS:
+            cut = max(pending.rfind(" ", 0, STREAM_MAX_PENDING_CHARS), pending.rfind("\n", 0, STREAM_MAX_PENDING_CHARS))
+            cut = cut + 1 if cut > 0 else STREAM_MAX_PENDING_CHARS
+            yield pending[:cut]
+            pending = pending[cut:]
+    yield from _iter_sentences(pending)
+
+
+class _Budget:
+    """Tracks the size of a piece of text in characters and UTF-8 bytes."""
+
+    def __init__(self, max_chars=None, max_bytes=None):
+        self.max_chars = max_chars
+        self.max_bytes = max_bytes
+
+    def size(self, piece):
+        return len(piece), len(piece.encode("utf-8")) if self.max_bytes else 0
+
+    def fits(self, chars, nbytes):
+        if self.max_chars is not None and chars > self.max_chars:
+            return False
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return False
+        return True
+
+
+def _split_oversized(piece, budget, reserved):
+    """Splits a piece that is larger than the budget on words, then on characters."""
+    for word in _WORD_RE.finditer(piece):
+        word = word.group()
+        chars, nbytes = budget.size(word)
+        if budget.fits(chars + reserved[0], nbytes + reserved[1]):
+            yield word
+            continue
+        start, chars, nbytes = 0, 0, 0
+        for index, char in enumerate(word):
+            char_chars, char_bytes = budget.size(char)
+            if chars and not budget.fits(chars + char_chars + reserved[0], nbytes + char_bytes + reserved[1]):
+                yield word[start:index]
+                start, chars, nbytes = index, 0, 0
+            chars += char_chars
+            nbytes += char_bytes
+        yield word[start:]
+
+
+def chunk_text(text, max_chars=None, max_bytes=None, ssml=False):
+    """Splits text into chunks that fit max_chars/max_bytes, breaking on sentence boundaries.
+
+    Runs in a single pass over the input, which may be a str or, for plain
+    text, an iterable of str pieces read incrementally. With ssml=True the outer <speak>
+    element is removed, tags are never split, and every chunk is re-wrapped in
+    <speak> with any elements open at the chunk boundary closed and reopened.
+    Yields the chunks in order.
+    """
+    if max_chars is None and max_bytes is None:
+        raise ValueError("chunk_text needs max_chars and/or max_bytes")
+    budget = _Budget(max_chars, max_bytes)
+
+    if ssml:
+        if not isinstance(text, str):
+            raise ValueError("SSML must be chunked from a str")
+        match = _SPEAK_RE.match(text)
+        body = match.group(1) if match else text
+        atoms = _iter_ssml_atoms(body)
+        wrapper = ("<speak>", "</speak>")
+    else:
+        atoms = (("text", sentence) for sentence in _iter_sentences(text))
+        wrapper = ("", "")
+
+    open_tags = []  # (name, opening tag) of elements open at the current position
+    parts = []
+    chars, nbytes = 0, 0
+    prefix = wrapper[0]
+
+    def reserved():
+        suffix = "".join(f"</{name}>" for name, _ in reversed(open_tags)) + wrapper[1]
+        return budget.size(prefix + suffix)
+
+    def flush():
+        content = "".join(parts).strip()
+        if not content or not _has_text(content, ssml):
+            return None
+        suffix = "".join(f"</{name}>" for name, _ in reversed(open_tags))
+        return f"{prefix}{content}{suffix}{wrapper[1]}"
+
+    for kind, piece in atoms:
+        pieces = [piece]
+        extra = reserved()
+        piece_chars, piece_bytes = budget.size(piece)
+        if kind == "text" and not budget.fits(piece_chars + extra[0], piece_bytes + extra[1]):
+            pieces = _split_oversized(piece, budget, extra)
+        for piece in pieces:
+            piece_chars, piece_bytes = budget.size(piece)
+            extra = reserved()
+            if parts and not budget.fits(chars + piece_chars + extra[0], nbytes + piece_bytes + extra[1]):
+                chunk = flush()
+                if chunk:
+                    yield chunk
+                prefix = wrapper[0] + "".join(tag for _, tag in open_tags)
+                parts, chars, nbytes = [], 0, 0
+            parts.append(piece)
+            chars += piece_chars
+            nbytes += piece_bytes
+        if kind == "open":
+            open_tags.append((_TAG_NAME_RE.match(piece).group(1), piece))
+        elif kind == "close":
+            name = _TAG_NAME_RE.match(piece).group(1)
+            for index in range(len(open_tags) - 1, -1, -1):
+                if open_tags[index][0] == name:
+                    del open_tags[index:]
+                    break
+
+    chunk = flush()
+    if chunk:
+        yield chunk
+
+
+def _iter_ssml_atoms(body):
+    """Yields (kind, piece) atoms for SSML: whole tags and sentence pieces of text."""
+    for match in _MARKUP_RE.finditer(body):
+        piece = match.group()
+        if piece.startswith("<"):
+            if piece.startswith("</"):
+                yield "close", piece
+            elif piece.endswith("/>") or piece.startswith(("<?", "<!")):
+                yield "empty", piece
+            else:
+                yield "open", piece
+        else:
+            for sentence in _iter_sentences(piece):
+                yield "text", sentence
+
+
+def _has_text(content, ssml):
+    if not ssml:
+        return True
+    return any(not piece.startswith("<") and piece.strip() for piece in _MARKUP_RE.findall(content))
+
+
+def split_segments(text, phrases=False):
+    """Yields the sentences of plain text (or phrases, when phrases=True), stripped of surrounding whitespace."""
+    for sentence in _iter_sentences(text):
+        pieces = _PHRASE_RE.findall(sentence) if phrases else [sentence]
+        for piece in pieces:
+            piece = piece.strip()
+            if piece:
+                yield piece
+
+
+def iter_provider_chunks(text, provider, ssml=False, max_chars=None):
+    """Yields the chunks for a provider's request limits as they are produced (text may be an iterable of str).
+
+    max_chars optionally tightens the provider's character limit.
+    """
+    limits = dict(PROVIDER_LIMITS[provider])
+    if max_chars is not None:
+        limits["max_chars"] = min(max_chars, limits.get("max_chars", max_chars))
+    return chunk_text(text, ssml=ssml, **limits)
+
+
+def chunk_for_provider(text, provider, ssml=False, max_chars=None):
+    """Returns the list of chunks for a provider's request limits.
+
+    max_chars optionally tightens the provider's character limit.
+    """
+    return list(iter_provider_chunks(text, provider, ssml=ssml, max_chars=max_chars))
+
+
+def needs_chunking(text, provider, max_chars=None):
+    """Returns True if text exceeds the provider's (or the given) request limit."""
+    limits = PROVIDER_LIMITS[provider]
+    char_limit = min(filter(None, [max_chars, limits.get("max_chars")]), default=None)
+    if char_limit is not None and len(text) > char_limit:
+        return True
+    return "max_bytes" in limits and len(text.encode("utf-8")) > limits["max_bytes"]
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: chunk multi-megabyte plain text and SSML inputs
+    import time
+
+    sentence = "The quick brown fox jumps over the lazy dog. यह एक परीक्षण वाक्य है। "
+    for megabytes in (1, 4, 16):
+        text = sentence * (megabytes * 1024 * 1024 // len(sentence.encode("utf-8")))
+        ssml_text = "<speak>" + text.replace("dog.", "<emphasis>dog</emphasis>.<break time=\"200ms\"/>") + "</speak>"
+        for label, data, kwargs in (
+            ("text/polly", text, {"max_chars": 3000}),
+            ("text/google", text, {"max_bytes": 5000}),
+            ("ssml/polly", ssml_text, {"max_chars": 3000, "ssml": True}),
+        ):
+            start = time.perf_counter()
+            count = sum(1 for _ in chunk_text(data, **kwargs))
+            elapsed = time.perf_counter() - start
+            size_mb = len(data.encode("utf-8")) / (1024 * 1024)
+            print(f"{label:12s} {size_mb:6.1f} MB -> {count:6d} chunks in {elapsed:6.2f}s ({size_mb / elapsed:6.1f} MB/s)")
@@ -0,0 +1,140 @@
+from requests.adapters import HTTPAdapter
+import os
+import requests
+import threading
+
+# Process-wide registry of provider clients, keyed by (provider, credentials/region).
+# Streamlit reruns the script on every interaction, but this module is imported
+# once per process, so clients (and their gRPC channels / connection pools)
+# survive across reruns and are shared by all sessions. The Google and AWS SDKs
+# are imported inside the factories, so they only load when first needed.
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Connection pool tuning for the shared HTTP session and boto3 clients
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 32
+POLLY_MAX_POOL_CONNECTIONS = 32
+
+# Optional endpoint override for Polly (e.g. a local mock server)
+POLLY_ENDPOINT_URL = os.getenv("AWS_POLLY_ENDPOINT_URL") or None
+
+
+def get_client(provider, key, factory):
+    """Returns the client registered under (provider, key), building it once with factory()."""
+    registry_key = (provider, key)
+    client = _clients.get(registry_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(registry_key)
+            if client is None:
+                client = factory()
+                _clients[registry_key] = client
+    return client
+
+
+def clear_clients():
+    """Drops every registered client (e.g. after credentials are rotated)."""
+    with _clients_lock:
+        for client in _clients.values():
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+        _clients.clear()
+
+
+def get_google_client(credentials_info):
+    """Returns the shared Google TextToSpeechClient for a service account."""
+    credentials_info = dict(credentials_info)
+    key = (credentials_info.get("client_email"), credentials_info.get("private_key_id"))
+
+    def factory():
+        from google.cloud import texttospeech
+        from google.oauth2 import service_account
+
+        credentials = service_account.Credentials.from_service_account_info(credentials_info)
+        return texttospeech.TextToSpeechClient(credentials=credentials)
+
+    return get_client("google", key, factory)
+
+
+def get_polly_client(aws_access_key_id, aws_secret_access_key, region_name="us-east-1"):
+    """Returns the shared AWS Polly client for a set of credentials and region."""
+    key = (aws_access_key_id, aws_secret_access_key, region_name)
+
+    def factory():
+        from botocore.config import Config
+        import boto3
+
+        # Retries are handled by resilience.py, so botocore makes a single attempt
+        config = Config(
+            max_pool_connections=POLLY_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={"mode": "standard", "max_attempts": 1}
+        )
+        return boto3.Session(
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            region_name=region_name
+        ).client('polly', config=config, endpoint_url=POLLY_ENDPOINT_URL)
+
+    return get_client("polly", key, factory)
+
+
+def get_http_session():
+    """Returns the shared keep-alive requests.Session used for ElevenLabs calls."""
+    def factory():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    return get_client("http", None, factory)
+
+
+if __name__ == "__main__":
+    # Checks that each provider client is built once per process: the SDK
+    # constructors are replaced with counting fakes, then every getter is
+    # called repeatedly from several threads (as reruns and sessions do).
+    from concurrent.futures import ThreadPoolExecutor
+    import sys
+    from unittest import mock
+
+    google = mock.MagicMock(name="google")
+    google_client = google.cloud.texttospeech.TextToSpeechClient
+    boto3 = mock.MagicMock(name="boto3")
+    botocore = mock.MagicMock(name="botocore")
+    fake_modules = {
+        "google": google,
+        "google.cloud": google.cloud,
+        "google.cloud.texttospeech": google.cloud.texttospeech,
+        "google.oauth2": google.oauth2,
+        "google.oauth2.service_account": google.oauth2.service_account,
+        "boto3": boto3,
+        "botocore": botocore,
+        "botocore.config": botocore.config,
+    }
+    service_account = {"client_email": "tts@example.iam.gserviceaccount.com", "private_key_id": "key-1"}
+
+    def get_all(_):
+        return (get_google_client(service_account), get_polly_client("id", "secret"), get_http_session())
+
+    with mock.patch.dict(sys.modules, fake_modules), \
+            mock.patch("requests.Session", side_effect=lambda: mock.MagicMock(name="Session")) as session_class:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(get_all, range(200)))
+        assert all(result == results[0] for result in results), "getters returned different clients"
+        assert google_client.call_count == 1, f"Google client built {google_client.call_count} times"
+        assert boto3.Session.call_count == 1, f"Polly client built {boto3.Session.call_count} times"
+        assert session_class.call_count == 1, f"HTTP session built {session_class.call_count} times"
+        # Different credentials get their own client
+        get_polly_client("id", "secret", region_name="eu-west-1")
+        assert boto3.Session.call_count == 2
+        clear_clients()
+        get_http_session()
+        assert session_class.call_count == 2, "clear_clients() did not drop the HTTP session"
+    print("Clients are built once per process and credentials set, across 200 calls from 16 threads")
@@ -0,0 +1,101 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+
+from audio_cache import get_audio_cache
+from audio_formats import audio_duration
+from chunking import needs_chunking
+from scheduler import session_initializer
+from tts_engine import provider_request, synthesize
+
+# One synthesis of the comparison text. realtime_factor is synthesis time over
+# audio duration (below 1 means faster than playback); cached marks results
+# served from the audio cache, whose latency says nothing about the provider.
+ComparisonResult = namedtuple("ComparisonResult", [
+    "candidate", "audio", "audio_format", "latency", "duration", "bytes", "realtime_factor", "cached", "error"
+])
+
+
+def candidate_label(candidate):
+    """Returns a short display name for a candidate, e.g. "polly: Joanna (neural)"."""
+    label = f"{candidate['provider']}: {candidate.get('label') or candidate.get('voice') or 'default voice'}"
+    extras = [candidate[key] for key in ("engine", "model", "quality") if candidate.get(key)]
+    return f"{label} ({', '.join(extras)})" if extras else label
+
+
+def run_candidate(text, candidate, credentials):
+    """Synthesizes text with one candidate and measures it; errors are returned, not raised."""
+    options = {key: value for key, value in candidate.items() if key not in ("provider", "label")}
+    provider = candidate["provider"]
+    start_time = time.perf_counter()
+    try:
+        _, cache_key_for, audio_format, chunk_limit = provider_request(provider, credentials, **options)
+        cached = (not needs_chunking(text, provider, max_chars=chunk_limit)
+                  and get_audio_cache().contains(cache_key_for(text)))
+        result = synthesize(provider, text, credentials, **options)
+    except Exception as e:
+        return ComparisonResult(candidate, None, None, time.perf_counter() - start_time, None, 0, None, False, str(e))
+    latency = time.perf_counter() - start_time
+    try:
+        duration = audio_duration(result.audio, audio_format)
+    except (ValueError, IndexError, KeyError):
+        duration = None
+    return ComparisonResult(
+        candidate, result.audio, audio_format, latency, duration, len(result.audio),
+        latency / duration if duration else None, cached, None
+    )
+
+
+def compare(text, candidates, credentials, initializer=None):
+    """Synthesizes text with every candidate at once, yielding ComparisonResults as they complete.
+
+    A candidate is a dict with "provider" and the keyword arguments of
+    tts_engine.synthesize (voice, language, model, engine, quality, ...), plus
+    an optional display "label". The scheduler still applies each provider's budgets.
+    """
+    if not candidates:
+        return
+    with ThreadPoolExecutor(max_workers=len(candidates), initializer=session_initializer(initializer)) as executor:
+        futures = [executor.submit(run_candidate, text, candidate, credentials) for candidate in candidates]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summary_row(result):
+    """Returns a ComparisonResult as a table row."""
+    return {
+        "candidate": candidate_label(result.candidate),
+        "latency (s)": round(result.latency, 3),
+        "audio (s)": round(result.duration, 2) if result.duration else None,
+        "bytes": result.bytes,
+        "kbps": round(result.bytes * 8 / result.duration / 1000, 1) if result.duration else None,
+        "realtime factor": round(result.realtime_factor, 3) if result.realtime_factor else None,
+        "cached": result.cached,
+        "error": result.error or "",
+    }
+
+
+if __name__ == "__main__":
+    # Compares ElevenLabs output qualities against the mock backend; rows print
+    # in completion order, as the Compare tab fills in.
+    import tempfile
+
+    import audio_cache
+    import tts_engine
+    from mock_providers import MockProviderServer
+
+    audio_cache._audio_cache = audio_cache.AudioCache(root=tempfile.mkdtemp())
+    text = "The quick brown fox jumps over the lazy dog. " * 3
+    candidates = [
+        {"provider": "elevenlabs", "voice": "mock-voice-1", "quality": "speech"},
+        {"provider": "elevenlabs", "voice": "mock-voice-2", "quality": "standard"},
+        {"provider": "elevenlabs", "voice": "mock-voice-3", "quality": "lossless"},
+        {"provider": "google", "voice": "en-US-Neural2-C"},  # no credentials: reported as an error row
+    ]
+    with MockProviderServer(latency=0.2) as server:
+        tts_engine.ELEVENLABS_API_BASE = server.base_url
+        start = time.perf_counter()
+        for result in compare(text, candidates, {"api_eleven_labs": "key"}):
+            print(summary_row(result))
+        print(f"{len(candidates)} candidates in {time.perf_counter() - start:.2f}s "
+              f"(each request takes at least 0.2s)")
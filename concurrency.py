@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+# Default request rates (requests/second) per provider, kept below the documented
+# TPS quotas so parallel synthesis does not trigger throttling errors. The
+# scheduler enforces them for every provider call (see scheduler.py).
+PROVIDER_RATE_LIMITS = {
+    "google": 15.0,
+    "elevenlabs": 3.0,
+    "polly": 8.0,
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1.0):
+        """Takes tokens if available and returns True, otherwise returns False."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1.0):
+        """Returns the seconds until tokens are available (0 if they are now), without taking them."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens=1.0):
+        """Blocks until tokens are available, then takes them. Returns the time waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, tokens=1.0):
+        """Like acquire(), but waits with asyncio.sleep so the event loop keeps running."""
+        import asyncio
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """Returns the process-wide token bucket for a provider."""
+    with _rate_limiters_lock:
+        bucket = _rate_limiters.get(provider)
+        if bucket is None:
+            bucket = TokenBucket(PROVIDER_RATE_LIMITS.get(provider, 5.0))
+            _rate_limiters[provider] = bucket
+        return bucket
+
+
+def run_concurrently(fn, items, max_in_flight=4, rate_limiter=None, initializer=None):
+    """Calls fn(index, item) for every item with at most max_in_flight calls running.
+
+    Returns (results, wall_time) where results are in the same order as items.
+    If a rate_limiter is given, a token is taken before each call starts.
+    """
+    items = list(items)
+    start_time = time.time()
+
+    def run(index, item):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return fn(index, item)
+
+    max_workers = max(1, min(max_in_flight, len(items) or 1))
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=initializer) as executor:
+        futures = [executor.submit(run, index, item) for index, item in enumerate(items)]
+        results = [future.result() for future in futures]
+    return results, time.time() - start_time
@@ -0,0 +1,397 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import codecs
+from html.parser import HTMLParser
+import io
+import os
+import posixpath
+import re
+import time
+from urllib.parse import unquote
+import xml.etree.ElementTree as ElementTree
+import zipfile
+
+from audio_formats import AudioFormat, wav_header
+from audio_merge import merge_audio_stream
+from chunking import iter_provider_chunks
+from metrics import registry
+from scheduler import session_initializer
+from tts_engine import TTSError, provider_request
+
+# Book-length documents (TXT, Markdown, EPUB) are read as a stream of text pieces,
+# chunked as they are read, synthesized a few chunks at a time and appended to the
+# output file in order, so memory stays flat however long the document is.
+
+# Characters read from a plain text document at a time
+READ_BLOCK_CHARS = 64 * 1024
+
+# Chunk results held at most per parallel request while the oldest chunk is still running
+WINDOW_PER_REQUEST = 2
+
+DocumentResult = namedtuple("DocumentResult", ["audio_format", "chunks", "characters", "bytes_written", "wall_time",
+                                               "total_time"])
+
+_MD_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_MD_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_MD_RULE_RE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_MD_LIST_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_MD_QUOTE_RE = re.compile(r"^\s*(?:>\s?)+")
+_MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_MD_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_MD_REFERENCE_RE = re.compile(r"^\s{0,3}\[[^\]]+\]:\s")
+_MD_EMPHASIS_RE = re.compile(r"(\*{1,3}|_{2,3}|`+|~~)")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_ENDS_SENTENCE_RE = re.compile(r"""[.!?:;।॥。！？]["')\]”’]*$""")
+
+# HTML elements whose end is a break in the text, and those never read aloud
+_BLOCK_TAGS = {"p", "div", "br", "li", "tr", "section", "article", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6",
+               "dt", "dd", "figcaption", "pre"}
+_HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_SKIPPED_TAGS = {"head", "script", "style", "svg", "math"}
+
+
+def _text_stream(f):
+    """Returns a text stream decoding the binary file f (UTF-8, BOM dropped, bad bytes replaced)."""
+    return io.TextIOWrapper(f, encoding="utf-8-sig", errors="replace", newline=None)
+
+
+def read_text(f, block_chars=READ_BLOCK_CHARS):
+    """Yields the text of a UTF-8 plain text file opened in binary mode, block_chars at a time."""
+    text = _text_stream(f)
+    try:
+        while True:
+            block = text.read(block_chars)
+            if not block:
+                return
+            yield block
+    finally:
+        text.detach()  # leaves f open for its owner
+
+
+def _ended(line):
+    """Returns line with a full stop added if it does not end a sentence, so headings and list items are read as one."""
+    return line if _ENDS_SENTENCE_RE.search(line) else line + "."
+
+
+def read_markdown(f):
+    """Yields the readable text of a Markdown file line by line: markup, code blocks, links and images removed."""
+    text = _text_stream(f)
+    in_code = False
+    try:
+        for line in text:
+            if _MD_FENCE_RE.match(line):
+                in_code = not in_code
+                continue
+            if in_code or _MD_RULE_RE.match(line) or _MD_REFERENCE_RE.match(line):
+                continue
+            heading = _MD_HEADING_RE.match(line)
+            line = heading.group(1) if heading else line
+            line = _MD_QUOTE_RE.sub("", line)
+            is_item = bool(_MD_LIST_RE.match(line))
+            line = _MD_LIST_RE.sub("", line)
+            line = _MD_IMAGE_RE.sub("", line)
+            line = _MD_LINK_RE.sub(r"\1", line)
+            line = _HTML_TAG_RE.sub("", line)
+            line = _MD_EMPHASIS_RE.sub("", line).replace("|", " ").strip()
+            if not line:
+                yield "\n"
+            elif heading or is_item:
+                yield "\n" + _ended(line) + "\n"
+            else:
+                yield line + "\n"
+    finally:
+        text.detach()
+
+
+class _XHTMLText(HTMLParser):
+    """Collects the readable text of an (X)HTML document fed to it in pieces."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces = []
+        self._skipping = 0
+        self._last = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self._break()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in _HEADING_TAGS and self._last.strip() and not _ENDS_SENTENCE_RE.search(self._last.rstrip()):
+            self._emit(".")
+            self._break()
+        elif tag in _BLOCK_TAGS:
+            self._break()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._emit(data)
+
+    def _emit(self, text):
+        if text:
+            self.pieces.append(text)
+            self._last = text
+
+    def _break(self):
+        if self._last and not self._last.endswith("\n"):
+            self._emit("\n")
+
+    def take(self):
+        """Returns the text collected since the last call."""
+        text = "".join(self.pieces)
+        self.pieces = []
+        return text
+
+
+def _epub_spine(archive):
+    """Returns the archive paths of an EPUB's content documents in reading order."""
+    container = ElementTree.fromstring(archive.read("META-INF/container.xml"))
+    rootfile = next(element for element in container.iter() if element.tag.endswith("rootfile"))
+    opf_path = rootfile.get("full-path")
+    package = ElementTree.fromstring(archive.read(opf_path))
+    base = posixpath.dirname(opf_path)
+    manifest = {}
+    for element in package.iter():
+        if element.tag.endswith("}item") or element.tag == "item":
+            manifest[element.get("id")] = (element.get("href"), element.get("media-type", ""))
+    paths = []
+    for element in package.iter():
+        if element.tag.endswith("}itemref") or element.tag == "itemref":
+            href, media_type = manifest.get(element.get("idref"), (None, ""))
+            if href and "html" in media_type:
+                paths.append(posixpath.normpath(posixpath.join(base, unquote(href))))
+    return paths
+
+
+def read_epub(f, block_bytes=READ_BLOCK_CHARS):
+    """Yields the readable text of an EPUB (a seekable binary file), chapter by chapter in reading order.
+
+    Each chapter is decompressed and parsed in blocks, so only the current
+    block is in memory.
+    """
+    with zipfile.ZipFile(f) as archive:
+        for path in _epub_spine(archive):
+            parser = _XHTMLText()
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            with archive.open(path) as chapter:
+                while True:
+                    block = chapter.read(block_bytes)
+                    parser.feed(decoder.decode(block, final=not block))
+                    text = parser.take()
+                    if text:
+                        yield text
+                    if not block:
+                        break
+            parser.close()
+            yield parser.take() + "\n\n"
+
+
+DOCUMENT_READERS = {
+    ".txt": read_text,
+    ".text": read_text,
+    ".md": read_markdown,
+    ".markdown": read_markdown,
+    ".epub": read_epub,
+}
+
+
+def read_document(f, name):
+    """Yields the readable text of a document opened in binary mode, choosing the reader by name's extension."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in DOCUMENT_READERS:
+        raise ValueError(f"Unsupported document type '{extension}' (expected one of {', '.join(DOCUMENT_READERS)})")
+    return DOCUMENT_READERS[extension](f)
+
+
+def synthesize_document(pieces, provider, credentials, out, max_parallel=4, initializer=None, on_chunk=None,
+                        **options):
+    """Synthesizes a stream of text pieces (e.g. from read_document) and appends the audio to out in order.
+
+    Chunks are made as the text is read and at most max_parallel requests run
+    at once; no more than WINDOW_PER_REQUEST * max_parallel chunk results wait
+    for an earlier chunk, so the text read ahead and the audio held are bounded.
+    Raw PCM is written as WAV, patching the header at the end, so out must
+    then be seekable. on_chunk(chunks, characters, bytes_written) is called
+    after each chunk is written. Raises TTSError if a chunk fails, leaving the
+    audio written so far in out. Returns a DocumentResult.
+    """
+    synthesize_text, _, audio_format, chunk_limit = provider_request(provider, credentials, **options)
+    chunks = iter_provider_chunks(pieces, provider, max_chars=chunk_limit)
+    window = WINDOW_PER_REQUEST * max_parallel
+    state = {"chunks": 0, "characters": 0, "total_time": 0.0}
+    start = time.perf_counter()
+
+    def synthesize_chunk(number, chunk):
+        try:
+            return synthesize_text(chunk)
+        except Exception as e:
+            raise TTSError(f"Chunk {number}: {e}", provider=provider) from e
+
+    def chunk_audio():
+        # Chunk audio in document order, as file objects for the streaming mergers
+        executor = ThreadPoolExecutor(max_workers=max_parallel, initializer=session_initializer(initializer))
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append((len(chunk), executor.submit(synthesize_chunk, len(pending) + state["chunks"] + 1,
+                                                            chunk)))
+                while len(pending) >= window:
+                    yield written(*pending.popleft())
+            while pending:
+                yield written(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def written(characters, future):
+        result = future.result()
+        state["chunks"] += 1
+        state["characters"] += characters
+        state["total_time"] += result.time_taken
+        registry.inc("tts_document_chunks_total", provider=provider)
+        registry.inc("tts_document_characters_total", characters, provider=provider)
+        return io.BytesIO(result.audio)
+
+    def report(sources):
+        for source in sources:
+            yield source
+            if on_chunk is not None:
+                on_chunk(state["chunks"], state["characters"], out.tell() - start_offset)
+
+    start_offset = out.tell()
+    if audio_format.name == "pcm":
+        out.write(bytes(44))
+        try:
+            merge_audio_stream(report(chunk_audio()), out, "pcm")
+        finally:
+            # Patched when a chunk fails too, so the audio written so far is a playable WAV
+            end = out.tell()
+            out.seek(start_offset)
+            out.write(wav_header(end - start_offset - 44, audio_format.sample_rate))
+            out.seek(end)
+        written_format = AudioFormat("wav", audio_format.request, audio_format.sample_rate)
+    else:
+        merge_audio_stream(report(chunk_audio()), out, audio_format.name)
+        written_format = audio_format
+    return DocumentResult(written_format, state["chunks"], state["characters"], out.tell() - start_offset,
+                          time.perf_counter() - start, state["total_time"])
+
+
+def synthesize_document_file(input_path, output_path, provider, credentials, **options):
+    """Synthesizes the document at input_path into output_path; returns a DocumentResult."""
+    with open(input_path, "rb") as f, open(output_path, "wb") as out:
+        return synthesize_document(read_document(f, input_path), provider, credentials, out, **options)
+
+
+def _rss_bytes():
+    """Returns this process's resident set size in bytes (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _write_demo_document(path, megabytes):
+    """Writes a Markdown document of about `megabytes` MB, a chapter at a time."""
+    paragraph = ("The river ran high that spring, and the ferry kept to the near bank. "
+                 "Nobody in the village could remember a flood like it! Was it the snow, or the rain? ") * 4
+    written = 0
+    chapter = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < megabytes * 1024 * 1024:
+            chapter += 1
+            block = f"# Chapter {chapter}\n\n" + "".join(f"{paragraph.strip()}\n\n" for _ in range(40))
+            f.write(block)
+            written += len(block)
+
+
+if __name__ == "__main__":
+    # Bounded-memory check: synthesizes a generated document of --megabytes MB
+    # (default 20) against the mock ElevenLabs backend and asserts that resident
+    # memory grows by less than --max-growth-mb while it runs. The mock returns
+    # one MP3 frame per request here, and the provider budgets are lifted, so
+    # the run measures the pipeline rather than gigabytes of silence.
+    import argparse
+    import tempfile
+
+    import audio_cache
+    import mock_providers
+    import scheduler
+    import tts_engine
+
+    parser = argparse.ArgumentParser(description="Synthesize a TXT, Markdown or EPUB document to one audio file.")
+    parser.add_argument("document", nargs="?", help="Document to synthesize (omit for the bounded-memory demo)")
+    parser.add_argument("--output", help="Output audio file")
+    parser.add_argument("--provider", default="polly", choices=tts_engine.PROVIDERS)
+    parser.add_argument("--voice")
+    parser.add_argument("--quality", choices=["speech", "standard", "lossless"])
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--megabytes", type=float, default=20)
+    parser.add_argument("--max-growth-mb", type=float, default=32)
+    args = parser.parse_args()
+
+    def progress(chunks, characters, bytes_written):
+        if chunks % 500 == 0:
+            print(f"{chunks} chunks, {characters:,} characters, {bytes_written:,} bytes written, "
+                  f"RSS {(_rss_bytes() or 0) / 1e6:.0f} MB")
+
+    if args.document:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        output = args.output or os.path.splitext(args.document)[0] + ".mp3"
+        result = synthesize_document_file(args.document, output, args.provider, tts_engine.load_credentials(),
+                                          voice=args.voice, quality=args.quality, max_parallel=args.parallel,
+                                          on_chunk=progress)
+        print(f"Wrote {result.bytes_written:,} bytes of {result.audio_format.name} to {output} "
+              f"({result.chunks} chunks, {result.characters:,} characters) in {result.wall_time:.1f}s")
+    else:
+        workdir = tempfile.mkdtemp()
+        audio_cache._audio_cache = audio_cache.AudioCache(root=os.path.join(workdir, "cache"), enabled=False)
+        mock_providers.FRAMES_PER_CHAR = 0
+        scheduler.configure(request_budgets={"elevenlabs": 1e6},
+                            char_budgets={"elevenlabs": 1e9},
+                            max_in_flight={"elevenlabs": 1000})
+        document = os.path.join(workdir, "book.md")
+        _write_demo_document(document, args.megabytes)
+        credentials = {"api_eleven_labs": "key"}
+        with mock_providers.MockProviderServer(latency=0) as server:
+            tts_engine.ELEVENLABS_API_BASE = server.base_url
+            # Warm-up on a small document, so imports and connection pools are in the baseline
+            warmup = os.path.join(workdir, "warmup.md")
+            _write_demo_document(warmup, 0.2)
+            synthesize_document_file(warmup, os.path.join(workdir, "warmup.mp3"), "elevenlabs", credentials,
+                                      voice="mock-voice", max_parallel=args.parallel)
+            served_before = server.request_count
+            baseline = _rss_bytes()
+            peak = {"rss": baseline}
+            result = synthesize_document_file(
+                document, os.path.join(workdir, "book.mp3"), "elevenlabs", credentials, voice="mock-voice",
+                max_parallel=args.parallel,
+                on_chunk=lambda *counts: (progress(*counts), peak.update(rss=max(peak["rss"], _rss_bytes())))
+            )
+        growth_mb = (peak["rss"] - baseline) / 1e6
+        print(f"{os.path.getsize(document) / 1e6:.1f} MB document: {result.chunks} chunks, "
+              f"{result.characters:,} characters in {result.wall_time:.1f}s; "
+              f"RSS {baseline / 1e6:.0f} MB before, peak growth {growth_mb:.1f} MB")
+        assert growth_mb < args.max_growth_mb, f"RSS grew by {growth_mb:.1f} MB"
+        # Every chunk of the document was written, with at most one request each (the demo
+        # book repeats itself, so identical chunks in flight at once share a request)
+        chunk_limit = provider_request("elevenlabs", credentials, voice="mock-voice")[3]
+        with open(document, "rb") as f:
+            lengths = [len(chunk) for chunk in iter_provider_chunks(read_document(f, document), "elevenlabs",
+                                                                      max_chars=chunk_limit)]
+        assert result.chunks == len(lengths) > 0, (result.chunks, len(lengths))
+        assert result.characters == sum(lengths), (result.characters, sum(lengths))
+        requests = server.request_count - served_before
+        assert 0 < requests <= result.chunks, (requests, result.chunks)
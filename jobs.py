@@ -0,0 +1,440 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from audio_formats import FILE_EXTENSIONS, AudioFormat, write_audio_file
+from chunking import chunk_for_provider, needs_chunking
+from metrics import registry
+from postprocess import postprocess_chunks
+from scheduler import DEFAULT_SESSION, set_session
+from segment_cache import synthesize_segmented
+from tts_engine import TTSError, provider_request, synthesize_in_chunks
+
+# Jobs live in a SQLite database with their audio next to it, so they outlive
+# script reruns, browser reloads and app restarts. Every app process and any
+# `python jobs.py --workers N` process pointed at the same directory share them.
+JOBS_DIR = os.getenv("TTS_JOBS_DIR", ".tts_jobs")
+
+# Worker threads started by the app (0 leaves the jobs to separate worker processes)
+JOB_WORKERS = int(os.getenv("TTS_JOB_WORKERS", "2"))
+
+# A running job whose worker has not checked in for this long is handed to another worker
+JOB_LEASE_SECONDS = float(os.getenv("TTS_JOB_LEASE_SECONDS", "60"))
+
+# Workers that may lose a job (crash, restart) before it is failed instead of requeued
+JOB_MAX_ATTEMPTS = 3
+
+# Finished jobs and their audio are deleted after this long
+JOB_RETENTION_SECONDS = float(os.getenv("TTS_JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    session TEXT NOT NULL,
+    weight REAL NOT NULL,
+    provider TEXT NOT NULL,
+    text TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    result_path TEXT,
+    audio_format TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_by_session ON jobs (session, created_at);
+"""
+
+
+class JobQueue:
+    """Synthesis jobs persisted in SQLite, shared by every session, worker thread and worker process."""
+
+    def __init__(self, root=JOBS_DIR, lease_seconds=JOB_LEASE_SECONDS):
+        self.root = root
+        self.results_dir = os.path.join(root, "results")
+        self.path = os.path.join(root, "jobs.sqlite3")
+        self.lease_seconds = lease_seconds
+        self._wake = threading.Event()
+        os.makedirs(self.results_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # A connection per call: sqlite3 connections must not be shared between threads
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def submit(self, provider, text, session=None, **options):
+        """Queues text for synthesis and returns the job id.
+
+        options are the keyword arguments of tts_engine.synthesize, plus
+        max_parallel, max_chars (chunk size), segmented (use the segment cache)
+        and postprocess (even out chunk joins with postprocess.postprocess_chunks).
+        """
+        session_id, weight = session or DEFAULT_SESSION
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, session, weight, provider, text, options, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, session_id, weight, provider, text, json.dumps(options), time.time())
+            )
+        registry.inc("tts_jobs_total", provider=provider, status="submitted")
+        self._wake.set()
+        return job_id
+
+    def claim(self, worker):
+        """Marks the oldest queued job as running on worker and returns it, or None if nothing is queued."""
+        now = time.time()
+        with self._transaction() as db:
+            # Jobs of workers that stopped checking in (crashed process, restarted app) go back in the queue
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ? AND attempts < ?",
+                (now - self.lease_seconds, JOB_MAX_ATTEMPTS)
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker lost', finished_at = ? "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (now, now - self.lease_seconds)
+            )
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, progress = 0, "
+                "started_at = COALESCE(started_at, ?), heartbeat_at = ? WHERE id = ?",
+                (worker, now, now, row["id"])
+            )
+        job = dict(row)
+        if job["started_at"] is None:
+            registry.observe("tts_job_queue_seconds", now - job["created_at"], provider=job["provider"])
+        job.update(status="running", worker=worker, attempts=job["attempts"] + 1,
+                   started_at=job["started_at"] or now, heartbeat_at=now)
+        return job
+
+    def wait_for_work(self, timeout):
+        """Sleeps until a job is submitted in this process or timeout seconds pass."""
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def heartbeat(self, job_ids):
+        """Renews the lease of running jobs."""
+        if not job_ids:
+            return
+        with self._connect() as db:
+            db.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                           [(time.time(), job_id) for job_id in job_ids])
+
+    def progress(self, job_id, fraction):
+        """Records the fraction of a running job that is done."""
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                       (fraction, time.time(), job_id))
+
+    def complete(self, job, audio, audio_format):
+        """Stores a job's audio and marks it done; returns False if the job is no longer this worker's."""
+        result_path = os.path.join(self.results_dir, f"{job['id']}.{FILE_EXTENSIONS.get(audio_format.name, 'bin')}")
+        # Written aside first: a worker whose lease expired must not replace the file of the job's new run
+        partial_path = f"{result_path}.{uuid.uuid4().hex}.part"
+        write_audio_file(audio, audio_format, partial_path)
+        if audio_format.name == "pcm":
+            # Stored with a WAV header, so the file plays and downloads as it is
+            audio_format = audio_format._replace(name="wav")
+        now = time.time()
+        try:
+            with self._transaction() as db:
+                cursor = db.execute(
+                    "UPDATE jobs SET status = 'done', progress = 1, result_path = ?, audio_format = ?, finished_at = ? "
+                    "WHERE id = ? AND worker = ? AND status = 'running'",
+                    (result_path, json.dumps(list(audio_format)), now, job["id"], job["worker"])
+                )
+                if cursor.rowcount == 1:
+                    os.replace(partial_path, result_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        if cursor.rowcount != 1:
+            print(f"Job {job['id']} was taken over by another worker; dropping the result of {job['worker']}")
+            return False
+        registry.inc("tts_jobs_total", provider=job["provider"], status="done")
+        registry.observe("tts_job_run_seconds", now - job["started_at"], provider=job["provider"])
+        return True
+
+    def fail(self, job, error):
+        """Marks a job failed with an error message; returns False if the job is no longer this worker's."""
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                                "WHERE id = ? AND worker = ? AND status = 'running'",
+                                (error, time.time(), job["id"], job["worker"]))
+        if cursor.rowcount != 1:
+            return False
+        registry.inc("tts_jobs_total", provider=job["provider"], status="failed")
+        return True
+
+    def cancel(self, job_id):
+        """Cancels a job that has not started yet; returns whether it was cancelled."""
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                                "WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        """Returns a job as a dict, or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs(self, session_id=None, limit=20):
+        """Returns the most recent jobs, newest first, optionally only those of one session."""
+        with self._connect() as db:
+            if session_id is None:
+                rows = db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = db.execute("SELECT * FROM jobs WHERE session = ? ORDER BY created_at DESC LIMIT ?",
+                                  (session_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def result(self, job):
+        """Returns (audio bytes, AudioFormat) of a done job."""
+        with open(job["result_path"], "rb") as f:
+            audio = f.read()
+        return audio, AudioFormat(*json.loads(job["audio_format"]))
+
+    def stats(self, window_seconds=300):
+        """Returns queue depth, throughput and queue latency over the last window_seconds, for display."""
+        since = time.time() - window_seconds
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            finished = db.execute(
+                "SELECT COUNT(*), SUM(LENGTH(text)) FROM jobs WHERE status = 'done' AND finished_at >= ?", (since,)
+            ).fetchone()
+            waits = db.execute(
+                "SELECT AVG(started_at - created_at), MAX(started_at - created_at) FROM jobs WHERE started_at >= ?",
+                (since,)
+            ).fetchone()
+        for status in ("queued", "running"):
+            registry.set("tts_jobs", counts.get(status, 0), status=status)
+        return {
+            **{status: counts.get(status, 0) for status in JOB_STATUSES},
+            "jobs_per_minute": finished[0] * 60.0 / window_seconds,
+            "chars_per_minute": (finished[1] or 0) * 60.0 / window_seconds,
+            "mean_queue_seconds": waits[0] or 0.0,
+            "max_queue_seconds": waits[1] or 0.0,
+        }
+
+    def purge(self, older_than=JOB_RETENTION_SECONDS):
+        """Deletes jobs that finished more than older_than seconds ago, with their audio; returns how many."""
+        cutoff = time.time() - older_than
+        with self._transaction() as db:
+            rows = db.execute("SELECT id, result_path FROM jobs WHERE finished_at < ?", (cutoff,)).fetchall()
+            db.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+        for row in rows:
+            if row["result_path"] and os.path.exists(row["result_path"]):
+                os.remove(row["result_path"])
+        return len(rows)
+
+
+def run_job(queue, job, credentials):
+    """Synthesizes a claimed job, recording chunk progress and the result (or error) in the queue."""
+    provider = job["provider"]
+    text = job["text"]
+    options = json.loads(job["options"])
+    max_parallel = options.pop("max_parallel", 4)
+    max_chars = options.pop("max_chars", None)
+    segmented = options.pop("segmented", False)
+    postprocess = options.pop("postprocess", False)
+    # Provider calls queue under the submitting session, as if it had made them itself
+    set_session(job["session"], job["weight"])
+    try:
+        synthesize_text, _, audio_format, chunk_limit = provider_request(provider, credentials, **options)
+        chunk_limit = max_chars or chunk_limit
+        if segmented:
+            audio = synthesize_segmented(provider, text, credentials, max_parallel=max_parallel, **options).audio
+        elif not needs_chunking(text, provider, max_chars=chunk_limit):
+            audio = synthesize_text(text).audio
+        else:
+            chunks = chunk_for_provider(text, provider, ssml=options.get("text_type") == "ssml", max_chars=chunk_limit)
+            finished = []
+            lock = threading.Lock()
+
+            def synthesize_chunk(chunk):
+                result = synthesize_text(chunk)
+                with lock:
+                    finished.append(chunk)
+                    queue.progress(job["id"], len(finished) / len(chunks))
+                return result
+
+            result = synthesize_in_chunks(
+                synthesize_chunk, chunks, audio_format.name, provider, max_parallel=max_parallel,
+                merge=(lambda audios: postprocess_chunks(audios, audio_format)) if postprocess else None
+            )
+            if result.failed_count:
+                raise TTSError(f"{result.failed_count} of {len(chunks)} chunks failed: {'; '.join(result.errors)}",
+                               provider=provider)
+            audio = result.audio
+    except Exception as e:
+        print(f"Job {job['id']} failed: {e}")
+        queue.fail(job, str(e))
+        return False
+    return queue.complete(job, audio, audio_format)
+
+
+class JobWorkers:
+    """Threads that claim jobs from a JobQueue and run them, renewing their leases while they run."""
+
+    def __init__(self, queue, credentials, count=JOB_WORKERS, poll_interval=1.0):
+        self.queue = queue
+        self.credentials = credentials
+        self.count = count
+        self.poll_interval = poll_interval
+        self.running = {}  # worker id -> id of the job it is running
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+        for i in range(self.count):
+            thread = threading.Thread(target=self._work, args=(f"{prefix}-{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.count:
+            thread = threading.Thread(target=self._renew_leases, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Started {self.count} job workers on {self.queue.path}")
+        return self
+
+    def stop(self, timeout=None):
+        """Stops claiming jobs and waits for the running ones to finish."""
+        self._stop.set()
+        self.queue._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self, worker):
+        while not self._stop.is_set():
+            job = self.queue.claim(worker)
+            if job is None:
+                self.queue.wait_for_work(self.poll_interval)
+                continue
+            self.running[worker] = job["id"]
+            try:
+                run_job(self.queue, job, self.credentials)
+            finally:
+                self.running.pop(worker, None)
+
+    def _renew_leases(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.heartbeat(list(self.running.values()))
+            except sqlite3.Error as e:
+                print(f"Error renewing job leases: {e}")
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Returns the process-wide JobQueue on TTS_JOBS_DIR."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+                purged = _job_queue.purge()
+                if purged:
+                    print(f"Purged {purged} finished jobs")
+    return _job_queue
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    import tts_engine
+
+    parser = argparse.ArgumentParser(description="Run synthesis job workers, or a demo against the mock backend.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="Worker threads in this process")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="Streamlit secrets file with credentials")
+    parser.add_argument("--demo", action="store_true", help="Run jobs against the mock backend in a temporary directory")
+    args = parser.parse_args()
+
+    if not args.demo:
+        load_dotenv()
+        workers = JobWorkers(get_job_queue(), tts_engine.load_credentials(args.secrets), count=args.workers).start()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            print("Stopping after the running jobs finish...")
+            workers.stop()
+    else:
+        # Submits a long document and a few short requests, then "restarts" the app:
+        # a job claimed by a worker that died is picked up again once its lease expires.
+        import tempfile
+
+        import audio_cache
+        from mock_providers import MockProviderServer
+
+        audio_cache._audio_cache = audio_cache.AudioCache(root=tempfile.mkdtemp())
+        queue = JobQueue(root=tempfile.mkdtemp(), lease_seconds=1.0)
+        credentials = {"api_eleven_labs": "key"}
+        with MockProviderServer(latency=0.1) as server:
+            tts_engine.ELEVENLABS_API_BASE = server.base_url
+            lost = queue.submit("elevenlabs", "Claimed by a worker that crashed.", session=("crashed", 1.0))
+            stale = queue.claim("crashed-worker")
+            document = queue.submit("elevenlabs", "A sentence of a long document. " * 400, session=("reader", 1.0),
+                                    max_chars=1000, max_parallel=2)
+            short = [queue.submit("elevenlabs", f"Notification number {i}.", session=(f"user-{i}", 1.0))
+                     for i in range(4)]
+            workers = JobWorkers(queue, credentials, count=2, poll_interval=0.1).start()
+            while queue.stats()["queued"] or queue.stats()["running"]:
+                job = queue.get(document)
+                print(f"document: {job['status']:8s} {job['progress']:4.0%} | short jobs done: "
+                      f"{sum(queue.get(job_id)['status'] == 'done' for job_id in short)}/{len(short)}")
+                time.sleep(0.5)
+            workers.stop()
+        for job_id in [lost, document] + short:
+            job = queue.get(job_id)
+            audio, audio_format = queue.result(job) if job["status"] == "done" else (b"", None)
+            print(f"{job_id[:8]} {job['status']:6s} attempts={job['attempts']} "
+                  f"waited {job['started_at'] - job['created_at']:.2f}s, {len(audio)} bytes")
+        print(queue.stats())
+        # The crashed worker coming back late must not overwrite the result of the run that replaced it
+        finished = queue.result(queue.get(lost))
+        assert not queue.complete(stale, b"stale audio", finished[1])
+        assert not queue.fail(stale, "stale error")
+        assert queue.result(queue.get(lost)) == finished and queue.get(lost)["status"] == "done"
@@ -0,0 +1,146 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmark import percentile
+
+# Load test for api_server.py: the server runs in its own processes against the mock
+# ElevenLabs backend (with the audio cache off and the provider budgets lifted), and
+# client threads on keep-alive connections send POST /synthesize as fast as it answers.
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_mock(port, latency):
+    from mock_providers import MockProviderServer
+
+    MockProviderServer(port=port, latency=latency).serve_forever()
+
+
+def start_api_server(port, workers, mock_url):
+    """Starts api_server.py in a subprocess and waits until it answers /health."""
+    env = dict(
+        os.environ,
+        ELEVENLABS_API_BASE=mock_url,
+        ELEVEN_LABS_API_KEY="load-test",
+        TTS_CACHE_ENABLED="0",
+        TTS_REQUEST_BUDGETS="elevenlabs=1000000",
+        TTS_CHAR_BUDGETS="elevenlabs=1000000000",
+        TTS_MAX_IN_FLIGHT="elevenlabs=100000",
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_server.py"),
+         "--port", str(port), "--workers", str(workers)],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("API server did not start")
+
+
+def run_load(port, requests, concurrency, stream=False):
+    """Sends `requests` synthesis requests from `concurrency` threads; returns per-request results and wall time."""
+    local = threading.local()
+    body_for = lambda i: json.dumps({"provider": "elevenlabs", "voice": "mock-voice",
+                                     "text": f"Load test sentence number {i}.", "stream": stream})
+
+    def send(i):
+        if getattr(local, "connection", None) is None:
+            local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        start = time.perf_counter()
+        try:
+            local.connection.request("POST", "/synthesize", body=body_for(i),
+                                     headers={"Content-Type": "application/json"})
+            response = local.connection.getresponse()
+            first_byte = time.perf_counter() - start
+            audio = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            local.connection.close()
+            local.connection = None
+            return {"ok": False, "latency": time.perf_counter() - start, "error": str(e)}
+        return {"ok": response.status == 200, "latency": time.perf_counter() - start, "first_byte": first_byte,
+                "bytes": len(audio), "error": None if response.status == 200 else response.status}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(requests)))
+    return results, time.perf_counter() - start
+
+
+def report(workers, results, wall_time):
+    ok = [result for result in results if result["ok"]]
+    latencies = [result["latency"] for result in ok]
+    first_bytes = [result["first_byte"] for result in ok]
+    summary = {
+        "workers": workers,
+        "requests": len(results),
+        "failed": len(results) - len(ok),
+        "requests_per_second": round(len(ok) / wall_time, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1) if ok else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1) if ok else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if ok else None,
+        "p50_first_byte_ms": round(percentile(first_bytes, 0.50) * 1000, 1) if ok else None,
+        "mb_per_second": round(sum(result["bytes"] for result in ok) / wall_time / 1e6, 1),
+    }
+    print(f"{workers} worker(s): {summary['requests_per_second']:8.1f} req/s  p50 {summary['p50_ms']} ms  "
+          f"p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  first byte p50 {summary['p50_first_byte_ms']} ms  "
+          f"{summary['mb_per_second']} MB/s  {summary['failed']} failed")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test api_server.py against mocked providers.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64, help="Client threads, each on its own connection")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}",
+                        help="Comma-separated API worker process counts to compare")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock provider latency per request")
+    parser.add_argument("--stream", action="store_true", help="Request streamed synthesis")
+    parser.add_argument("--output", help="Write the summaries to this JSON file")
+    args = parser.parse_args(argv)
+
+    mock_port = _free_port()
+    mock = multiprocessing.Process(target=_serve_mock, args=(mock_port, args.latency), daemon=True)
+    mock.start()
+    summaries = []
+    try:
+        for workers in sorted({int(count) for count in args.workers.split(",")}):
+            port = _free_port()
+            server = start_api_server(port, workers, f"http://127.0.0.1:{mock_port}")
+            try:
+                run_load(port, min(args.concurrency, args.requests), args.concurrency, args.stream)  # warm-up
+                results, wall_time = run_load(port, args.requests, args.concurrency, args.stream)
+                summaries.append(report(workers, results, wall_time))
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        mock.terminate()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, indent=2)
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Finished traces kept for the OpenTelemetry-style JSON export
+TRACE_BUFFER_SIZE = int(os.getenv("TTS_TRACE_BUFFER_SIZE", "200"))
+SERVICE_NAME = "streamlit-tts-app"
+
+METRIC_HELP = {
+    "tts_phase_seconds": "Time spent in each phase of a synthesis request",
+    "tts_requests_total": "Synthesis requests by provider and outcome",
+    "tts_characters_total": "Characters of text sent for synthesis",
+    "tts_audio_bytes_total": "Bytes of audio returned",
+    "tts_queue_depth": "Provider calls waiting for the scheduler to admit them",
+    "tts_in_flight": "Provider calls admitted and not yet finished",
+    "tts_segment_characters_total": "Characters of segmented text served from cache or synthesized",
+    "tts_speculative_characters_total": "Characters sent to providers speculatively, before the button was pressed",
+    "tts_speculative_segments_total": "Segments at button press that speculation had (hit) or had not (miss) prepared",
+    "tts_speculative_seconds_saved_total": "Provider time of speculative segments used at button press",
+    "tts_jobs_total": "Background synthesis jobs submitted, done and failed",
+    "tts_jobs": "Background synthesis jobs queued or running, across all worker processes",
+    "tts_job_queue_seconds": "Time background jobs waited before a worker started them",
+    "tts_job_run_seconds": "Time background jobs took once started",
+    "tts_document_chunks_total": "Chunks of uploaded documents synthesized and written to their audio file",
+    "tts_document_characters_total": "Characters of uploaded documents synthesized",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def copy(self):
+        other = Histogram(self.buckets)
+        other.counts = list(self.counts)
+        other.sum = self.sum
+        other.count = self.count
+        return other
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, exportable in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, label key) -> value
+        self._histograms = {}  # (name, label key) -> Histogram
+        self._gauges = {}  # (name, label key) -> value
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counters(self, name):
+        """Returns [(labels dict, value)] for a counter."""
+        with self._lock:
+            return [(dict(labels), value) for (metric, labels), value in self._counters.items() if metric == name]
+
+    def gauges(self, name):
+        """Returns [(labels dict, value)] for a gauge."""
+        with self._lock:
+            return [(dict(labels), value) for (metric, labels), value in self._gauges.items() if metric == name]
+
+    def histograms(self, name):
+        """Returns [(labels dict, Histogram copy)] for a histogram."""
+        with self._lock:
+            return [(dict(labels), histogram.copy())
+                    for (metric, labels), histogram in self._histograms.items() if metric == name]
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def prometheus_text(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, histogram.copy()) for key, histogram in self._histograms.items())
+        lines = []
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# Tracing: spans nest through a context variable, so they follow the call stack
+# within a thread or asyncio task. Each finished root span closes its trace.
+_current_span = contextvars.ContextVar("tts_current_span", default=None)
+_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_traces_lock = threading.Lock()
+
+
+class Span:
+    """One timed phase of a request."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.attributes = dict(attributes or {})
+        self.spans = parent.spans if parent else []  # every span of the trace, in finish order
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+
+@contextmanager
+def span(phase, provider=None, **attributes):
+    """Times a phase of a request, recording it in tts_phase_seconds and the current trace."""
+    parent = _current_span.get()
+    if provider is None and parent is not None:
+        provider = parent.attributes.get("provider")
+    if provider is not None:
+        attributes["provider"] = provider
+    current = Span(phase, parent, attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        current.spans.append(current)
+        registry.observe("tts_phase_seconds", duration, provider=provider or "none", phase=phase)
+        if parent is None:
+            with _traces_lock:
+                _traces.append(current.spans)
+
+
+def current_span():
+    """Returns the innermost open span, or None."""
+    return _current_span.get()
+
+
+def _count_request(provider, root, text, result):
+    if root.attributes.get("coalesced"):
+        status = "coalesced"
+    elif root.attributes.get("cache_hit"):
+        status = "cache_hit"
+    else:
+        status = "ok"
+    registry.inc("tts_requests_total", provider=provider, status=status)
+    registry.inc("tts_characters_total", len(text), provider=provider)
+    registry.inc("tts_audio_bytes_total", len(result.audio), provider=provider)
+
+
+def traced(provider):
+    """Decorates a synthesis function (or coroutine method) returning a Synthesis with a root span and counters.
+
+    The function must take a `text` parameter; for methods it follows self.
+    """
+    def decorator(fn):
+        text_index = list(inspect.signature(fn).parameters).index("text")
+
+        def text_of(args, kwargs):
+            return args[text_index] if len(args) > text_index else kwargs["text"]
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                text = text_of(args, kwargs)
+                with span("synthesize", provider=provider, chars=len(text)) as root:
+                    try:
+                        result = await fn(*args, **kwargs)
+                    except Exception:
+                        registry.inc("tts_requests_total", provider=provider, status="error")
+                        raise
+                _count_request(provider, root, text, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            text = text_of(args, kwargs)
+            with span("synthesize", provider=provider, chars=len(text)) as root:
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    registry.inc("tts_requests_total", provider=provider, status="error")
+                    raise
+            _count_request(provider, root, text, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otel_json(limit=None):
+    """Returns recent traces as an OTLP/JSON ExportTraceServiceRequest document."""
+    with _traces_lock:
+        traces = list(_traces)[-limit:] if limit else list(_traces)
+    spans = []
+    for trace in traces:
+        for item in trace:
+            spans.append({
+                "traceId": item.trace_id,
+                "spanId": item.span_id,
+                "parentSpanId": item.parent.span_id if item.parent else "",
+                "name": item.name,
+                "kind": 1,
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns),
+                "attributes": [{"key": key, "value": _otel_value(value)} for key, value in item.attributes.items()],
+                "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+            })
+    return json.dumps({"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "tts_engine"}, "spans": spans}],
+    }]})
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serves GET /metrics (Prometheus) and GET /traces (OTLP JSON) from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics"):
+                body, content_type = registry.prometheus_text().encode(), "text/plain; version=0.0.4"
+            elif self.path.startswith("/traces"):
+                body, content_type = otel_json().encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,200 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, 417 bytes, ~26 ms)
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+FRAMES_PER_CHAR = 2
+FRAME_SECONDS = 1152 / 44100
+
+# MPEG-1 Layer III bitrate index per kbps, for frames at other bitrates
+MP3_BITRATE_INDEX = {32: 1, 40: 2, 48: 3, 56: 4, 64: 5, 80: 6, 96: 7, 112: 8, 128: 9, 160: 10, 192: 11}
+
+
+class _Server(ThreadingHTTPServer):
+    # Load tests open hundreds of connections at once; the default backlog of 5 drops them
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (e.g. a load test shutting down) are not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def fake_mp3(text, kbps=128):
+    """Returns silent MP3 audio roughly as long as text would take to speak."""
+    if kbps == 128:
+        frame = MP3_FRAME
+    else:
+        size = 144000 * kbps // 44100
+        frame = bytes([0xFF, 0xFB, MP3_BITRATE_INDEX[kbps] << 4, 0x64]) + bytes(size - 4)
+    return frame * max(1, len(text) * FRAMES_PER_CHAR)
+
+
+def fake_audio(text, output_format=None):
+    """Returns silent audio for an ElevenLabs output_format such as "mp3_22050_32" or "pcm_24000"."""
+    if output_format and output_format.startswith("pcm_"):
+        sample_rate = int(output_format.split("_")[1])
+        return bytes(2 * int(sample_rate * FRAME_SECONDS * max(1, len(text) * FRAMES_PER_CHAR)))
+    if output_format and output_format.startswith("mp3_"):
+        return fake_mp3(text, int(output_format.split("_")[2]))
+    return fake_mp3(text)
+
+
+class MockProviderServer:
+    """Local stand-in for the ElevenLabs and Polly HTTP APIs with fault injection.
+
+    Serves POST /v1/text-to-speech/<voice_id>[/stream] (ElevenLabs),
+    GET /v1/voices (ElevenLabs) and POST /v1/speech (Polly's REST endpoint, for
+    boto3 with endpoint_url). Each request waits `latency` seconds, or
+    `slow_latency` with probability `slow_rate`, and fails with
+    `failure_status` with probability `failure_rate`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, failure_rate=0.0, failure_status=503,
+                 slow_rate=0.0, slow_latency=1.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.request_count = 0
+        self.failure_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        """Serves in the calling thread (e.g. when the mock runs in its own process)."""
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _next_fault(self):
+        with self._lock:
+            self.request_count += 1
+            slow = self._random.random() < self.slow_rate
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failure_count += 1
+        return (self.slow_latency if slow else self.latency), fail
+
+    def _make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunked(self, body, content_type, block_size=4096):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for start in range(0, len(body), block_size):
+                    block = body[start:start + block_size]
+                    self.wfile.write(f"{len(block):X}\r\n".encode() + block + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                if self.path.startswith("/v1/voices"):
+                    voices = [{"voice_id": f"mock-voice-{i}", "name": f"Mock {i}",
+                               "labels": {"gender": "female" if i % 2 else "male", "accent": "american"}}
+                              for i in range(4)]
+                    self._send(200, json.dumps({"voices": voices}).encode())
+                else:
+                    self._send(404, b'{"detail": "not found"}')
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                delay, fail = mock._next_fault()
+                time.sleep(delay)
+                if fail:
+                    self._send(mock.failure_status, b'{"detail": "injected failure"}')
+                    return
+                url = urlsplit(self.path)
+                if url.path.startswith("/v1/text-to-speech/"):
+                    output_format = parse_qs(url.query).get("output_format", [None])[0]
+                    audio = fake_audio(payload.get("text", ""), output_format)
+                    content_type = "audio/mpeg" if not output_format or output_format.startswith("mp3") else "audio/pcm"
+                    if url.path.endswith("/stream"):
+                        self._send_chunked(audio, content_type)
+                    else:
+                        self._send(200, audio, content_type)
+                elif self.path.startswith("/v1/speech"):
+                    self._send(200, fake_mp3(payload.get("Text", "")), "audio/mpeg")
+                else:
+                    self._send(404, b'{"detail": "not found"}')
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # Fault-injection run: ElevenLabs calls against a mock that fails 30% of requests
+    # and stalls 10% of them, with and without hedged requests.
+    import os
+    import tempfile
+
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp())
+    with MockProviderServer(failure_rate=0.3, slow_rate=0.1, slow_latency=1.0, seed=7) as server:
+        os.environ["ELEVENLABS_API_BASE"] = server.base_url
+        import tts_engine
+        import resilience
+
+        resilience.PROVIDER_POLICIES["elevenlabs"] = resilience.RetryPolicy(max_attempts=5, base_delay=0.05)
+        p95 = {}
+        for hedge in (False, True):
+            resilience.HEDGE_REQUESTS = hedge
+            latencies, failures = [], 0
+            for i in range(60):
+                start = time.monotonic()
+                try:
+                    tts_engine.elevenlabs_synthesize_speech(f"Fault injection {hedge} {i}.", "key", "v")
+                except Exception:
+                    failures += 1
+                latencies.append(time.monotonic() - start)
+            latencies.sort()
+            print(f"hedge={hedge}: {failures} failed of 60, p50={latencies[30]:.3f}s, "
+                  f"p95={latencies[56]:.3f}s, max={latencies[-1]:.3f}s")
+            # Retries absorb every injected 503
+            assert failures == 0, f"{failures} requests failed with hedge={hedge}"
+            p95[hedge] = latencies[56]
+        print(f"Mock served {server.request_count} requests, injected {server.failure_count} failures")
+        assert server.failure_count > 0
+        # A second request sent after the observed p95 cuts the stalled calls short
+        assert p95[True] < p95[False], f"hedged p95 {p95[True]:.3f}s is not below unhedged p95 {p95[False]:.3f}s"
@@ -0,0 +1,281 @@
+import io
+import math
+import os
+import struct
+
+import numpy as np
+
+from audio_formats import AudioFormat, convert, wav_data_range, wav_header, wav_parts
+from audio_merge import merge_audio_bytes
+
+# Samples processed per step. Every pass works on one block at a time, so the
+# float32 temporaries stay this size however long the audio is.
+BLOCK_SAMPLES = int(os.getenv("TTS_POSTPROCESS_BLOCK_SAMPLES", str(1 << 16)))
+
+# Loudness every chunk is brought to (gated RMS in dBFS, close to LUFS for speech),
+# and the limits on the gain that gets it there
+TARGET_LOUDNESS_DB = float(os.getenv("TTS_TARGET_LOUDNESS_DB", "-20"))
+MAX_GAIN_DB = 20.0
+PEAK_CEILING_DB = -1.0
+
+# Loudness is measured in 400 ms windows, as in ITU-R BS.1770. Windows quieter than
+# the absolute gate, or RELATIVE_GATE_DB below the ungated level, are pauses.
+LOUDNESS_WINDOW_SECONDS = 0.4
+ABSOLUTE_GATE_DB = -70.0
+RELATIVE_GATE_DB = -10.0
+
+# Leading/trailing audio below this peak level is silence; PADDING_MS of it is kept
+SILENCE_THRESHOLD_DB = float(os.getenv("TTS_SILENCE_THRESHOLD_DB", "-45"))
+SILENCE_PADDING_MS = 80
+
+# Equal-power crossfade at each chunk join
+CROSSFADE_MS = 15
+
+
+def _db_to_amplitude(db):
+    return 10.0 ** (db / 20.0)
+
+
+def _blocks(samples, start=0, end=None, block_samples=BLOCK_SAMPLES):
+    """Yields consecutive views of samples[start:end], block_samples at a time."""
+    end = len(samples) if end is None else end
+    for block_start in range(start, end, block_samples):
+        yield samples[block_start:min(block_start + block_samples, end)]
+
+
+def loudness(samples, sample_rate, block_samples=BLOCK_SAMPLES):
+    """Returns (gated loudness in dBFS, peak amplitude 0..1) of 16-bit samples.
+
+    The loudness is the mean square of the 400 ms windows that pass the
+    absolute and relative gates of BS.1770, without its K-weighting filter.
+    Silence returns (-inf, 0.0).
+    """
+    window = max(1, int(sample_rate * LOUDNESS_WINDOW_SECONDS))
+    block_samples = max(window, block_samples - block_samples % window)
+    energies = []
+    peak = 0
+    for block in _blocks(samples, block_samples=block_samples):
+        if not len(block):
+            continue
+        peak = max(peak, int(block.max()), -int(block.min()))
+        scaled = block.astype(np.float32) / 32768.0
+        full = len(scaled) - len(scaled) % window
+        if full:
+            energies.append(np.square(scaled[:full]).reshape(-1, window).mean(axis=1, dtype=np.float64))
+        if full < len(scaled):
+            energies.append(np.array([np.square(scaled[full:]).mean(dtype=np.float64)]))
+    if not energies:
+        return float("-inf"), 0.0
+    energies = np.concatenate(energies)
+    energies = energies[energies > _db_to_amplitude(ABSOLUTE_GATE_DB) ** 2]
+    if not len(energies):
+        return float("-inf"), peak / 32768.0
+    energies = energies[energies > energies.mean() * _db_to_amplitude(RELATIVE_GATE_DB) ** 2]
+    return 10.0 * math.log10(energies.mean()), peak / 32768.0
+
+
+def trim_bounds(samples, sample_rate, threshold_db=SILENCE_THRESHOLD_DB, padding_ms=SILENCE_PADDING_MS,
+                block_samples=BLOCK_SAMPLES):
+    """Returns (start, end) of samples without leading and trailing silence; (0, 0) if all of it is silent."""
+    threshold = int(_db_to_amplitude(threshold_db) * 32768)
+    padding = int(sample_rate * padding_ms / 1000)
+    first = None
+    for block_start in range(0, len(samples), block_samples):
+        block = samples[block_start:block_start + block_samples]
+        loud = np.flatnonzero((block > threshold) | (block < -threshold))
+        if len(loud):
+            first = block_start + int(loud[0])
+            break
+    if first is None:
+        return 0, 0
+    # Scan back from the end; the first loud sample bounds the search
+    last = first
+    for block_end in range(len(samples), first, -block_samples):
+        block_start = max(first, block_end - block_samples)
+        block = samples[block_start:block_end]
+        loud = np.flatnonzero((block > threshold) | (block < -threshold))
+        if len(loud):
+            last = block_start + int(loud[-1])
+            break
+    return max(0, first - padding), min(len(samples), last + 1 + padding)
+
+
+def normalization_gain(loudness_db, peak, target_db=TARGET_LOUDNESS_DB):
+    """Returns the linear gain bringing audio to target_db, capped by MAX_GAIN_DB and the peak ceiling."""
+    if loudness_db == float("-inf") or peak == 0:
+        return 1.0
+    gain_db = min(target_db - loudness_db, MAX_GAIN_DB)
+    return min(_db_to_amplitude(gain_db), _db_to_amplitude(PEAK_CEILING_DB) / peak)
+
+
+def _apply_gain(block, gain):
+    return np.clip(block.astype(np.float32) * gain, -32768, 32767)
+
+
+def process_pcm(pieces, sample_rate, write, normalize=True, trim=True, crossfade_ms=CROSSFADE_MS,
+                target_db=TARGET_LOUDNESS_DB, block_samples=BLOCK_SAMPLES):
+    """Normalizes, trims and crossfades 16-bit mono sample arrays, writing the joined PCM bytes to write().
+
+    Each piece is brought to target_db on its own, so chunks from different
+    requests (or providers) play at the same level. Returns the samples written.
+    """
+    fade = int(sample_rate * crossfade_ms / 1000)
+    written = 0
+    tail = None  # last samples of the previous piece, gain applied, held back for the crossfade
+
+    def emit(block):
+        nonlocal written
+        write(block.astype("<i2").tobytes())
+        written += len(block)
+
+    for samples in pieces:
+        start, end = trim_bounds(samples, sample_rate, block_samples=block_samples) if trim else (0, len(samples))
+        if end <= start:
+            continue
+        gain = normalization_gain(*loudness(samples[start:end], sample_rate, block_samples), target_db) \
+            if normalize else 1.0
+        overlap = min(fade, (end - start) // 2, len(tail) if tail is not None else 0)
+        if tail is not None:
+            if len(tail) > overlap:
+                emit(tail[:len(tail) - overlap])
+            if overlap:
+                ramp = np.linspace(0.0, math.pi / 2, overlap, dtype=np.float32)
+                head = _apply_gain(samples[start:start + overlap], gain)
+                emit(np.clip(tail[len(tail) - overlap:] * np.cos(ramp) + head * np.sin(ramp), -32768, 32767))
+        keep = min(fade, end - start - overlap)
+        for block in _blocks(samples, start + overlap, end - keep, block_samples):
+            emit(_apply_gain(block, gain))
+        tail = _apply_gain(samples[end - keep:end], gain)
+    if tail is not None and len(tail):
+        emit(tail)
+    return written
+
+
+def _wav_samples(wav):
+    """Returns (int16 samples, sample rate) of in-memory 16-bit mono WAV audio, without copying it."""
+    fmt, start, size = wav_data_range(io.BytesIO(wav))
+    audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if audio_format != 1 or channels != 1 or bits != 16:
+        raise ValueError("Post-processing needs 16-bit mono PCM")
+    return np.frombuffer(wav, dtype="<i2", count=size // 2, offset=start), sample_rate
+
+
+def decode(audio, audio_format):
+    """Returns (int16 samples, sample rate) of audio; compressed formats are decoded with ffmpeg."""
+    if audio_format.name == "pcm":
+        return np.frombuffer(audio, dtype="<i2", count=len(audio) // 2), audio_format.sample_rate
+    if audio_format.name != "wav":
+        audio = convert(audio, audio_format, "wav")
+    return _wav_samples(audio)
+
+
+def encode(pcm, sample_rate, audio_format):
+    """Returns 16-bit mono PCM bytes in audio_format (compressed formats are encoded with ffmpeg)."""
+    if audio_format.name == "pcm":
+        return pcm
+    wav = b"".join(wav_parts(pcm, sample_rate))
+    if audio_format.name == "wav":
+        return wav
+    return convert(wav, AudioFormat("wav", None, sample_rate), audio_format.name)
+
+
+def postprocess_chunks(audios, audio_format, **settings):
+    """Joins chunk audio of an AudioFormat into one file, normalized, trimmed and crossfaded.
+
+    settings are passed to process_pcm. Without ffmpeg, compressed chunks are
+    merged as they are. Returns audio in audio_format.
+    """
+    try:
+        decoded = [decode(audio, audio_format) for audio in audios]
+    except RuntimeError as e:
+        print(f"Skipping post-processing: {e}")
+        return merge_audio_bytes(audios, audio_format.name)
+    sample_rates = {sample_rate for _, sample_rate in decoded}
+    if len(sample_rates) > 1:
+        raise ValueError(f"Cannot join chunks with different sample rates: {sorted(sample_rates)}")
+    out = io.BytesIO()
+    sample_rate = sample_rates.pop() if sample_rates else audio_format.sample_rate
+    process_pcm((samples for samples, _ in decoded), sample_rate, out.write, **settings)
+    return encode(out.getvalue(), sample_rate, audio_format)
+
+
+def postprocess_wav_file(in_path, out_path, **settings):
+    """Normalizes and trims a 16-bit mono WAV file into out_path, memory-mapping the input.
+
+    Returns the number of samples written.
+    """
+    with open(in_path, "rb") as f:
+        fmt, start, size = wav_data_range(f)
+    audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if audio_format != 1 or channels != 1 or bits != 16:
+        raise ValueError("Post-processing needs 16-bit mono PCM")
+    samples = np.memmap(in_path, dtype="<i2", mode="r", offset=start, shape=(size // 2,))
+    with open(out_path, "wb") as out:
+        out.write(bytes(44))
+        written = process_pcm([samples], sample_rate, out.write, **settings)
+        out.seek(0)
+        out.write(wav_header(written * 2, sample_rate))
+    return written
+
+
+if __name__ == "__main__":
+    # Benchmark: an hour of speech-like audio (quiet noise bursts and pauses, with
+    # silence at both ends) is written to a temporary WAV file block by block, then
+    # measured, trimmed and normalized from a memory map. Mapped file pages are
+    # reclaimable page cache; the private (anonymous) memory stays a few blocks' worth.
+    import argparse
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark post-processing throughput on long audio.")
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    parser.add_argument("--block-samples", type=int, default=BLOCK_SAMPLES)
+    args = parser.parse_args()
+
+    rate = args.sample_rate
+    total = int(args.minutes * 60 * rate)
+    rng = np.random.default_rng(7)
+    workdir = tempfile.mkdtemp()
+    in_path = os.path.join(workdir, "long.wav")
+    out_path = os.path.join(workdir, "long_processed.wav")
+    with open(in_path, "wb") as f:
+        f.write(wav_header(total * 2, rate))
+        for block_start in range(0, total, 10 * rate):
+            n = min(10 * rate, total - block_start)
+            t = (np.arange(block_start, block_start + n) / rate) % 2.0
+            envelope = (t < 1.5) * 0.05  # 1.5 s of "speech" at about -29 dBFS, then 0.5 s of pause
+            block = rng.standard_normal(n).astype(np.float32) * envelope
+            position = np.arange(block_start, block_start + n)
+            block[(position < 2 * rate) | (position >= total - 2 * rate)] = 0.0
+            f.write((block * 32767).astype("<i2").tobytes())
+
+    samples = np.memmap(in_path, dtype="<i2", mode="r", offset=44, shape=(total,))
+    print(f"{args.minutes:g} minutes at {rate} Hz: {total:,} samples, {total * 2 / 1e6:.0f} MB")
+    for name, run in (
+        ("loudness", lambda: loudness(samples, rate, args.block_samples)),
+        ("trim (ends)", lambda: trim_bounds(samples, rate, block_samples=args.block_samples)),
+        ("full pass", lambda: postprocess_wav_file(in_path, out_path, block_samples=args.block_samples)),
+    ):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:12s} {elapsed:6.2f}s  {total / elapsed / 1e6:7.1f}M samples/s  "
+              f"{total / rate / elapsed:6.0f}x realtime  -> {result}")
+    processed = np.memmap(out_path, dtype="<i2", mode="r", offset=44)
+    anonymous = None
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as status:
+            anonymous = next((line.split()[1] for line in status if line.startswith("RssAnon:")), None)
+    print(f"Output: {len(processed):,} samples, loudness {loudness(processed, rate)[0]:.1f} dBFS "
+          f"(target {TARGET_LOUDNESS_DB:g})" + (f"; anonymous RSS {int(anonymous) / 1024:.0f} MB" if anonymous else ""))
+
+    # Chunk joins: three chunks at different levels come out at one level, crossfaded
+    chunk_format = AudioFormat("pcm", "pcm", 16000)
+    chunks = [(np.concatenate([np.zeros(4000), rng.standard_normal(16000) * level, np.zeros(4000)]) * 32767)
+              .astype("<i2").tobytes() for level in (0.02, 0.2, 0.05)]
+    joined = np.frombuffer(postprocess_chunks(chunks, chunk_format), dtype="<i2")
+    before = ", ".join(f"{loudness(np.frombuffer(chunk, dtype='<i2'), 16000)[0]:.1f}" for chunk in chunks)
+    after = ", ".join(f"{loudness(joined[i * 16000:(i + 1) * 16000 - 400], 16000)[0]:.1f}" for i in range(3))
+    print(f"Chunk loudness before: {before} dBFS; after: {after} dBFS; "
+          f"{sum(len(chunk) for chunk in chunks) // 2:,} -> {len(joined):,} samples")
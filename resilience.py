@@ -0,0 +1,227 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import contextvars
+import os
+import random
+import threading
+import time
+
+# HTTP statuses worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Exception class names (from requests, urllib3, botocore, grpc, aiohttp and the stdlib)
+# that indicate a transient network failure rather than a bad request
+RETRYABLE_ERROR_NAMES = {
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "TimeoutError",
+    "ChunkedEncodingError", "ProtocolError", "EndpointConnectionError",
+    "ConnectTimeoutError", "ReadTimeoutError", "ServiceUnavailable", "DeadlineExceeded",
+    "TooManyRequests", "InternalServerError", "ThrottlingException",
+    "ClientConnectorError", "ClientOSError", "ServerDisconnectedError", "ServerTimeoutError", "ClientPayloadError",
+}
+
+# Provider error codes worth retrying, whatever HTTP status they came with (Polly
+# sends ThrottlingException as a 400): AWS error codes and Google gRPC status names
+RETRYABLE_ERROR_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "TooManyRequestsException", "RequestLimitExceeded",
+    "SlowDown", "ServiceUnavailable", "ServiceUnavailableException", "ServiceFailureException", "InternalFailure",
+    "RequestTimeout", "RequestTimeoutException", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "ABORTED",
+}
+
+# Hedged requests double the provider spend for slow calls, so they are opt-in
+HEDGE_REQUESTS = os.getenv("TTS_HEDGE_REQUESTS", "0") == "1"
+
+
+class RetryPolicy:
+    """Retry settings for one provider: attempts, backoff and an overall deadline."""
+
+    def __init__(self, max_attempts=3, base_delay=0.25, max_delay=4.0, deadline=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt):
+        """Returns the delay before retry number `attempt` (exponential backoff, full jitter)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+PROVIDER_POLICIES = {
+    "google": RetryPolicy(deadline=30.0),
+    "elevenlabs": RetryPolicy(max_attempts=4, base_delay=0.5, deadline=60.0),
+    "polly": RetryPolicy(deadline=30.0),
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call cannot finish within its provider's deadline."""
+
+
+def _error_code(error):
+    """Returns the provider error code of an error or its causes (AWS Error.Code, Google gRPC status), or None."""
+    while error is not None:
+        response = getattr(error, "response", None)
+        if isinstance(response, dict) and response.get("Error", {}).get("Code"):
+            return response["Error"]["Code"]
+        grpc_status = getattr(error, "grpc_status_code", None)
+        if grpc_status is not None:
+            return getattr(grpc_status, "name", str(grpc_status))
+        error = error.__cause__
+    return None
+
+
+def is_retryable(error):
+    """Classifies an error as transient (worth retrying) or permanent.
+
+    A provider error code decides first, then the HTTP status, then the
+    exception class names along the cause chain.
+    """
+    code = _error_code(error)
+    if code is not None and code in RETRYABLE_ERROR_CODES:
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    cause = error
+    while cause is not None:
+        if type(cause).__name__ in RETRYABLE_ERROR_NAMES:
+            return True
+        cause = cause.__cause__
+    return False
+
+
+class LatencyTracker:
+    """Rolling window of call latencies, used to pick the hedging delay."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, default=None):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 10:
+            return default
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+_latency_trackers = {}
+_trackers_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+def get_latency_tracker(provider):
+    """Returns the process-wide latency tracker for a provider."""
+    with _trackers_lock:
+        return _latency_trackers.setdefault(provider, LatencyTracker())
+
+
+def call_with_retry(fn, policy, sleep=time.sleep):
+    """Calls fn() and retries transient failures with exponential backoff and jitter.
+
+    Gives up with the last error once max_attempts is reached, the error is not
+    retryable, or the next attempt would start after the policy deadline.
+    """
+    start_time = time.monotonic()
+    for attempt in range(policy.max_attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt + 1 >= policy.max_attempts or not is_retryable(e):
+                raise
+            delay = policy.backoff(attempt)
+            if time.monotonic() - start_time + delay > policy.deadline:
+                raise DeadlineExceeded(f"Deadline of {policy.deadline:.0f}s exceeded after {attempt + 1} attempts: {e}") from e
+            print(f"Retrying after error ({e}); attempt {attempt + 2} of {policy.max_attempts} in {delay:.2f}s")
+            sleep(delay)
+
+
+async def async_call_with_retry(fn, policy, sleep=None):
+    """Awaits fn() and retries transient failures; the asyncio counterpart of call_with_retry."""
+    import asyncio
+
+    sleep = sleep or asyncio.sleep
+    start_time = time.monotonic()
+    for attempt in range(policy.max_attempts):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt + 1 >= policy.max_attempts or not is_retryable(e):
+                raise
+            delay = policy.backoff(attempt)
+            if time.monotonic() - start_time + delay > policy.deadline:
+                raise DeadlineExceeded(f"Deadline of {policy.deadline:.0f}s exceeded after {attempt + 1} attempts: {e}") from e
+            print(f"Retrying after error ({e}); attempt {attempt + 2} of {policy.max_attempts} in {delay:.2f}s")
+            await sleep(delay)
+
+
+def _discard_when_done(futures, discard):
+    # Hands the results of calls nobody is waiting for any more to discard (e.g. to close a stream)
+    def done(future):
+        if not future.cancelled() and future.exception() is None:
+            try:
+                discard(future.result())
+            except Exception as e:
+                print(f"Error discarding a hedged result: {e!r}")
+
+    for future in futures:
+        if not future.cancel():
+            future.add_done_callback(done)
+
+
+def hedged_call(fn, hedge_delay, timeout=None, discard=None):
+    """Calls fn(); if it has not finished after hedge_delay seconds, fires a second call.
+
+    Both calls run in a copy of the caller's context, so they are queued under
+    its scheduler session and traced under its span. Returns the first
+    successful result. Only raises if both calls fail. discard(result) is
+    called on the results of calls that lose (or outlive the timeout), so
+    results holding a connection, such as open streams, can be closed.
+    """
+    first = _hedge_executor.submit(contextvars.copy_context().run, fn)
+    done, _ = wait([first], timeout=hedge_delay)
+    if done:
+        return first.result()
+    pending = {first, _hedge_executor.submit(contextvars.copy_context().run, fn)}
+    error = None
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while pending:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            if discard is not None:
+                _discard_when_done(pending, discard)
+            raise DeadlineExceeded(f"Hedged call did not finish within {timeout:.0f}s")
+        winner = next((future for future in done if future.exception() is None), None)
+        if winner is not None:
+            if discard is not None:
+                _discard_when_done((done | pending) - {winner}, discard)
+            return winner.result()
+        error = next(iter(done)).exception()
+    raise error
+
+
+def resilient_call(provider, fn, hedge=None, discard=None):
+    """Calls fn() for a provider with classified retries and optional hedging.
+
+    The hedging delay is the provider's observed p95 latency, so only the
+    slowest ~5% of calls get a second request. discard is passed to hedged_call.
+    """
+    policy = PROVIDER_POLICIES.get(provider, RetryPolicy())
+    tracker = get_latency_tracker(provider)
+    hedge = HEDGE_REQUESTS if hedge is None else hedge
+
+    def attempt():
+        start_time = time.monotonic()
+        hedge_delay = tracker.percentile(0.95) if hedge else None
+        if hedge_delay is None:
+            result = fn()
+        else:
+            result = hedged_call(fn, hedge_delay, timeout=policy.deadline, discard=discard)
+        tracker.record(time.monotonic() - start_time)
+        return result
+
+    return call_with_retry(attempt, policy)
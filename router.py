@@ -0,0 +1,297 @@
+from collections import namedtuple
+import random
+import threading
+import time
+
+from metrics import span
+from voice_catalog import get_voice_catalog, google_voice_type
+
+# Credentials a provider needs before the router will consider it
+REQUIRED_CREDENTIALS = {
+    "google": ("gcp_service_account",),
+    "elevenlabs": ("api_eleven_labs",),
+    "polly": ("aws_access_key_id", "aws_secret_access_key"),
+}
+
+# Languages the ElevenLabs multilingual model speaks (ISO 639-1, as in the ElevenLabs tab)
+ELEVENLABS_LANGUAGES = {
+    "en", "de", "pl", "es", "it", "fr", "pt", "hi", "ar", "zh", "ja", "ko", "id", "nl",
+    "ru", "tr", "fil", "sv", "cs", "da", "fi", "no",
+}
+ELEVENLABS_ROUTED_MODEL = "eleven_multilingual_v2"
+
+# Preferred Google voice tiers when picking an equivalent voice (Studio is priced far higher)
+GOOGLE_TIER_PREFERENCE = ["Neural2", "Wavenet", "Standard"]
+
+# Latencies are compared per 1000 characters; shorter texts count as 1000
+LATENCY_UNIT_CHARS = 1000
+
+RouteDecision = namedtuple("RouteDecision", ["provider", "attempts", "ranking", "voices"])
+
+
+def _served_by_provider(route):
+    """Returns False if every synthesis under a route span was a cache hit or coalesced (no provider latency)."""
+    served = [s for s in route.spans if s.name == "synthesize"]
+    return not served or any(not (s.attributes.get("cache_hit") or s.attributes.get("coalesced")) for s in served)
+
+
+class ProviderHealth:
+    """EWMA latency and error rate for one provider, plus a failure circuit breaker."""
+
+    def __init__(self):
+        self.latency = None  # EWMA seconds per LATENCY_UNIT_CHARS
+        self.error_rate = 0.0  # EWMA of failures (1) and successes (0)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+
+class RoutingTable:
+    """Rolling per-provider latency and error-rate table used to rank providers.
+
+    A provider is unhealthy after `failure_threshold` consecutive failures or
+    when its error-rate EWMA exceeds `max_error_rate`; it is skipped for
+    `cooldown` seconds and then tried again.
+    """
+
+    def __init__(self, alpha=0.2, failure_threshold=3, max_error_rate=0.5, cooldown=30.0):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def _get(self, provider):
+        return self._health.setdefault(provider, ProviderHealth())
+
+    def record(self, provider, seconds, chars, ok):
+        """Records the outcome of one request."""
+        with self._lock:
+            health = self._get(provider)
+            health.requests += 1
+            health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+            if ok:
+                normalized = seconds * LATENCY_UNIT_CHARS / max(chars, LATENCY_UNIT_CHARS)
+                if health.latency is None:
+                    health.latency = normalized
+                else:
+                    health.latency += self.alpha * (normalized - health.latency)
+                health.consecutive_failures = 0
+            else:
+                health.failures += 1
+                health.consecutive_failures += 1
+                if (health.consecutive_failures >= self.failure_threshold
+                        or health.error_rate > self.max_error_rate):
+                    health.open_until = time.monotonic() + self.cooldown
+
+    def is_healthy(self, provider):
+        with self._lock:
+            return time.monotonic() >= self._get(provider).open_until
+
+    def rank(self, providers):
+        """Orders providers for a request: healthy before unhealthy, untried first, then fastest."""
+        now = time.monotonic()
+        with self._lock:
+            def sort_key(provider):
+                health = self._get(provider)
+                unhealthy = now < health.open_until
+                return (unhealthy, health.latency is not None, health.latency or 0.0)
+            return sorted(providers, key=sort_key)
+
+    def snapshot(self):
+        """Returns the table as a list of dicts, for display."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "provider": provider,
+                "healthy": now >= health.open_until,
+                "latency_per_1k_chars": health.latency,
+                "error_rate": health.error_rate,
+                "requests": health.requests,
+                "failures": health.failures,
+            } for provider, health in sorted(self._health.items())]
+
+
+def has_credentials(provider, credentials):
+    try:
+        return all(key in credentials for key in REQUIRED_CREDENTIALS[provider])
+    except TypeError:
+        return False
+
+
+def _pick(voices, gender):
+    """Returns the first voice of the requested gender, or the first voice at all."""
+    if gender:
+        for voice in voices:
+            if voice["gender"] == gender:
+                return voice
+    return voices[0] if voices else None
+
+
+def voice_settings(voice, language):
+    """Returns the tts_engine.synthesize settings for a catalog voice speaking a language (e.g. "en-US")."""
+    if voice["provider"] == "google":
+        return {"voice": voice["id"], "language": language}
+    if voice["provider"] == "polly":
+        return {"voice": voice["id"], "engine": "neural" if voice["neural"] else "standard"}
+    return {"voice": voice["id"], "language": language.split("-")[0], "model": ELEVENLABS_ROUTED_MODEL}
+
+
+def equivalent_voices(language, gender=None, catalog=None, credentials=None, providers=None):
+    """Maps a language (e.g. "en-US") and optional gender to tts_engine.synthesize settings per provider."""
+    catalog = catalog or get_voice_catalog()
+    base_language = language.split("-")[0]
+    settings = {}
+    for provider in REQUIRED_CREDENTIALS if providers is None else providers:
+        voice = None
+        if provider == "google":
+            voices = catalog.voices("google", credentials, language=language)
+            by_tier = {tier: [v for v in voices if google_voice_type(v["id"]) == tier] for tier in GOOGLE_TIER_PREFERENCE}
+            voice = next((_pick(by_tier[tier], gender) for tier in GOOGLE_TIER_PREFERENCE if by_tier[tier]), None)
+        elif provider == "polly":
+            voices = catalog.voices("polly", credentials, language=language)
+            neural = [v for v in voices if v["neural"]]
+            voice = _pick(neural, gender) or _pick(voices, gender)
+        elif provider == "elevenlabs" and base_language in ELEVENLABS_LANGUAGES:
+            voice = _pick(catalog.voices("elevenlabs", credentials), gender)
+        if voice is not None:
+            settings[provider] = voice_settings(voice, language)
+    return settings
+
+
+class Router:
+    """Dispatches each request to the fastest healthy provider with an equivalent voice.
+
+    Providers are tried in RoutingTable order; a failure is recorded and the
+    request fails over to the next provider. With probability `explore_rate` a
+    random healthy provider goes first, so a provider that was slow once gets
+    re-measured instead of being avoided forever.
+    """
+
+    def __init__(self, table=None, catalog=None, synthesize=None, explore_rate=0.05):
+        self.table = table or RoutingTable()
+        self.catalog = catalog
+        self.explore_rate = explore_rate
+        self._synthesize = synthesize
+        self._random = random.Random()
+
+    def synthesize(self, text, language, gender=None, credentials=None, providers=None):
+        """Returns (Synthesis, RouteDecision); raises TTSError if every provider fails."""
+        from tts_engine import TTSError, synthesize
+
+        synthesize = self._synthesize or synthesize
+        providers = REQUIRED_CREDENTIALS if providers is None else providers
+        available = [p for p in providers if has_credentials(p, credentials)]
+        voices = equivalent_voices(language, gender, self.catalog, credentials, available)
+        ranking = self.table.rank(list(voices))
+        if not ranking:
+            raise TTSError(f"No configured provider has a voice for {language}")
+        healthy = [p for p in ranking if self.table.is_healthy(p)]
+        if len(healthy) > 1 and self._random.random() < self.explore_rate:
+            explored = self._random.choice(healthy[1:])
+            ranking.remove(explored)
+            ranking.insert(0, explored)
+        attempts = []
+        for provider in ranking:
+            start_time = time.monotonic()
+            try:
+                with span("route", provider=provider) as route:
+                    result = synthesize(provider, text, credentials, **voices[provider])
+            except Exception as e:
+                elapsed = time.monotonic() - start_time
+                self.table.record(provider, elapsed, len(text), ok=False)
+                attempts.append({"provider": provider, "ok": False, "seconds": elapsed, "error": str(e)})
+                print(f"Router: {provider} failed after {elapsed:.2f}s ({e}), failing over")
+                continue
+            elapsed = time.monotonic() - start_time
+            # Cache hits and coalesced calls say nothing about the provider's latency
+            if _served_by_provider(route):
+                self.table.record(provider, elapsed, len(text), ok=True)
+            attempts.append({"provider": provider, "ok": True, "seconds": elapsed, "error": None})
+            return result, RouteDecision(provider, attempts, ranking, voices)
+        raise TTSError("All providers failed: " + "; ".join(f"{a['provider']}: {a['error']}" for a in attempts))
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Returns the process-wide Router, so its latency table is shared by all sessions."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router()
+    return _router
+
+
+if __name__ == "__main__":
+    # Simulation: ElevenLabs, the fastest provider, degrades halfway through (30% of
+    # calls take 2s, 10% fail) while Google and Polly stay healthy. Compares always
+    # using the degraded ElevenLabs with routing, and asserts that routing keeps
+    # the tail down by moving traffic away from ElevenLabs once it degrades.
+    import tempfile
+    import os
+    from tts_engine import Synthesis
+    from voice_catalog import VoiceCatalog, fallback_voices
+
+    base_latency = {"google": 0.04, "polly": 0.05, "elevenlabs": 0.03}
+    rng = random.Random(3)
+    degraded = {"elevenlabs": True}
+
+    def fake_synthesize(provider, text, credentials, **settings):
+        delay = base_latency[provider] * rng.uniform(0.8, 1.5)
+        if degraded.get(provider):
+            if rng.random() < 0.1:
+                time.sleep(delay)
+                raise RuntimeError("503 Service Unavailable")
+            if rng.random() < 0.3:
+                delay = 2.0
+        time.sleep(delay)
+        return Synthesis(b"\x00" * 100, delay)
+
+    catalog = VoiceCatalog(path=os.path.join(tempfile.mkdtemp(), "voices.json"),
+                           fetchers={p: lambda c, p=p: fallback_voices(p) for p in REQUIRED_CREDENTIALS})
+    credentials = {"gcp_service_account": {}, "api_eleven_labs": "key",
+                   "aws_access_key_id": "id", "aws_secret_access_key": "secret"}
+
+    def summarize(name, latencies, failures):
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[int(0.95 * len(latencies))]
+        print(f"{name:18s} p50={p50:.3f}s p95={p95:.3f}s max={latencies[-1]:.3f}s failures={failures}")
+        return p95
+
+    latencies, failures = [], 0
+    for i in range(60):
+        start = time.monotonic()
+        try:
+            fake_synthesize("elevenlabs", "Hello there.", credentials)
+        except Exception:
+            failures += 1
+        latencies.append(time.monotonic() - start)
+    slow_p95 = summarize("elevenlabs only", latencies, failures)
+
+    router = Router(RoutingTable(cooldown=1.0), catalog, synthesize=fake_synthesize)
+    latencies, failures, chosen = [], 0, {"healthy": {}, "degraded": {}}
+    for phase in ("healthy", "degraded"):
+        degraded["elevenlabs"] = phase == "degraded"
+        for i in range(60):
+            start = time.monotonic()
+            try:
+                _, decision = router.synthesize("Hello there.", "en-US", "Female", credentials)
+                chosen[phase][decision.provider] = chosen[phase].get(decision.provider, 0) + 1
+            except Exception:
+                failures += 1
+            if phase == "degraded":
+                latencies.append(time.monotonic() - start)
+    routed_p95 = summarize("routed", latencies, failures)
+    print(f"Requests served per provider: {chosen}")
+    for row in router.table.snapshot():
+        print(row)
+    assert routed_p95 < slow_p95, f"routed p95 {routed_p95:.3f}s is not below {slow_p95:.3f}s"
+    share = {phase: served.get("elevenlabs", 0) / max(sum(served.values()), 1) for phase, served in chosen.items()}
+    assert share["degraded"] < share["healthy"], f"ElevenLabs share did not drop after degrading: {share}"
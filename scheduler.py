@@ -0,0 +1,367 @@
+from contextlib import contextmanager
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from concurrency import PROVIDER_RATE_LIMITS, TokenBucket
+from metrics import registry
+
+# Characters per minute per provider, across every session in the process.
+# Conservative defaults; override with TTS_CHAR_BUDGETS="google=150000,polly=60000".
+PROVIDER_CHAR_BUDGETS = {
+    "google": 150000,
+    "elevenlabs": 30000,
+    "polly": 100000,
+}
+
+# Provider calls allowed in flight at once, across every session in the process
+PROVIDER_MAX_IN_FLIGHT = {
+    "google": 16,
+    "elevenlabs": 4,
+    "polly": 8,
+}
+
+# (session id, weight) used by calls made outside any session (batch.py, scripts)
+DEFAULT_SESSION = ("default", 1.0)
+
+
+def _budgets(env_name, defaults):
+    """Returns defaults updated with "provider=value,..." overrides from an environment variable."""
+    budgets = dict(defaults)
+    for item in os.getenv(env_name, "").split(","):
+        if "=" in item:
+            provider, value = item.split("=", 1)
+            budgets[provider.strip()] = float(value)
+    return budgets
+
+
+# The session a call is queued under follows the caller through a context variable;
+# worker threads start without it, so thread pools call set_session in their initializer.
+_session = contextvars.ContextVar("tts_scheduler_session", default=DEFAULT_SESSION)
+
+
+def set_session(session_id, weight=1.0):
+    """Queues provider calls made from this thread (or task) under session_id with the given weight."""
+    _session.set((session_id, weight))
+
+
+def current_session():
+    """Returns the (session id, weight) calls are currently queued under."""
+    return _session.get()
+
+
+def session_initializer(initializer=None):
+    """Returns a thread-pool initializer that queues worker threads under the calling session, then runs initializer."""
+    session = current_session()
+
+    def initialize():
+        set_session(*session)
+        if initializer is not None:
+            initializer()
+    return initialize
+
+
+class ProviderQueue:
+    """Budgets, in-flight count and waiting calls for one provider."""
+
+    def __init__(self, provider, requests_per_second, chars_per_minute, max_in_flight):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_second)
+        self.chars = TokenBucket(chars_per_minute / 60.0, capacity=chars_per_minute)
+        self.requests_per_second = requests_per_second
+        self.chars_per_minute = chars_per_minute
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiting = []  # heap of (finish tag, sequence, session id, start tag)
+        self.virtual_time = 0.0
+        self.last_finish = {}  # session id -> finish tag of its latest call
+        self.admitted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class FairScheduler:
+    """Process-wide admission control for provider calls.
+
+    A call is admitted once its provider has a free in-flight slot and both
+    budgets (requests/second and characters/minute token buckets) cover it.
+    Waiting calls are ordered by weighted fair queuing across sessions: a
+    call's finish tag is its session's previous tag (or the provider's virtual
+    time, if later) plus chars / weight, and the lowest tag goes first. A
+    session sending a long document queues behind its own earlier chunks, so
+    other sessions' short requests are interleaved instead of waiting for it.
+    """
+
+    def __init__(self, request_budgets=None, char_budgets=None, max_in_flight=None):
+        self.request_budgets = request_budgets or _budgets("TTS_REQUEST_BUDGETS", PROVIDER_RATE_LIMITS)
+        self.char_budgets = char_budgets or _budgets("TTS_CHAR_BUDGETS", PROVIDER_CHAR_BUDGETS)
+        self.max_in_flight = max_in_flight or _budgets("TTS_MAX_IN_FLIGHT", PROVIDER_MAX_IN_FLIGHT)
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._sequence = itertools.count()
+        self._async_waiters = set()  # (event loop, asyncio.Event) of asyncio callers waiting for admission
+
+    def _queue(self, provider):
+        queue = self._queues.get(provider)
+        if queue is None:
+            queue = self._queues[provider] = ProviderQueue(
+                provider,
+                self.request_budgets.get(provider, 5.0),
+                self.char_budgets.get(provider, 60000),
+                int(self.max_in_flight.get(provider, 4))
+            )
+        return queue
+
+    def _admit_delay(self, queue, ticket, chars):
+        """Returns 0 if ticket may start now, the seconds until its budgets allow it, or None to wait for a change."""
+        if queue.waiting[0] is not ticket or queue.in_flight >= queue.max_in_flight:
+            return None
+        return max(queue.requests.wait_time(1), queue.chars.wait_time(min(chars, queue.chars.capacity)))
+
+    def _publish(self, queue):
+        registry.set("tts_queue_depth", len(queue.waiting), provider=queue.provider)
+        registry.set("tts_in_flight", queue.in_flight, provider=queue.provider)
+
+    def _notify(self):
+        # Called with self._cond held: wakes waiting threads and asyncio callers to recheck admission
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _enqueue(self, queue, chars, session):
+        # Called with self._cond held: queues a ticket ordered by its weighted finish tag
+        session_id, weight = session or current_session()
+        start_tag = max(queue.virtual_time, queue.last_finish.get(session_id, 0.0))
+        ticket = (start_tag + max(chars, 1) / weight, next(self._sequence), session_id, start_tag)
+        queue.last_finish[session_id] = ticket[0]
+        heapq.heappush(queue.waiting, ticket)
+        self._publish(queue)
+        self._notify()  # the new call may be the head now
+        return ticket
+
+    def _abandon(self, queue, ticket):
+        # Called with self._cond held: drops a ticket whose caller stopped waiting
+        queue.waiting.remove(ticket)
+        heapq.heapify(queue.waiting)
+        self._notify()
+
+    def _admit(self, queue, ticket, chars, start):
+        # Called with self._cond held once _admit_delay is 0: takes the budgets and a slot
+        heapq.heappop(queue.waiting)
+        queue.requests.try_acquire(1)
+        queue.chars.try_acquire(min(chars, queue.chars.capacity))
+        queue.virtual_time = max(queue.virtual_time, ticket[3])
+        if not queue.waiting:
+            # Idle provider: nobody is owed service, so old finish tags no longer matter
+            queue.last_finish.clear()
+        queue.in_flight += 1
+        waited = time.monotonic() - start
+        queue.admitted += 1
+        queue.wait_total += waited
+        queue.wait_max = max(queue.wait_max, waited)
+        self._publish(queue)
+        self._notify()
+        return waited
+
+    def acquire(self, provider, chars=0, session=None):
+        """Blocks until a call of `chars` characters may start; returns the seconds waited.
+
+        Every acquire must be paired with a release(provider) once the call ends.
+        """
+        start = time.monotonic()
+        with self._cond:
+            queue = self._queue(provider)
+            ticket = self._enqueue(queue, chars, session)
+            try:
+                delay = self._admit_delay(queue, ticket, chars)
+                while delay != 0:
+                    self._cond.wait(delay)
+                    delay = self._admit_delay(queue, ticket, chars)
+            except BaseException:
+                self._abandon(queue, ticket)
+                raise
+            return self._admit(queue, ticket, chars, start)
+
+    async def acquire_async(self, provider, chars=0, session=None):
+        """Awaitable acquire() for asyncio callers: the same queue and budgets, waiting without blocking the loop.
+
+        Every acquire_async must be paired with a release(provider) once the call ends.
+        """
+        import asyncio
+
+        start = time.monotonic()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            queue = self._queue(provider)
+            ticket = self._enqueue(queue, chars, session)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._admit_delay(queue, ticket, chars)
+                    if delay == 0:
+                        return self._admit(queue, ticket, chars, start)
+                    waiter[1].clear()
+                # Woken by _notify on any queue change, or once the budgets allow the call
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                self._abandon(queue, ticket)
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+
+    def release(self, provider):
+        """Frees the in-flight slot taken by acquire()."""
+        with self._cond:
+            queue = self._queue(provider)
+            queue.in_flight -= 1
+            self._publish(queue)
+            self._notify()
+
+    @contextmanager
+    def slot(self, provider, chars=0, session=None):
+        """Holds an admitted slot for the duration of a with block."""
+        self.acquire(provider, chars, session)
+        try:
+            yield
+        finally:
+            self.release(provider)
+
+    def stats(self):
+        """Returns per-provider queue depth, in-flight calls, budgets and wait times, for display."""
+        with self._cond:
+            return [{
+                "provider": provider,
+                "queued": len(queue.waiting),
+                "sessions_waiting": len({ticket[2] for ticket in queue.waiting}),
+                "in_flight": queue.in_flight,
+                "max_in_flight": queue.max_in_flight,
+                "requests_per_second": queue.requests_per_second,
+                "chars_per_minute": queue.chars_per_minute,
+                "admitted": queue.admitted,
+                "mean_wait": queue.wait_total / queue.admitted if queue.admitted else 0.0,
+                "max_wait": queue.wait_max,
+            } for provider, queue in sorted(self._queues.items())]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide FairScheduler shared by every session."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FairScheduler()
+    return _scheduler
+
+
+def configure(request_budgets=None, char_budgets=None, max_in_flight=None, share=1):
+    """Replaces the process-wide FairScheduler and returns the new one.
+
+    The given per-provider budgets override the environment and defaults, and
+    every budget is divided by share (e.g. the number of worker processes
+    serving the same accounts). Calls already waiting stay on the old scheduler,
+    so this is meant for process start-up.
+    """
+    global _scheduler
+    budgets = []
+    for env_name, defaults, overrides in (("TTS_REQUEST_BUDGETS", PROVIDER_RATE_LIMITS, request_budgets),
+                                          ("TTS_CHAR_BUDGETS", PROVIDER_CHAR_BUDGETS, char_budgets),
+                                          ("TTS_MAX_IN_FLIGHT", PROVIDER_MAX_IN_FLIGHT, max_in_flight)):
+        values = _budgets(env_name, defaults)
+        values.update(overrides or {})
+        budgets.append(values)
+    request_budgets, char_budgets, max_in_flight = budgets
+    with _scheduler_lock:
+        _scheduler = FairScheduler(
+            request_budgets={provider: value / share for provider, value in request_budgets.items()},
+            char_budgets={provider: value / share for provider, value in char_budgets.items()},
+            max_in_flight={provider: max(1, int(value) // share) for provider, value in max_in_flight.items()},
+        )
+    return _scheduler
+
+
+if __name__ == "__main__":
+    # Simulation: one session sends a 60-chunk document to Polly with 10 chunks in
+    # flight while 20 other sessions each send one short request. Compares arrival
+    # order (every call in one queue) with fair queuing per session.
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+
+    CALL_SECONDS = 0.05
+
+    def run(fair):
+        scheduler = FairScheduler(request_budgets={"polly": 20.0}, char_budgets={"polly": 600000},
+                                  max_in_flight={"polly": 8})
+        rng = random.Random(7)
+        light_waits = []
+        heavy_done = []
+
+        def call(session_id, chars):
+            waited = scheduler.acquire("polly", chars, session=(session_id if fair else "all", 1.0))
+            try:
+                time.sleep(CALL_SECONDS)
+            finally:
+                scheduler.release("polly")
+            return waited
+
+        def heavy():
+            with ThreadPoolExecutor(max_workers=10) as pool:
+                list(pool.map(lambda i: call("document", 2000), range(60)))
+            heavy_done.append(time.monotonic() - started)
+
+        def light(i):
+            time.sleep(0.2 + rng.uniform(0, 1.0))
+            light_waits.append(call(f"user-{i}", 150))
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=21) as pool:
+            pool.submit(heavy)
+            list(pool.map(light, range(20)))
+        light_waits.sort()
+        print(f"{'fair queuing' if fair else 'arrival order':14s} short requests: "
+              f"p50 wait={light_waits[len(light_waits) // 2]:.3f}s max wait={light_waits[-1]:.3f}s | "
+              f"document finished after {heavy_done[0]:.2f}s")
+        return light_waits[-1]
+
+    fifo_max = run(fair=False)
+    fair_max = run(fair=True)
+    assert fair_max < fifo_max, "fair queuing should shorten the wait of short requests"
+
+    # asyncio callers (async_engine) are held to the same budgets: 30 calls against
+    # 20 requests/second and 4 in flight need about half a second
+    import asyncio
+
+    async def async_calls():
+        scheduler = FairScheduler(request_budgets={"polly": 20.0}, char_budgets={"polly": 600000},
+                                  max_in_flight={"polly": 4})
+        peak_in_flight = 0
+
+        async def call():
+            nonlocal peak_in_flight
+            await scheduler.acquire_async("polly", 100)
+            try:
+                peak_in_flight = max(peak_in_flight, scheduler.stats()[0]["in_flight"])
+                await asyncio.sleep(0.01)
+            finally:
+                scheduler.release("polly")
+
+        started = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(30)))
+        return time.monotonic() - started, peak_in_flight
+
+    elapsed, peak_in_flight = asyncio.run(async_calls())
+    print(f"asyncio callers: 30 calls in {elapsed:.2f}s, at most {peak_in_flight} in flight")
+    assert peak_in_flight <= 4, f"{peak_in_flight} async calls in flight with a limit of 4"
+    assert elapsed >= 0.4, f"30 async calls took {elapsed:.2f}s under a 20 requests/second budget"
@@ -0,0 +1,116 @@
+from collections import namedtuple
+import time
+
+from audio_cache import get_audio_cache
+from audio_merge import merge_audio_bytes
+from chunking import chunk_for_provider, needs_chunking, split_segments
+from concurrency import run_concurrently
+from metrics import registry
+from scheduler import session_initializer
+from tts_engine import Synthesis, TTSError, provider_request, synthesize
+
+# Templated text is cached per sentence (or phrase) instead of per request: the
+# fixed parts of a template are synthesized once and only the changing segments
+# reach the provider. Each segment is a separate request, so intonation resets
+# at segment boundaries; this suits prompts and notifications more than prose.
+SegmentedResult = namedtuple("SegmentedResult", [
+    "audio", "time_taken", "cached_chars", "total_chars", "cached_segments", "segment_count"
+])
+
+
+def segment_text(text, provider, phrases=False, chunk_limit=None):
+    """Splits text into cacheable segments, each within the provider's request limit."""
+    segments = []
+    for segment in split_segments(text, phrases=phrases):
+        if needs_chunking(segment, provider, max_chars=chunk_limit):
+            segments.extend(chunk_for_provider(segment, provider, max_chars=chunk_limit))
+        else:
+            segments.append(segment)
+    return segments
+
+
+def synthesize_segmented(provider, text, credentials, phrases=False, max_parallel=4, initializer=None,
+                         prefetched=None, **options):
+    """Synthesizes text segment by segment, reusing cached segment audio, and stitches the result.
+
+    options are the voice settings of tts_engine.synthesize. prefetched maps
+    segment cache keys to audio synthesized ahead of time (see speculative.py);
+    those segments count as cached. SSML is sent as a single request, since its
+    markup cannot be split into sentences safely.
+    Returns a SegmentedResult; raises TTSError if any segment fails.
+    """
+    start_time = time.time()
+    if options.get("text_type") == "ssml":
+        result = synthesize(provider, text, credentials, max_parallel=max_parallel, **options)
+        return SegmentedResult(result.audio, result.time_taken, 0, len(text), 0, 1)
+
+    synthesize_text, cache_key_for, audio_format, chunk_limit = provider_request(provider, credentials, **options)
+    segments = segment_text(text, provider, phrases=phrases, chunk_limit=chunk_limit)
+    if not segments:
+        raise TTSError("Nothing to synthesize", provider=provider)
+    cache = get_audio_cache()
+    prefetched = {} if prefetched is None else prefetched
+    keys = [cache_key_for(segment) for segment in segments]
+    cached = [key in prefetched or cache.contains(key) for key in keys]
+    errors = []
+
+    def run_segment(i, segment):
+        audio = prefetched.get(keys[i])
+        if audio is not None:
+            return Synthesis(audio, 0.0)
+        try:
+            return synthesize_text(segment)
+        except Exception as e:
+            errors.append(f"Segment {i+1}: {e}")
+            return None
+
+    # Cached segments are local reads; only the missing ones reach the provider scheduler
+    results = [run_segment(i, segment) if hit else None for i, (segment, hit) in enumerate(zip(segments, cached))]
+    missing = [i for i, hit in enumerate(cached) if not hit]
+    synthesized, _ = run_concurrently(
+        lambda _, i: run_segment(i, segments[i]),
+        missing,
+        max_in_flight=max_parallel,
+        initializer=session_initializer(initializer)
+    )
+    for i, result in zip(missing, synthesized):
+        results[i] = result
+    if errors or any(result is None for result in results):
+        raise TTSError(f"{len(errors)} of {len(segments)} segments failed: {'; '.join(errors)}", provider=provider)
+
+    cached_chars = sum(len(segment) for segment, hit in zip(segments, cached) if hit)
+    total_chars = sum(len(segment) for segment in segments)
+    registry.inc("tts_segment_characters_total", cached_chars, provider=provider, source="cache")
+    registry.inc("tts_segment_characters_total", total_chars - cached_chars, provider=provider, source="synthesized")
+    audio = merge_audio_bytes([result.audio for result in results], audio_format.name)
+    print(f"Segments: {sum(cached)} of {len(segments)} from cache "
+          f"({cached_chars} of {total_chars} characters)")
+    return SegmentedResult(audio, time.time() - start_time, cached_chars, total_chars, sum(cached), len(segments))
+
+
+def cached_fraction(result):
+    """Returns the fraction of a SegmentedResult's characters served from cache."""
+    return result.cached_chars / result.total_chars if result.total_chars else 0.0
+
+
+if __name__ == "__main__":
+    # Templated notifications against the mock ElevenLabs backend: after the first
+    # message, only the sentence with the changing name and number is billed.
+    import tempfile
+
+    import audio_cache
+    from mock_providers import MockProviderServer
+    import tts_engine
+
+    template = ("Thank you for contacting Acme support. Hello {name}, your ticket number is {number}. "
+                "A member of our team will reply within one business day. Have a great afternoon.")
+    customers = [("Asha", 1041), ("Ben", 1042), ("Chen", 1043), ("Dolores", 1044), ("Emeka", 1045)]
+    # audio_cache read TTS_CACHE_DIR when this module imported it, so point it at a fresh directory here
+    audio_cache._audio_cache = audio_cache.AudioCache(root=tempfile.mkdtemp())
+    with MockProviderServer(latency=0.1) as server:
+        tts_engine.ELEVENLABS_API_BASE = server.base_url
+        for name, number in customers:
+            result = synthesize_segmented("elevenlabs", template.format(name=name, number=number),
+                                          {"api_eleven_labs": "key"})
+            print(f"{name:8s} {cached_fraction(result):5.0%} of characters from cache, "
+                  f"{result.time_taken:.2f}s, upstream requests so far: {server.request_count}")
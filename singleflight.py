@@ -0,0 +1,185 @@
+from collections import namedtuple
+import asyncio
+import functools
+import inspect
+import threading
+import time
+
+from metrics import current_span
+
+FlightResult = namedtuple("FlightResult", ["value", "shared"])
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is in flight wait and receive the same result (or exception). Once the call
+    finishes the key is released, so later calls run again (and normally hit the
+    audio cache instead).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}  # (event loop, key) -> asyncio.Future
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Returns FlightResult(value, shared) where shared is True for callers that waited."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return FlightResult(call.value, True)
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return FlightResult(call.value, False)
+
+    async def do_async(self, key, fn):
+        """Awaitable counterpart of do() for a coroutine function; callers on the same event loop share the call."""
+        flight_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            future = self._async_calls.get(flight_key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self._async_calls[flight_key] = asyncio.get_running_loop().create_future()
+                self.executed += 1
+                leader = True
+        if not leader:
+            # shield: a waiter being cancelled must not cancel the leader's call
+            return FlightResult(await asyncio.shield(future), True)
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, so an error nobody waited for is not logged
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._async_calls[flight_key]
+        return FlightResult(value, False)
+
+    def stats(self):
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced,
+                    "in_flight": len(self._calls) + len(self._async_calls)}
+
+
+_flights = SingleFlight()
+
+
+def get_single_flight():
+    """Returns the process-wide SingleFlight shared by every session."""
+    return _flights
+
+
+def coalesced(key_fn):
+    """Decorates a synthesis function so concurrent identical requests share one provider call.
+
+    key_fn is called with the decorated function's arguments of the same names
+    (e.g. tts_engine.google_cache_key), so the key covers the normalized text and
+    every voice parameter. Waiters get the leader's audio with their own wait time.
+    Coroutine functions (AsyncEngine methods) are coalesced with SingleFlight.do_async.
+    """
+    key_params = list(inspect.signature(key_fn).parameters)
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def key_of(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return key_fn(*(bound.arguments[name] for name in key_params))
+
+        def shared(result, start_time):
+            span = current_span()
+            if span is not None:
+                span.attributes["coalesced"] = True
+            print(f"Coalesced with an identical in-flight request ({len(result.value.audio)} bytes)")
+            return result.value._replace(time_taken=time.time() - start_time)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start_time = time.time()
+                result = await _flights.do_async(key_of(args, kwargs), lambda: fn(*args, **kwargs))
+                return shared(result, start_time) if result.shared else result.value
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start_time = time.time()
+            result = _flights.do(key_of(args, kwargs), lambda: fn(*args, **kwargs))
+            return shared(result, start_time) if result.shared else result.value
+        return wrapper
+    return decorator
+
+
+if __name__ == "__main__":
+    # Fires concurrent duplicate requests at the mock ElevenLabs backend and checks
+    # that exactly one reaches it, then that distinct texts are not merged.
+    import os
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp())
+    from mock_providers import MockProviderServer
+    # tts_engine decorates with the imported module's SingleFlight, not this __main__ copy
+    import singleflight
+
+    with MockProviderServer(latency=0.2) as server:
+        import tts_engine
+        tts_engine.ELEVENLABS_API_BASE = server.base_url
+
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            results = list(pool.map(
+                lambda i: tts_engine.elevenlabs_synthesize_speech("Hello, how are you today?", "key", "voice"),
+                range(50)
+            ))
+        stats = singleflight.get_single_flight().stats()
+        assert server.request_count == 1, f"expected 1 upstream call, got {server.request_count}"
+        assert len({result.audio for result in results}) == 1
+        assert stats == {"executed": 1, "coalesced": 49, "in_flight": 0}, stats
+        print(f"50 concurrent duplicates -> {server.request_count} upstream call; {stats}")
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(lambda i: tts_engine.elevenlabs_synthesize_speech(f"Distinct text {i}", "key", "voice"),
+                          range(10)))
+        stats = singleflight.get_single_flight().stats()
+        assert server.request_count == 11, f"expected 11 upstream calls, got {server.request_count}"
+        assert stats == {"executed": 11, "coalesced": 49, "in_flight": 0}, stats
+        print(f"10 distinct texts -> {server.request_count - 1} upstream calls; {stats}")
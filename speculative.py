@@ -0,0 +1,198 @@
+from collections import OrderedDict
+import os
+import re
+import threading
+import time
+
+from audio_cache import get_audio_cache
+from metrics import registry
+from scheduler import set_session
+from segment_cache import segment_text, synthesize_segmented
+from tts_engine import provider_request
+
+# Seconds without a text or settings change before speculation starts
+SPECULATIVE_DEBOUNCE_SECONDS = float(os.getenv("TTS_SPECULATIVE_DEBOUNCE_SECONDS", "1.5"))
+
+# Characters a session may send to providers speculatively, whether or not the audio gets used
+SPECULATIVE_CHAR_BUDGET = int(os.getenv("TTS_SPECULATIVE_CHAR_BUDGET", "5000"))
+
+# Speculative audio kept per session, least recently used dropped first
+SPECULATIVE_MAX_BYTES = int(os.getenv("TTS_SPECULATIVE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Scheduler weight of speculative calls: they yield to requests someone is waiting for
+SPECULATIVE_WEIGHT = 0.25
+
+# A text ending like this has no sentence still being typed
+_SENTENCE_END_RE = re.compile(r"""(?:[.!?]+["')\]”’]*|[।॥。！？]+["')\]”’]*)\s*$""")
+
+
+def complete_segments(text, provider, chunk_limit=None):
+    """Returns the segments of text that are finished: all but the last, unless the text ends a sentence."""
+    segments = segment_text(text, provider, chunk_limit=chunk_limit)
+    if segments and not _SENTENCE_END_RE.search(text):
+        segments.pop()
+    return segments
+
+
+class SpeculativeSession:
+    """Segments of one session's text synthesized while it is being edited, with spend and hit counters.
+
+    update() is called with the current text and settings on every rerun;
+    after SPECULATIVE_DEBOUNCE_SECONDS without changes, the finished sentences
+    that are not in the audio cache are synthesized in the background, within
+    the session's character budget. synthesize() then stitches the text with
+    those segments and only calls the provider for the rest.
+    """
+
+    def __init__(self, session_id, char_budget=SPECULATIVE_CHAR_BUDGET, max_bytes=SPECULATIVE_MAX_BYTES,
+                 debounce_seconds=SPECULATIVE_DEBOUNCE_SECONDS):
+        self.session_id = session_id
+        self.char_budget = char_budget
+        self.max_bytes = max_bytes
+        self.debounce_seconds = debounce_seconds
+        self._lock = threading.Lock()
+        self._segments = OrderedDict()  # cache key -> (audio, seconds the provider took)
+        self._bytes = 0
+        self._timer = None
+        self._request = None
+        self._generation = 0
+        self.chars_spent = 0
+        self.speculated = 0
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._segments
+
+    def get(self, key):
+        """Returns the speculative audio for a segment cache key, or None."""
+        with self._lock:
+            entry = self._segments.get(key)
+            if entry is None:
+                return None
+            self._segments.move_to_end(key)
+            return entry[0]
+
+    def _store(self, key, audio, seconds):
+        with self._lock:
+            self._segments[key] = (audio, seconds)
+            self._bytes += len(audio)
+            while self._bytes > self.max_bytes and len(self._segments) > 1:
+                _, (evicted, _) = self._segments.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def update(self, provider, text, credentials, **options):
+        """Schedules speculation of text's finished sentences once it stops changing."""
+        if options.get("text_type") == "ssml":
+            return
+        request = (provider, text, tuple(sorted(options.items())))
+        with self._lock:
+            if request == self._request:
+                return
+            self._request = request
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce_seconds, self._speculate,
+                                          args=(self._generation, provider, text, credentials, options))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """Stops pending and running speculation (the running segment still finishes)."""
+        with self._lock:
+            self._generation += 1
+            self._request = None
+            if self._timer is not None:
+                self._timer.cancel()
+
+    def _speculate(self, generation, provider, text, credentials, options):
+        set_session(f"{self.session_id}:speculative", SPECULATIVE_WEIGHT)
+        try:
+            synthesize_text, cache_key_for, _, chunk_limit = provider_request(provider, credentials, **options)
+            cache = get_audio_cache()
+            for segment in complete_segments(text, provider, chunk_limit):
+                if generation != self._generation:
+                    return  # the text changed; a newer timer covers it
+                key = cache_key_for(segment)
+                if key in self or cache.contains(key):
+                    continue
+                if self.chars_spent + len(segment) > self.char_budget:
+                    print(f"Speculative budget of {self.char_budget} characters used up for session {self.session_id}")
+                    return
+                self.chars_spent += len(segment)
+                registry.inc("tts_speculative_characters_total", len(segment), provider=provider)
+                start = time.perf_counter()
+                result = synthesize_text(segment)
+                self._store(key, result.audio, time.perf_counter() - start)
+                self.speculated += 1
+        except Exception as e:
+            print(f"Speculative synthesis failed: {e}")
+
+    def synthesize(self, provider, text, credentials, **options):
+        """Synthesizes text through the segment cache, using the speculative segments; returns a SegmentedResult."""
+        self.cancel()
+        _, cache_key_for, _, chunk_limit = provider_request(provider, credentials, **options)
+        hits = 0
+        seconds_saved = 0.0
+        if options.get("text_type") != "ssml":
+            with self._lock:
+                for segment in segment_text(text, provider, chunk_limit=chunk_limit):
+                    entry = self._segments.get(cache_key_for(segment))
+                    if entry is not None:
+                        hits += 1
+                        seconds_saved += entry[1]
+        result = synthesize_segmented(provider, text, credentials, prefetched=self, **options)
+        # Segments served by the shared audio cache were never speculation's to win or lose
+        misses = result.segment_count - result.cached_segments
+        self.hits += hits
+        self.misses += misses
+        self.seconds_saved += seconds_saved
+        registry.inc("tts_speculative_segments_total", hits, provider=provider, outcome="hit")
+        registry.inc("tts_speculative_segments_total", misses, provider=provider, outcome="miss")
+        registry.inc("tts_speculative_seconds_saved_total", seconds_saved, provider=provider)
+        return result
+
+    def stats(self):
+        """Returns the session's speculative hit rate, latency saved and spend, for display."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            "seconds_saved": self.seconds_saved,
+            "segments_speculated": self.speculated,
+            "chars_spent": self.chars_spent,
+            "char_budget": self.char_budget,
+        }
+
+
+if __name__ == "__main__":
+    # A user types a paragraph in three edits against the mock ElevenLabs backend
+    # (0.3 s per request), pausing between them, then presses the button.
+    import tempfile
+
+    import audio_cache
+    from mock_providers import MockProviderServer
+    import tts_engine
+
+    audio_cache._audio_cache = audio_cache.AudioCache(root=tempfile.mkdtemp())
+    credentials = {"api_eleven_labs": "key"}
+    edits = [
+        "Welcome to the quarterly review. Revenue grew in every region.",
+        "Welcome to the quarterly review. Revenue grew in every region. Costs held steady. Hiring slo",
+        "Welcome to the quarterly review. Revenue grew in every region. Costs held steady. "
+        "Hiring slowed in the fourth quarter. Questions are welcome at the end",
+    ]
+    with MockProviderServer(latency=0.3) as server:
+        tts_engine.ELEVENLABS_API_BASE = server.base_url
+        session = SpeculativeSession("demo", debounce_seconds=0.5)
+        for text in edits:
+            session.update("elevenlabs", text, credentials, voice="mock-voice")
+            time.sleep(1.5)
+        start = time.perf_counter()
+        result = session.synthesize("elevenlabs", edits[-1], credentials, voice="mock-voice")
+        print(f"Button to audio: {time.perf_counter() - start:.2f}s for {result.segment_count} sentences, "
+              f"{result.segment_count - result.cached_segments} synthesized after the click")
+        print(session.stats())
@@ -0,0 +1,73 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from audio_cache import get_audio_cache
+
+# Bytes read per iteration from streaming HTTP/Polly responses
+STREAM_READ_SIZE = 4096
+
+# Audio buffered before the UI is given a playable preview (~2s of 128 kbps MP3)
+PREVIEW_BYTES = 32 * 1024
+
+
+def pipelined(fn, items, lookahead=2, initializer=None):
+    """Yields fn(item) for each item in order, keeping up to `lookahead` calls in flight.
+
+    This lets chunk N+1 be synthesized while chunk N is being consumed.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, lookahead), initializer=initializer) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) > lookahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def cached_stream(cache_key, stream_factory):
+    """Yields audio for cache_key from the cache, or from stream_factory() while storing it."""
+    audio_cache = get_audio_cache()
+    cached = audio_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for block in stream_factory():
+        parts.append(block)
+        yield block
+    audio_cache.put(cache_key, b"".join(parts))
+
+
+def consume_stream(stream, on_preview=None, preview_bytes=PREVIEW_BYTES):
+    """Collects an iterable of audio blocks into a growing in-memory buffer.
+
+    Once preview_bytes have arrived (or the stream ends first), on_preview(audio)
+    is called so playback can start before synthesis completes.
+    Returns a dict with audio, time_to_first_byte, total_time and bytes.
+    """
+    start_time = time.time()
+    time_to_first_byte = None
+    buffer = bytearray()
+    previewed = on_preview is None
+    for block in stream:
+        if not block:
+            continue
+        if time_to_first_byte is None:
+            time_to_first_byte = time.time() - start_time
+        buffer += block
+        if not previewed and len(buffer) >= preview_bytes:
+            on_preview(bytes(buffer))
+            previewed = True
+    total_time = time.time() - start_time
+    if not previewed and buffer:
+        on_preview(bytes(buffer))
+    print(f'Audio content streamed ({len(buffer)} bytes)')
+    print(f'Time to first byte: {time_to_first_byte or 0:.2f} seconds, total: {total_time:.2f} seconds')
+    return {
+        "audio": bytes(buffer),
+        "time_to_first_byte": time_to_first_byte,
+        "total_time": total_time,
+        "bytes": len(buffer),
+    }
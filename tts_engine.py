@@ -0,0 +1,570 @@
+# Synthesis engine shared by the Streamlit app and the batch CLI. Nothing here
+# depends on Streamlit: credentials are passed in as a mapping with the same keys
+# as .streamlit/secrets.toml, and failures raise TTSError instead of calling st.error.
+# Provider SDKs are imported on first use, so importing this module stays cheap.
+from collections import namedtuple
+from contextlib import closing
+import json
+import os
+import time
+
+from clients import get_google_client, get_polly_client, get_http_session
+from audio_cache import get_audio_cache, make_cache_key
+from concurrency import run_concurrently
+from audio_merge import merge_audio_bytes
+from audio_formats import pcm_payload, resolve_format
+from chunking import PROVIDER_LIMITS, chunk_for_provider, chunk_text, needs_chunking
+from streaming import STREAM_READ_SIZE, cached_stream, pipelined
+from resilience import DeadlineExceeded, resilient_call
+from metrics import span, current_span, traced
+from singleflight import coalesced
+from scheduler import get_scheduler, session_initializer
+
+PROVIDERS = ("google", "elevenlabs", "polly")
+
+# Default voice per provider when a request does not name one
+DEFAULT_VOICES = {
+    "google": "en-US-Standard-A",
+    "elevenlabs": "21m00Tcm4TlvDq8ikWAM",
+    "polly": "Joanna",
+}
+
+ELEVENLABS_API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io")
+
+# ElevenLabs output_format when a request does not choose one (the API's own default)
+ELEVENLABS_DEFAULT_FORMAT = "mp3_44100_128"
+
+# (connect, read) timeouts for ElevenLabs requests, in seconds
+ELEVENLABS_TIMEOUT = (5, 60)
+
+# Timeout for one Google request, in seconds, so a hung call cannot outlast the retry deadline
+GOOGLE_TIMEOUT = 20
+
+# Chunk size used when streaming Google TTS, small enough for a quick first chunk
+STREAMING_CHUNK_CHARS = 1000
+
+# Synthesis functions return audio in memory; writing it anywhere is up to the caller
+Synthesis = namedtuple("Synthesis", ["audio", "time_taken"])
+ChunkedResult = namedtuple("ChunkedResult", ["audio", "wall_time", "total_time", "failed_count", "errors"])
+
+
+class TTSError(Exception):
+    """Raised when a provider fails to synthesize speech."""
+
+    def __init__(self, message, provider=None, status_code=None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+
+
+def load_credentials(secrets_path=".streamlit/secrets.toml"):
+    """Loads provider credentials from a Streamlit secrets file and the environment.
+
+    Environment variables take precedence: GOOGLE_APPLICATION_CREDENTIALS (path
+    to a service account JSON), ELEVEN_LABS_API_KEY, AWS_ACCESS_KEY_ID,
+    AWS_SECRET_ACCESS_KEY and AWS_REGION.
+    """
+    credentials = {}
+    if secrets_path and os.path.exists(secrets_path):
+        import tomllib
+        with open(secrets_path, "rb") as f:
+            credentials.update(tomllib.load(f))
+    if os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+        with open(os.environ["GOOGLE_APPLICATION_CREDENTIALS"]) as f:
+            credentials["gcp_service_account"] = json.load(f)
+    env_keys = {
+        "ELEVEN_LABS_API_KEY": "api_eleven_labs",
+        "AWS_ACCESS_KEY_ID": "aws_access_key_id",
+        "AWS_SECRET_ACCESS_KEY": "aws_secret_access_key",
+        "AWS_REGION": "aws_region",
+    }
+    for env_name, key in env_keys.items():
+        if os.getenv(env_name):
+            credentials[key] = os.environ[env_name]
+    return credentials
+
+
+def _require(credentials, key, provider):
+    try:
+        with span("credential_load", provider=provider):
+            return credentials[key]
+    except (KeyError, TypeError):
+        raise TTSError(f"Missing credential '{key}'", provider=provider)
+
+
+def _call(provider, request, chars=0, discard=None):
+    """Runs a provider request with retries/backoff, surfacing deadline errors as TTSError.
+
+    Every attempt (retries and hedged requests included) first waits for the
+    process-wide scheduler to admit it, which enforces the provider's request
+    and character budgets fairly across sessions. discard(response) closes the
+    response of a hedged request that lost.
+    """
+    scheduler = get_scheduler()
+
+    def admitted_request():
+        with span("queue", provider=provider, chars=chars):
+            scheduler.acquire(provider, chars)
+        try:
+            return request()
+        finally:
+            scheduler.release(provider)
+
+    try:
+        with span("network", provider=provider):
+            return resilient_call(provider, admitted_request, discard=discard)
+    except DeadlineExceeded as e:
+        raise TTSError(str(e), provider=provider) from e
+
+
+def _google_error(e):
+    status_code = getattr(e, "code", None)
+    error = TTSError(str(e), provider="google", status_code=status_code if isinstance(status_code, int) else None)
+    error.__cause__ = e
+    return error
+
+
+def _polly_error(e):
+    # Network errors (ReadTimeoutError, ConnectionClosedError) carry response=None
+    response = getattr(e, "response", None) or {}
+    error = TTSError(str(e), provider="polly", status_code=response.get("ResponseMetadata", {}).get("HTTPStatusCode"))
+    error.__cause__ = e
+    return error
+
+
+def google_cache_key(text, language_code, voice_name, speaking_rate, pitch, audio_encoding="MP3",
+                     sample_rate_hertz=None):
+    # sample_rate_hertz joins the key only when set, so default-rate entries keep their keys
+    rate = {"sample_rate_hertz": sample_rate_hertz} if sample_rate_hertz else {}
+    return make_cache_key(
+        "google", text, language_code=language_code, voice_name=voice_name,
+        speaking_rate=speaking_rate, pitch=pitch, audio_encoding=audio_encoding, **rate
+    )
+
+
+def elevenlabs_cache_key(text, voice_id, model_id, output_format=ELEVENLABS_DEFAULT_FORMAT):
+    # The default format keeps the key it had before output_format was selectable
+    return make_cache_key(
+        "elevenlabs", text, voice_id=voice_id, model_id=model_id, stability=0.5, similarity_boost=0.5,
+        output_format="audio/mpeg" if output_format == ELEVENLABS_DEFAULT_FORMAT else output_format
+    )
+
+
+def google_audio_config(texttospeech, audio_encoding, sample_rate_hertz, speaking_rate, pitch):
+    """Returns a Google AudioConfig; sample_rate_hertz None leaves the voice's native rate."""
+    rate = {"sample_rate_hertz": sample_rate_hertz} if sample_rate_hertz else {}
+    return texttospeech.AudioConfig(
+        audio_encoding=texttospeech.AudioEncoding[audio_encoding],
+        speaking_rate=speaking_rate,
+        pitch=pitch,
+        **rate
+    )
+
+
+def elevenlabs_request(voice_id, api_key, output_format, stream=False):
+    """Returns the (url, headers) of an ElevenLabs synthesis request."""
+    url = f"{ELEVENLABS_API_BASE}/v1/text-to-speech/{voice_id}{'/stream' if stream else ''}"
+    headers = {
+        "xi-api-key": api_key,
+        "Content-Type": "application/json",
+        "accept": "audio/mpeg" if output_format.startswith("mp3") else "*/*"
+    }
+    if output_format != ELEVENLABS_DEFAULT_FORMAT:
+        url += f"?output_format={output_format}"
+    return url, headers
+
+
+def aws_cache_key(text, texttype, voice_id, engine, output_format):
+    return make_cache_key(
+        "polly", text, voice_id=voice_id, engine=engine,
+        output_format=output_format, text_type=texttype
+    )
+
+
+def serve_from_cache(cache_key, start_time):
+    """Returns a Synthesis for cached audio, or None on a miss."""
+    with span("cache_lookup"):
+        audio_content = get_audio_cache().get(cache_key)
+    if audio_content is None:
+        return None
+    root = current_span()
+    if root is not None:
+        root.attributes["cache_hit"] = True
+    time_taken = time.time() - start_time
+    print(f'Audio content served from cache ({len(audio_content)} bytes)')
+    print(f'Time taken to generate audio: {time_taken:.2f} seconds')
+    return Synthesis(audio_content, time_taken)
+
+
+def _finish(cache_key, audio_content, start_time):
+    # audio_content is the SDK's own response buffer; it is cached and returned without copying
+    with span("disk_write", bytes=len(audio_content)):
+        get_audio_cache().put(cache_key, audio_content)
+    time_taken = time.time() - start_time
+    print(f'Audio content generated ({len(audio_content)} bytes)')
+    print(f'Time taken to generate audio: {time_taken:.2f} seconds')
+    return Synthesis(audio_content, time_taken)
+
+
+def write_audio(audio, output_filename):
+    """Writes in-memory audio to output_filename."""
+    with span("disk_write", bytes=len(audio)), open(output_filename, "wb") as out:
+        out.write(audio)
+    return output_filename
+
+
+# Google TTS Function
+@traced("google")
+@coalesced(google_cache_key)
+def google_synthesize_speech(text, language_code, voice_name, speaking_rate=1.0, pitch=0.0,
+                             credentials=None, audio_encoding="MP3", sample_rate_hertz=None):
+    """Synthesizes speech from the input string of text using Google TTS."""
+    start_time = time.time()
+    cache_key = google_cache_key(text, language_code, voice_name, speaking_rate, pitch, audio_encoding,
+                                 sample_rate_hertz)
+    cached = serve_from_cache(cache_key, start_time)
+    if cached is not None:
+        return cached
+    from google.cloud import texttospeech
+
+    service_account_info = _require(credentials, "gcp_service_account", "google")
+    with span("client_init"):
+        client = get_google_client(service_account_info)
+    with span("serialize"):
+        input_text = texttospeech.SynthesisInput(text=text)
+        voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
+        audio_config = google_audio_config(texttospeech, audio_encoding, sample_rate_hertz, speaking_rate, pitch)
+
+    def request():
+        try:
+            return client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_config,
+                                            timeout=GOOGLE_TIMEOUT)
+        except Exception as e:
+            raise _google_error(e) from e
+
+    response = _call("google", request, len(text))
+    with span("decode"):
+        audio_content = response.audio_content
+    return _finish(cache_key, audio_content, start_time)
+
+
+# ElevenLabs TTS Function
+@traced("elevenlabs")
+@coalesced(elevenlabs_cache_key)
+def elevenlabs_synthesize_speech(text, api_key, voice_id, model_id="eleven_monolingual_v1",
+                                 output_format=ELEVENLABS_DEFAULT_FORMAT):
+    """Synthesizes speech from the input string of text using ElevenLabs."""
+    start_time = time.time()
+    cache_key = elevenlabs_cache_key(text, voice_id, model_id, output_format)
+    cached = serve_from_cache(cache_key, start_time)
+    if cached is not None:
+        return cached
+    url, headers = elevenlabs_request(voice_id, api_key, output_format)
+    with span("serialize"):
+        body = json.dumps({
+            "text": text,
+            "model_id": model_id,
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.5
+            }
+        }).encode("utf-8")
+    with span("client_init"):
+        session = get_http_session()
+
+    def request():
+        try:
+            response = session.post(url, data=body, headers=headers, timeout=ELEVENLABS_TIMEOUT)
+        except Exception as e:
+            raise TTSError(str(e), provider="elevenlabs") from e
+        if response.status_code != 200:
+            raise TTSError(f"{response.status_code}, {response.text}", provider="elevenlabs",
+                           status_code=response.status_code)
+        return response
+
+    response = _call("elevenlabs", request, len(text))
+    with span("decode"):
+        audio_content = response.content
+    return _finish(cache_key, audio_content, start_time)
+
+
+# AWS Polly TTS Function
+@traced("polly")
+@coalesced(aws_cache_key)
+def aws_synthesize_speech(text, texttype, voice_id="Joanna", engine="neural", output_format="mp3",
+                          credentials=None):
+    """Synthesizes speech from the input string of text using AWS Polly."""
+    start_time = time.time()
+    cache_key = aws_cache_key(text, texttype, voice_id, engine, output_format)
+    cached = serve_from_cache(cache_key, start_time)
+    if cached is not None:
+        return cached
+    aws_access_key_id = _require(credentials, "aws_access_key_id", "polly")
+    aws_secret_access_key = _require(credentials, "aws_secret_access_key", "polly")
+    with span("client_init"):
+        polly_client = get_polly_client(aws_access_key_id, aws_secret_access_key,
+                                        credentials.get("aws_region", "us-east-1"))
+
+    def request():
+        try:
+            response = polly_client.synthesize_speech(
+                Text=text,
+                OutputFormat=output_format,
+                VoiceId=voice_id,
+                Engine=engine,
+                TextType=texttype
+            )
+            if "AudioStream" not in response:
+                raise TTSError("Could not get AudioStream from response", provider="polly")
+            # Reading the stream is part of the attempt so a dropped connection is retried
+            return response["AudioStream"].read()
+        except TTSError:
+            raise
+        except Exception as e:
+            raise _polly_error(e) from e
+
+    audio_content = _call("polly", request, len(text))
+    return _finish(cache_key, audio_content, start_time)
+
+
+# Streaming synthesis functions: generators of audio blocks, evaluated lazily
+def google_stream_speech(text, language_code, voice_name, speaking_rate=1.0, pitch=0.0, lookahead=2,
+                         credentials=None, audio_encoding="MP3", sample_rate_hertz=None):
+    """Yields Google TTS audio chunk by chunk, synthesizing the next chunks while earlier ones play.
+
+    LINEAR16 chunks are yielded as raw PCM (without their WAV headers) so they concatenate.
+    """
+    from google.cloud import texttospeech
+
+    client = get_google_client(_require(credentials, "gcp_service_account", "google"))
+    voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
+    audio_config = google_audio_config(texttospeech, audio_encoding, sample_rate_hertz, speaking_rate, pitch)
+
+    def synthesize_chunk(chunk):
+        def send():
+            try:
+                input_text = texttospeech.SynthesisInput(text=chunk)
+                return client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_config,
+                                                timeout=GOOGLE_TIMEOUT)
+            except Exception as e:
+                raise _google_error(e) from e
+
+        def request():
+            yield _call("google", send, len(chunk)).audio_content
+        cache_key = google_cache_key(chunk, language_code, voice_name, speaking_rate, pitch, audio_encoding,
+                                     sample_rate_hertz)
+        audio = b"".join(cached_stream(cache_key, request))
+        return pcm_payload(audio) if audio_encoding == "LINEAR16" else audio
+
+    # Smaller chunks than the request limit keep time-to-first-byte low
+    chunks = chunk_text(text, max_chars=STREAMING_CHUNK_CHARS, **PROVIDER_LIMITS["google"])
+    yield from pipelined(synthesize_chunk, chunks, lookahead=lookahead, initializer=session_initializer())
+
+
+def elevenlabs_stream_speech(text, api_key, voice_id, model_id="eleven_monolingual_v1",
+                             output_format=ELEVENLABS_DEFAULT_FORMAT):
+    """Yields ElevenLabs audio from the streaming endpoint as it is generated."""
+    url, headers = elevenlabs_request(voice_id, api_key, output_format, stream=True)
+    data = {
+        "text": text,
+        "model_id": model_id,
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.5
+        }
+    }
+
+    def open_stream():
+        try:
+            response = get_http_session().post(url, json=data, headers=headers, stream=True, timeout=ELEVENLABS_TIMEOUT)
+        except Exception as e:
+            raise TTSError(str(e), provider="elevenlabs") from e
+        if response.status_code != 200:
+            with closing(response):
+                raise TTSError(f"{response.status_code}, {response.text}", provider="elevenlabs",
+                               status_code=response.status_code)
+        return response
+
+    def request():
+        # Only opening the stream is retried; once audio has been yielded it cannot be replayed
+        with closing(_call("elevenlabs", open_stream, len(text), discard=lambda lost: lost.close())) as response:
+            yield from response.iter_content(chunk_size=STREAM_READ_SIZE)
+
+    yield from cached_stream(elevenlabs_cache_key(text, voice_id, model_id, output_format), request)
+
+
+def aws_stream_speech(text, texttype, voice_id="Joanna", engine="neural", output_format="mp3", credentials=None):
+    """Yields AWS Polly audio, reading the AudioStream incrementally."""
+    polly_client = get_polly_client(
+        _require(credentials, "aws_access_key_id", "polly"),
+        _require(credentials, "aws_secret_access_key", "polly"),
+        credentials.get("aws_region", "us-east-1")
+    )
+
+    def send():
+        try:
+            return polly_client.synthesize_speech(
+                Text=text,
+                OutputFormat=output_format,
+                VoiceId=voice_id,
+                Engine=engine,
+                TextType=texttype
+            )
+        except Exception as e:
+            raise _polly_error(e) from e
+
+    def request():
+        response = _call("polly", send, len(text), discard=lambda lost: lost["AudioStream"].close())
+        with closing(response["AudioStream"]) as audio_stream:
+            yield from audio_stream.iter_chunks(chunk_size=STREAM_READ_SIZE)
+
+    yield from cached_stream(aws_cache_key(text, texttype, voice_id, engine, output_format), request)
+
+
+def synthesize_in_chunks(synthesize_chunk, chunks, output_format, provider, max_parallel=4, initializer=None,
+                         merge=None):
+    """Synthesizes chunks concurrently and merges their audio in order.
+
+    synthesize_chunk(chunk) returns a Synthesis, and either returns None or
+    raises on failure. merge(audios) joins the chunk audio (for example
+    postprocess.postprocess_chunks); by default it is concatenated as it is.
+    Returns a ChunkedResult.
+    """
+    errors = []
+
+    def run_chunk(i, chunk):
+        try:
+            return synthesize_chunk(chunk)
+        except Exception as e:
+            errors.append(f"Chunk {i+1}: {e}")
+            return None
+
+    results, wall_time = run_concurrently(
+        run_chunk,
+        chunks,
+        max_in_flight=max_parallel,
+        initializer=session_initializer(initializer)
+    )
+    succeeded = [result for result in results if result is not None]
+    total_time = sum(result.time_taken for result in succeeded)
+    # Merge the chunks into a single stream without re-encoding
+    merge = merge or (lambda audios: merge_audio_bytes(audios, output_format))
+    audio = merge([result.audio for result in succeeded]) if succeeded else b""
+    return ChunkedResult(audio, wall_time, total_time, len(chunks) - len(succeeded), errors)
+
+
+def provider_request(provider, credentials, voice=None, language=None, model=None, engine="neural",
+                     output_format="mp3", speaking_rate=1.0, pitch=0.0, text_type="text", quality=None,
+                     backend=None):
+    """Resolves one provider's request settings.
+
+    Returns (synthesize_text, cache_key_for, audio_format, chunk_limit):
+    synthesize_text(text) synthesizes text that fits in one request,
+    cache_key_for(text) is the audio cache key that call uses and
+    audio_format is the audio_formats.AudioFormat it returns. A quality
+    ("speech", "standard", "lossless") overrides output_format. backend
+    supplies the google/elevenlabs/aws_synthesize_speech functions to call
+    (default: this module's; async_engine.AsyncEngine passes itself, making
+    synthesize_text return a coroutine).
+    """
+    if provider not in PROVIDERS:
+        raise TTSError(f"Unknown provider '{provider}'", provider=provider)
+    voice = voice or DEFAULT_VOICES[provider]
+    chunk_limit = None
+    try:
+        audio_format = resolve_format(provider, quality, output_format)
+    except ValueError as e:
+        raise TTSError(str(e), provider=provider) from e
+
+    if provider == "google":
+        language = language or "-".join(voice.split("-")[:2])
+        google_synthesize = backend.google_synthesize_speech if backend else google_synthesize_speech
+
+        def synthesize_text(chunk):
+            return google_synthesize(chunk, language, voice, speaking_rate=speaking_rate,
+                                     pitch=pitch, credentials=credentials,
+                                     audio_encoding=audio_format.request,
+                                     sample_rate_hertz=audio_format.sample_rate)
+
+        def cache_key_for(chunk):
+            return google_cache_key(chunk, language, voice, speaking_rate, pitch, audio_format.request,
+                                    audio_format.sample_rate)
+    elif provider == "elevenlabs":
+        api_key = _require(credentials, "api_eleven_labs", provider)
+        model = model or "eleven_monolingual_v1"
+        language_tag = f"[{language}]" if language and language != "en" and model != "eleven_monolingual_v1" else ""
+        chunk_limit = PROVIDER_LIMITS["elevenlabs"]["max_chars"] - len(language_tag)
+        elevenlabs_synthesize = backend.elevenlabs_synthesize_speech if backend else elevenlabs_synthesize_speech
+
+        def synthesize_text(chunk):
+            return elevenlabs_synthesize(f"{language_tag}{chunk}", api_key, voice, model_id=model,
+                                         output_format=audio_format.request)
+
+        def cache_key_for(chunk):
+            return elevenlabs_cache_key(f"{language_tag}{chunk}", voice, model, audio_format.request)
+    else:
+        aws_synthesize = backend.aws_synthesize_speech if backend else aws_synthesize_speech
+
+        def synthesize_text(chunk):
+            return aws_synthesize(chunk, text_type, voice_id=voice, engine=engine,
+                                  output_format=audio_format.request, credentials=credentials)
+
+        def cache_key_for(chunk):
+            return aws_cache_key(chunk, text_type, voice, engine, audio_format.request)
+
+    return synthesize_text, cache_key_for, audio_format, chunk_limit
+
+
+def synthesize(provider, text, credentials, voice=None, language=None, model=None, engine="neural",
+               output_format="mp3", speaking_rate=1.0, pitch=0.0, text_type="text", max_parallel=4, quality=None):
+    """Synthesizes text with any provider, chunking and merging when it exceeds the request limit.
+
+    The audio is in the format provider_request resolves for output_format or
+    quality. Returns a Synthesis; raises TTSError on failure.
+    """
+    synthesize_text, _, audio_format, chunk_limit = provider_request(
+        provider, credentials, voice=voice, language=language, model=model, engine=engine,
+        output_format=output_format, speaking_rate=speaking_rate, pitch=pitch, text_type=text_type,
+        quality=quality
+    )
+    if not needs_chunking(text, provider, max_chars=chunk_limit):
+        return synthesize_text(text)
+    chunks = chunk_for_provider(text, provider, ssml=text_type == "ssml", max_chars=chunk_limit)
+    result = synthesize_in_chunks(synthesize_text, chunks, audio_format.name, provider, max_parallel=max_parallel)
+    if result.failed_count:
+        raise TTSError(f"{result.failed_count} of {len(chunks)} chunks failed: {'; '.join(result.errors)}",
+                       provider=provider)
+    return Synthesis(result.audio, result.wall_time)
+
+
+def stream_speech(provider, text, credentials, voice=None, language=None, model=None, engine="neural",
+                  output_format="mp3", speaking_rate=1.0, pitch=0.0, text_type="text", quality=None):
+    """Yields audio blocks for any provider, streaming chunk after chunk when text exceeds the request limit.
+
+    The blocks are in audio_formats.stream_format of the resolved format.
+    """
+    if provider not in PROVIDERS:
+        raise TTSError(f"Unknown provider '{provider}'", provider=provider)
+    voice = voice or DEFAULT_VOICES[provider]
+    try:
+        audio_format = resolve_format(provider, quality, output_format)
+    except ValueError as e:
+        raise TTSError(str(e), provider=provider) from e
+    if provider == "google":
+        language = language or "-".join(voice.split("-")[:2])
+        yield from google_stream_speech(text, language, voice, speaking_rate=speaking_rate, pitch=pitch,
+                                        credentials=credentials, audio_encoding=audio_format.request,
+                                        sample_rate_hertz=audio_format.sample_rate)
+    elif provider == "elevenlabs":
+        api_key = _require(credentials, "api_eleven_labs", provider)
+        model = model or "eleven_monolingual_v1"
+        language_tag = f"[{language}]" if language and language != "en" and model != "eleven_monolingual_v1" else ""
+        chunk_limit = PROVIDER_LIMITS["elevenlabs"]["max_chars"] - len(language_tag)
+        for chunk in chunk_text(text, max_chars=chunk_limit):
+            yield from elevenlabs_stream_speech(f"{language_tag}{chunk}", api_key, voice, model_id=model,
+                                                output_format=audio_format.request)
+    else:
+        chunks = chunk_text(text, ssml=text_type == "ssml", **PROVIDER_LIMITS["polly"])
+        for chunk in chunks:
+            yield from aws_stream_speech(chunk, text_type, voice_id=voice, engine=engine,
+                                         output_format=audio_format.request, credentials=credentials)
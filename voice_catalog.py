@@ -0,0 +1,316 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Where fetched voice lists are persisted, and how long they are trusted
+CATALOG_PATH = os.getenv("TTS_VOICE_CATALOG", ".tts_voices.json")
+CATALOG_TTL_SECONDS = float(os.getenv("TTS_VOICE_CATALOG_TTL_SECONDS", str(24 * 3600)))
+# After a failed fetch the fallback list is served for this long before retrying
+FETCH_RETRY_SECONDS = 300
+
+# Google voice tiers, from the voice name (e.g. en-US-Neural2-A)
+GOOGLE_VOICE_TYPES = {
+    "Standard": "Basic voice with good quality",
+    "Wavenet": "Higher quality, more natural sounding voice",
+    "Neural2": "Latest neural network based voices with very natural intonation",
+    "Studio": "Premium studio-quality voices (limited availability)",
+    "Polyglot": "Voices trained for multiple languages",
+}
+
+# Voices offered when a provider's voice list cannot be fetched (no credentials,
+# network errors). Google entries are {language: {voice type: suffixes}}.
+FALLBACK_GOOGLE_VOICES = {
+    "hi-IN": {"Standard": "ABCD", "Wavenet": "ABCD", "Neural2": "ABCD"},
+    "en-US": {"Standard": "ABCDEFGHIJ", "Wavenet": "ABCDEFGHIJ", "Neural2": "ABCDEFGHIJ", "Studio": "OQ"},
+    "en-IN": {"Standard": "ABCD", "Wavenet": "ABCD", "Neural2": "ABCD"},
+    "es-ES": {"Standard": "ABCD", "Wavenet": "ABCD", "Neural2": "ABCD", "Polyglot": "1"},
+    "fr-FR": {"Standard": "ABCDE", "Wavenet": "ABCDE", "Neural2": "ABCDE", "Polyglot": "1"},
+}
+# The old UI guessed gender from the suffix letter; only used for the fallback list
+FALLBACK_GOOGLE_FEMALE_SUFFIXES = set("ACEGIO")
+
+# (voice id, language code, language name, gender, supported engines)
+FALLBACK_POLLY_VOICES = [
+    ("Joanna", "en-US", "US English", "Female", ["neural", "standard"]),
+    ("Matthew", "en-US", "US English", "Male", ["neural", "standard"]),
+    ("Salli", "en-US", "US English", "Female", ["neural", "standard"]),
+    ("Joey", "en-US", "US English", "Male", ["neural", "standard"]),
+    ("Kimberly", "en-US", "US English", "Female", ["neural", "standard"]),
+    ("Kevin", "en-US", "US English", "Male", ["neural"]),
+    ("Ruth", "en-US", "US English", "Female", ["neural"]),
+    ("Stephen", "en-US", "US English", "Male", ["neural"]),
+    ("Ivy", "en-US", "US English", "Female", ["neural", "standard"]),
+    ("Justin", "en-US", "US English", "Male", ["neural", "standard"]),
+    ("Amy", "en-GB", "British English", "Female", ["neural", "standard"]),
+    ("Emma", "en-GB", "British English", "Female", ["neural", "standard"]),
+    ("Brian", "en-GB", "British English", "Male", ["neural", "standard"]),
+    ("Aditi", "en-IN", "Indian English", "Female", ["standard"]),
+    ("Raveena", "en-IN", "Indian English", "Female", ["standard"]),
+    ("Conchita", "es-ES", "Castilian Spanish", "Female", ["standard"]),
+    ("Lucia", "es-ES", "Castilian Spanish", "Female", ["neural", "standard"]),
+    ("Celine", "fr-FR", "French", "Female", ["standard"]),
+    ("Lea", "fr-FR", "French", "Female", ["neural", "standard"]),
+    ("Marlene", "de-DE", "German", "Female", ["standard"]),
+    ("Vicki", "de-DE", "German", "Female", ["neural", "standard"]),
+    ("Takumi", "ja-JP", "Japanese", "Male", ["neural", "standard"]),
+    ("Mizuki", "ja-JP", "Japanese", "Female", ["standard"]),
+]
+# Polly voices that also speak a second language
+FALLBACK_POLLY_EXTRA_LANGUAGES = {"Aditi": ["hi-IN"]}
+
+FALLBACK_ELEVENLABS_VOICES = {
+    "Rachel": "21m00Tcm4TlvDq8ikWAM",
+    "Mark": "UgBBYS2sOqTuMpoF3BR0",
+    "Cassidy": "56AoDkrOh6qfVPDXZ7Pt",
+    "Thomas": "GBv7mTt0atIp3Br8iCZE",
+    "Daniel": "onwK4e9ZLuTAKqWW03F9",
+    "Josh": "TxGEqnHWrfWFTfGW9XjX",
+    "Adam": "pNInz6obpgDQGcFmaJgB",
+    "Sam": "yoZ06aMxZJJ28mfd3POQ",
+    "Antoni": "ErXwobaYiN019PkySvjV",
+    "Arnold": "VR6AewLTigWG4xSOukaG",
+    "Bella": "EXAVITQu4vr4xnSDxMaL",
+    "Domi": "AZnzlk1XvdvUeBnXmlld",
+    "Elli": "MF3mGyEYCl7XYWbV9V6O",
+    "Freya": "jsCqWAovK2LkecY7zXl4",
+    "Gigi": "jBpfuIE2acCO8z3wKNLl",
+}
+
+
+def make_voice(provider, voice_id, name=None, language_codes=(), language_name=None, gender=None,
+               engines=(), neural=False):
+    """Returns the catalog record for one voice."""
+    return {
+        "provider": provider,
+        "id": voice_id,
+        "name": name or voice_id,
+        "language_codes": list(language_codes),
+        "language_name": language_name,
+        "gender": (gender or "Unknown").title(),
+        "engines": list(engines),
+        "neural": neural,
+    }
+
+
+def google_voice_type(voice_name):
+    parts = voice_name.split("-")
+    return parts[2] if len(parts) >= 4 else ""
+
+
+def fallback_voices(provider):
+    """Returns the built-in voice list for a provider."""
+    if provider == "google":
+        voices = []
+        for language, types in FALLBACK_GOOGLE_VOICES.items():
+            for voice_type, suffixes in types.items():
+                for suffix in suffixes:
+                    gender = "Female" if suffix in FALLBACK_GOOGLE_FEMALE_SUFFIXES else "Male"
+                    voices.append(make_voice("google", f"{language}-{voice_type}-{suffix}",
+                                             language_codes=[language], gender=gender,
+                                             engines=[voice_type], neural=voice_type != "Standard"))
+        return voices
+    if provider == "polly":
+        return [make_voice("polly", voice_id, language_codes=[language] + FALLBACK_POLLY_EXTRA_LANGUAGES.get(voice_id, []),
+                           language_name=language_name, gender=gender, engines=engines,
+                           neural="neural" in engines)
+                for voice_id, language, language_name, gender, engines in FALLBACK_POLLY_VOICES]
+    if provider == "elevenlabs":
+        return [make_voice("elevenlabs", voice_id, name=name, engines=["elevenlabs"], neural=True)
+                for name, voice_id in FALLBACK_ELEVENLABS_VOICES.items()]
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+# Fetchers: each takes a secrets-shaped credentials mapping and returns voice records
+def fetch_google_voices(credentials):
+    from clients import get_google_client
+
+    response = get_google_client(credentials["gcp_service_account"]).list_voices()
+    voices = []
+    for voice in response.voices:
+        voice_type = google_voice_type(voice.name)
+        voices.append(make_voice("google", voice.name, language_codes=voice.language_codes,
+                                 gender=voice.ssml_gender.name.replace("SSML_VOICE_GENDER_", ""),
+                                 engines=[voice_type] if voice_type else [],
+                                 neural=voice_type not in ("", "Standard")))
+    return voices
+
+
+def fetch_polly_voices(credentials):
+    from clients import get_polly_client
+
+    client = get_polly_client(credentials["aws_access_key_id"], credentials["aws_secret_access_key"],
+                              credentials.get("aws_region", "us-east-1"))
+    voices = []
+    kwargs = {}
+    while True:
+        response = client.describe_voices(**kwargs)
+        for voice in response["Voices"]:
+            engines = [engine.lower() for engine in voice.get("SupportedEngines", [])]
+            voices.append(make_voice("polly", voice["Id"], name=voice.get("Name"),
+                                     language_codes=[voice["LanguageCode"]] + voice.get("AdditionalLanguageCodes", []),
+                                     language_name=voice.get("LanguageName"), gender=voice.get("Gender"),
+                                     engines=engines, neural="neural" in engines))
+        if not response.get("NextToken"):
+            return voices
+        kwargs["NextToken"] = response["NextToken"]
+
+
+def fetch_elevenlabs_voices(credentials):
+    from clients import get_http_session
+    from tts_engine import ELEVENLABS_API_BASE, ELEVENLABS_TIMEOUT
+
+    response = get_http_session().get(f"{ELEVENLABS_API_BASE}/v1/voices",
+                                      headers={"xi-api-key": credentials["api_eleven_labs"]},
+                                      timeout=ELEVENLABS_TIMEOUT)
+    response.raise_for_status()
+    voices = []
+    for voice in response.json()["voices"]:
+        labels = voice.get("labels") or {}
+        language = labels.get("language")
+        voices.append(make_voice("elevenlabs", voice["voice_id"], name=voice.get("name"),
+                                 language_codes=[language] if language else [],
+                                 language_name=labels.get("accent"), gender=labels.get("gender"),
+                                 engines=["elevenlabs"], neural=True))
+    return voices
+
+
+FETCHERS = {
+    "google": fetch_google_voices,
+    "polly": fetch_polly_voices,
+    "elevenlabs": fetch_elevenlabs_voices,
+}
+
+
+class VoiceCatalog:
+    """Per-provider voice lists persisted to a JSON file and indexed for O(1) lookups.
+
+    Each provider's list is fetched at most once per TTL (shared by all sessions
+    in the process and across restarts via the JSON file). Indexes map
+    (provider, field, value) to voice ids, so filtering never scans the list.
+    """
+
+    def __init__(self, path=CATALOG_PATH, ttl_seconds=CATALOG_TTL_SECONDS, fetchers=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.fetchers = FETCHERS if fetchers is None else fetchers
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # provider -> (entry, by_id, index): the entry {"fetched_at", "expires_at", "source", "voices"},
+        # {voice id: voice} and {(field, value): [voice ids]}, replaced together as one tuple
+        self._catalogs = {}
+        self.fetches = 0
+        self.fetch_errors = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for provider, entry in stored.items():
+            self._install(provider, entry)
+
+    def _save(self):
+        stored = {provider: entry for provider, (entry, _, _) in self._catalogs.items() if entry["source"] == "fetched"}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-voices-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _install(self, provider, entry):
+        # Indexes are built aside and swapped in with the entry in one assignment, so lock-free
+        # readers never see a partial list or an index from a different refresh than the ids
+        by_id, index = {}, {}
+        for voice in entry["voices"]:
+            by_id[voice["id"]] = voice
+            fields = [("gender", voice["gender"]), ("neural", voice["neural"])]
+            fields += [("language", code) for code in voice["language_codes"]]
+            fields += [("engine", engine) for engine in voice["engines"]]
+            for field_value in fields:
+                index.setdefault(field_value, []).append(voice["id"])
+        self._catalogs[provider] = (entry, by_id, index)
+
+    def refresh(self, provider, credentials=None):
+        """Fetches a provider's voice list now, falling back to the built-in list on errors."""
+        now = time.time()
+        try:
+            voices = self.fetchers[provider](credentials)
+            entry = {"fetched_at": now, "expires_at": now + self.ttl_seconds, "source": "fetched", "voices": voices}
+        except Exception as e:
+            print(f"Could not fetch {provider} voices, using built-in list: {e}")
+            self.fetch_errors += 1
+            entry = {"fetched_at": now, "expires_at": now + FETCH_RETRY_SECONDS, "source": "fallback",
+                     "voices": fallback_voices(provider)}
+        with self._lock:
+            self.fetches += 1
+            self._install(provider, entry)
+            if entry["source"] == "fetched":
+                self._save()
+        return entry
+
+    def ensure(self, provider, credentials=None):
+        """Makes sure the provider's voice list is loaded and within its TTL; returns (entry, by_id, index)."""
+        catalog = self._catalogs.get(provider)
+        if catalog is not None and (time.time() < catalog[0]["expires_at"] or credentials is None):
+            return catalog
+        with self._refresh_lock:
+            # Another session may have refreshed while this one waited
+            catalog = self._catalogs.get(provider)
+            if catalog is not None and time.time() < catalog[0]["expires_at"]:
+                return catalog
+            if credentials is not None:
+                self.refresh(provider, credentials)
+            elif catalog is None:
+                # Nothing to fetch with; serve the built-in list until credentials are given
+                with self._lock:
+                    self._install(provider, {"fetched_at": 0, "expires_at": 0, "source": "fallback",
+                                             "voices": fallback_voices(provider)})
+            return self._catalogs[provider]
+
+    def get(self, provider, voice_id, credentials=None):
+        """Returns the voice record for an id, or None."""
+        _, by_id, _ = self.ensure(provider, credentials)
+        return by_id.get(voice_id)
+
+    def voices(self, provider, credentials=None, language=None, gender=None, engine=None, neural=None):
+        """Returns the provider's voices matching every given filter, sorted by id."""
+        entry, by_id, index = self.ensure(provider, credentials)
+        filters = [(field, value) for field, value in
+                   (("language", language), ("gender", gender), ("engine", engine), ("neural", neural))
+                   if value is not None]
+        if not filters:
+            ids = [voice["id"] for voice in entry["voices"]]
+        else:
+            matches = [index.get(field_value, []) for field_value in filters]
+            smallest = min(matches, key=len)
+            others = [set(match) for match in matches if match is not smallest]
+            ids = [voice_id for voice_id in smallest if all(voice_id in other for other in others)]
+        return [by_id[voice_id] for voice_id in sorted(ids)]
+
+    def languages(self, provider, credentials=None):
+        """Returns the language codes the provider has voices for."""
+        _, _, index = self.ensure(provider, credentials)
+        return sorted(value for field, value in index if field == "language")
+
+    def source(self, provider):
+        """Returns "fetched" or "fallback" for a loaded provider, or None."""
+        catalog = self._catalogs.get(provider)
+        return catalog[0]["source"] if catalog else None
+
+
+_voice_catalog = None
+_voice_catalog_lock = threading.Lock()
+
+
+def get_voice_catalog():
+    """Returns the process-wide VoiceCatalog instance."""
+    global _voice_catalog
+    if _voice_catalog is None:
+        with _voice_catalog_lock:
+            if _voice_catalog is None:
+                _voice_catalog = VoiceCatalog()
+    return _voice_catalog